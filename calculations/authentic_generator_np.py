@@ -6,7 +6,18 @@ Paper: https://arxiv.org/abs/2504.04469 (Note: code will be part of a revised ve
 
 import numpy as np
 import random
-from scipy.stats import truncnorm
+import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from scipy.special import ndtri
+from scipy.stats import nbinom, poisson, qmc, truncnorm
+
+import tracing
+from od_tensor import ODTensor
+
+SAMPLING_MODES = ("mc", "lhs", "qmc", "antithetic")
+# Uniforms are kept this far inside (0, 1) so that the inverse CDFs stay finite
+_UNIFORM_EPS = 1e-12
 
 
 class DemandGenerator:
@@ -34,6 +45,7 @@ class DemandGenerator:
           #    include_reefer: bool = True,
               distribution: str = "poisson",
               cv_demand: float = 1.0,
+              sampling: str = "mc",
               seed: int = None):
         """
         Initializes the demand generator with vessel and cargo parameters.
@@ -63,6 +75,10 @@ class DemandGenerator:
             "normal", "uniform"). Defaults to "poisson".
         cv_demand : float, optional
             Coefficient of variation of distribution. Common values are {0.5,1.0,1.5}, but in (0, infinity). Defaults to 1.0.
+        sampling : str, optional
+            How scenarios are drawn: "mc" (independent draws), "lhs" (Latin hypercube), "qmc"
+            (scrambled Sobol points) or "antithetic" (pairs u, 1 - u). All but "mc" transform
+            uniforms with the inverse CDF of the distribution. Defaults to "mc".
         seed : int, optional
             Random seed for reproducibility. Defaults to None.
         """
@@ -87,6 +103,9 @@ class DemandGenerator:
         self.perturb = float(perturb)
         self.distribution = distribution
         self.cv_demand = cv_demand
+        if sampling not in SAMPLING_MODES:
+            raise ValueError(f"sampling must be one of {SAMPLING_MODES}, got {sampling!r}")
+        self.sampling = sampling
         self.seed = seed
         if seed is not None:
             np.random.seed(seed)
@@ -141,24 +160,55 @@ class DemandGenerator:
         """
         Randomly partition integer v into b nonnegative integers (Ding & Chou, 2015).
         Returns a list of length b summing to v.
+
+        The b - 1 cut points are drawn directly as a uniform (b - 1)-subset of {1, ..., v + b - 1},
+        which is the same uniform composition as shuffling the whole range, in O(b log b).
         """
         v = int(max(0, v))
         b = int(max(1, b))
         if b == 1:
             return [v]
-        # Use combinatorial random composition via random cut points
-        y = list(range(1, v + b))
-        for i in range(b - 1):
-            j = random.randint(i, v + b - 2)
-            y[i], y[j] = y[j], y[i]
-        y[:b - 1] = sorted(y[:b - 1])
-        x = [y[0] - 1]
-        for i in range(1, b - 1):
-            x.append(y[i] - y[i - 1] - 1)
-        x.append(v + b - 1 - y[b - 2])
-        # ensure integer type
-        return [int(xx) for xx in x]
-    
+        cuts = sorted(random.sample(range(1, v + b), b - 1))
+        bounds = [0] + cuts + [v + b]
+        return [bounds[i + 1] - bounds[i] - 1 for i in range(b)]
+
+    def _random_integer_partition_batch(self, v, b: int, rng=np.random):
+        """
+        Batched `_random_integer_partition`: partition every entry of v into b nonnegative integers.
+
+        Each row draws its b - 1 cut points with Floyd's algorithm, vectorized across rows,
+        so the cost is O(len(v) * b^2) independent of the magnitude of v.
+
+        Parameters
+        ----------
+        v : array-like of int
+            Totals to partition, shape (m,).
+        b : int
+            Number of parts.
+        rng : numpy.random module or Generator
+            Source of uniform draws.
+
+        Returns
+        -------
+        parts : numpy.ndarray
+            Integer array of shape (m, b) whose rows sum to v.
+        """
+        v = np.maximum(np.asarray(v, dtype=np.int64).reshape(-1), 0)
+        b = int(max(1, b))
+        k = b - 1
+        if k == 0:
+            return v[:, None].copy()
+        n = v + k  # cut points are drawn from {1, ..., n}
+        cuts = np.empty((v.shape[0], k), dtype=np.int64)
+        for t in range(k):
+            j = n - k + 1 + t
+            r = np.floor(rng.random(v.shape[0]) * j).astype(np.int64) + 1
+            taken = (cuts[:, :t] == r[:, None]).any(axis=1)
+            cuts[:, t] = np.where(taken, j, r)
+        cuts.sort(axis=1)
+        bounds = np.concatenate([np.zeros((v.shape[0], 1), dtype=np.int64), cuts, (n + 1)[:, None]], axis=1)
+        return np.diff(bounds, axis=1) - 1
+
     # ---------- Single load list generater ----------
     def generate_loading_list(self):
         """
@@ -229,95 +279,94 @@ class DemandGenerator:
 
         Returns a P x P integer numpy array.
         """
-        P = int(self.P if P is None else P)
         C = int(self.C if C is None else C)
-        tutils = (self.target_utils if target_utils is None else np.array(target_utils, dtype=float))
-        current_port_ld = self.current_port_ld if current_port_ld is None else current_port_ld
+        return self._generate_authentic_tensor(np.array([C]), P=P, target_utils=target_utils, current_port_ld=current_port_ld)[0]
+
+    def _generate_authentic_tensor(self, C, P=None, target_utils=None, current_port_ld=None):
+        """
+        Generate one authentic transport matrix per capacity in C, as a single (K, P, P) array pipeline.
+
+        Loading rows are filled in order, since each row's target subtracts what earlier rows already
+        send past its first destination, but every step within a row (partition, sparsity,
+        largest-remainder renormalization, perturbation) is done for all K matrices at once.
 
-        T = np.zeros((P, P), dtype=int)
+        Parameters
+        ----------
+        C : array-like of int
+            Container capacity per matrix, shape (K,).
+        P, target_utils, current_port_ld : optional
+            As in `_generate_authentic_matrix`. Default to the generator's own values.
 
-        middle_leg = self.middle_leg
-        # determine number of loading rows to process
+        Returns
+        -------
+        T : numpy.ndarray
+            Integer array of shape (K, P, P).
+        """
+        P = int(self.P if P is None else P)
+        C = np.asarray(C, dtype=np.int64).reshape(-1)
+        K = C.shape[0]
+        tutils = (self.target_utils if target_utils is None else np.array(target_utils, dtype=float))
+        current_port_ld = self.current_port_ld if current_port_ld is None else current_port_ld
         n_loading = self.n_loading
+        offset = 0 if self.include_current_port else 1
 
         if len(tutils) != n_loading:
             raise ValueError(f"target_utils length ({len(tutils)}) must equal expected loading rows ({n_loading}).")
 
-        # If current_port_ld is a dict of cargo_type -> OD matrix, sum onboard for each loading port
-        onboard_list = None
+        # Containers already onboard per loading row, shared by all cargo types
+        onboard = np.zeros(n_loading, dtype=np.int64)
         if current_port_ld is not None:
             if isinstance(current_port_ld, dict):
-                # For each loading port i, sum all cargo types' row i
-                onboard_list = []
-                for i in range(n_loading):
-                    onboard_i = 0
-                    for arr in current_port_ld.values():
-                        # Only sum the row for the loading port (i), and only for destinations after i
-                        loading_port_index = i + (0 if self.include_current_port else 1)
-                        onboard_i += int(np.sum(arr[loading_port_index, loading_port_index + 1:]))
-                    onboard_list.append(onboard_i)
+                # For each loading port i, sum all cargo types' row i for destinations after i
+                ld = np.sum([np.asarray(arr) for arr in current_port_ld.values()], axis=0)
+                rows = np.arange(n_loading) + offset
+                onboard = np.triu(ld, k=1)[rows].sum(axis=1).astype(np.int64)
             else:
                 # Assume it's a list/array of onboard values
                 if len(current_port_ld) != n_loading:
                     raise ValueError(f"current_port_ld length ({len(current_port_ld)}) must equal expected loading rows ({n_loading}).")
-                onboard_list = [int(x) for x in current_port_ld]
+                onboard = np.array([int(x) for x in current_port_ld], dtype=np.int64)
+
+        T = np.zeros((K, P, P), dtype=int)
+        # Target containers per (matrix, row) before subtracting earlier rows
+        targets = np.rint(np.outer(C, tutils)).astype(np.int64) - onboard[None, :]
 
         for i in range(n_loading):
-            loading_index = i + (0 if self.include_current_port else 1)
-            dest_start = (middle_leg if self.loading_only else loading_index + 1)
+            loading_index = i + offset
+            dest_start = (self.middle_leg if self.loading_only else loading_index + 1)
             b = P - dest_start
             if b <= 0:
                 continue
 
-            # compute target containers for this row i (subtract already assigned to later dest cols)
-            assigned_so_far = np.sum(T[:loading_index, dest_start:]) if loading_index > 0 else 0
-            # Use onboard_list if available
-            if onboard_list is not None:
-                onboard = onboard_list[i]
-            else:
-                onboard = 0
-            v = int(round(tutils[i] * C)) - int(assigned_so_far) - onboard
-            v = max(v, 0)
-
-            # partition
-            partition = self._random_integer_partition(v, b)
-
-            # apply sparsity: zero out some OD pairs
-            for idx in range(b):
-                if random.random() < self.sparsity:
-                    partition[idx] = 0
-
-            # renormalize to match v (if possible)
-            s = int(sum(partition))
-            if s > 0:
-                scaled = np.array([int(round(x * v / s)) for x in partition])
-                diff = v - scaled.sum()
-
-                if diff > 0:
-                    # add 1 to the first `diff` largest fractional parts
-                    frac = np.array(partition) * v / s - scaled
-                    idx = np.argsort(-frac)[:diff]
-                    scaled[idx] += 1
-                elif diff < 0:
-                    # subtract 1 from the first `-diff` largest (non-zero) cells
-                    frac = scaled - np.array(partition) * v / s
-                    idx = np.argsort(-frac)[: -diff]
-                    for i2 in idx:
-                        if scaled[i2] > 0:
-                            scaled[i2] -= 1
-            else:
-                # all zeros due to sparsity or v==0; if v>0 force a random dest to hold v
-                if v > 0:
-                    idx0 = random.randint(0, b - 1)
-                    partition[idx0] = v
+            # subtract containers already assigned to later destination columns
+            assigned_so_far = T[:, :loading_index, dest_start:].sum(axis=(1, 2))
+            v = np.maximum(targets[:, i] - assigned_so_far, 0)
+
+            # partition, then zero out some OD pairs
+            partition = self._random_integer_partition_batch(v, b)
+            partition[np.random.random((K, b)) < self.sparsity] = 0
+
+            # renormalize to match v with largest-remainder rounding
+            s = partition.sum(axis=1)
+            live = s > 0
+            exact = np.zeros((K, b), dtype=float)
+            exact[live] = partition[live] * (v[live] / s[live])[:, None]
+            scaled = np.floor(exact).astype(np.int64)
+            remainder = np.where(live, v - scaled.sum(axis=1), 0)
+            rank = np.argsort(np.argsort(scaled - exact, axis=1, kind="stable"), axis=1, kind="stable")
+            scaled += rank < remainder[:, None]
+
+            # all zeros due to sparsity; if v>0 force a random dest to hold v
+            empty = ~live & (v > 0)
+            if np.any(empty):
+                scaled[empty, np.random.randint(0, b, size=int(empty.sum()))] = v[empty]
 
             # apply perturbation (fractional +/-): otherwise it is a deterministic fit to target utils
-            for idx in range(b):
-                if partition[idx] > 0 and self.perturb > 0:
-                    delta = int(round(partition[idx] * random.uniform(-self.perturb, self.perturb)))
-                    partition[idx] = max(partition[idx] + delta, 0)
+            if self.perturb > 0:
+                delta = np.rint(scaled * np.random.uniform(-self.perturb, self.perturb, size=(K, b))).astype(np.int64)
+                scaled = np.where(scaled > 0, np.maximum(scaled + delta, 0), scaled)
 
-            T[loading_index, dest_start:] = np.array(partition, dtype=int)
+            T[:, loading_index, dest_start:] = scaled
 
         return T
 
@@ -329,12 +378,12 @@ class DemandGenerator:
             T_multi: dict mapping cargo_type tuple -> OD matrix (numpy array)
             cargo_types: list of cargo_type tuples
         """
-        expected_demand = {}
-        for k, ctype in enumerate(self.cargo_types):
-            # allocate capacity (at least 0)
-            C_k = max(0, int(round(self.C * self.shares[k]))) / self.mean_teu
-            # generate demand for the selected block
-            expected_demand[ctype] = self._generate_authentic_matrix(P=self.P, C=C_k, target_utils=self.target_utils, current_port_ld=self.current_port_ld)
+        # allocate capacity (at least 0) per cargo type, in containers
+        C_k = (np.maximum(0, np.rint(self.C * self.shares)) / self.mean_teu).astype(np.int64)
+        # generate demand for all cargo types at once
+        with tracing.span("generator.moments", cargo_types=len(self.cargo_types)):
+            T = self._generate_authentic_tensor(C_k, P=self.P, target_utils=self.target_utils, current_port_ld=self.current_port_ld)
+        expected_demand = {ctype: T[k] for k, ctype in enumerate(self.cargo_types)}
 
         # Std_demand = self.cv_demand * expected_demand
         std_demand = { ctype: self.cv_demand * expected_demand[ctype] for ctype in self.cargo_types}
@@ -345,6 +394,9 @@ class DemandGenerator:
         """
         Take expected OD matrices (per cargo type) and randomize into scenarios.
 
+        Thin adapter around `_generate_batch` that exposes every scenario as a dict of
+        P x P views into the batched tensor.
+
         Parameters
         ----------
         expected_val : dict
@@ -361,6 +413,152 @@ class DemandGenerator:
         scenarios : list of dicts
             Each element is a dict mapping cargo_type -> randomized OD numpy array
         """
+        batch = self._generate_batch(expected_val, std_val, n_scenarios=n_scenarios, seed=seed)
+        return self._batch_to_scenarios(batch, cargo_types=list(expected_val.keys()))
+
+    def _generate_batch(self, expected_val: dict, std_val: dict, n_scenarios: int = 10, seed: int = None, compact: bool = False):
+        """
+        Randomize expected OD matrices into a scenario tensor.
+
+        All scenarios and cargo types are drawn with a single call per distribution (one per
+        scenario for neg_binomial). The draws are taken from the global RNG in (scenario, cargo
+        type, origin, destination) order, so the result matches the former per-scenario loop for
+        the same seed, and the first n scenarios are the same for every larger n_scenarios.
+
+        Parameters
+        ----------
+        expected_val : dict
+            Mapping cargo_type -> expected OD numpy array
+        std_val : dict
+            Mapping cargo_type -> stddev OD numpy array
+        n_scenarios : int
+            Number of scenarios to generate
+        seed : int
+            Optional seed for random draws (overrides instance seed for this call)
+        compact : bool
+            If True, return an ODTensor holding only the valid OD pairs in a narrow dtype.
+
+        Returns
+        -------
+        batch : numpy.ndarray or ODTensor
+            Integer array of shape (n_scenarios, K, P, P), cargo types in the key order of expected_val,
+            or the equivalent ODTensor of shape (n_scenarios, K, n_pairs) if compact is True.
+        """
+        self._reseed(seed)
+        T_exp = self._stack_od(expected_val)
+        T_std = self._stack_od(std_val, cargo_types=list(expected_val.keys()))
+        with tracing.span("generator.sample", scenarios=n_scenarios, cargo_types=len(T_exp), sampling=self.sampling):
+            batch = self._sample_batch(T_exp, T_std, n_scenarios)
+        return self._to_od_tensor(batch) if compact else batch
+
+    def _generate_chunks(self, expected_val: dict, std_val: dict, n_scenarios: int = 10, chunk_size: int = 1000,
+                         seed: int = None, compact: bool = False, n_workers: int = None, start: int = 0):
+        """
+        Lazily randomize expected OD matrices into consecutive chunks of scenarios.
+
+        By default the global RNG is seeded once and consumed in the same order as `_generate_batch`,
+        so concatenating the chunks gives exactly the batch for the same seed. Peak memory is bounded
+        by one chunk, roughly chunk_size * K * P * P * 8 bytes, independent of n_scenarios.
+
+        If n_workers is given, chunk c is instead drawn from its own `numpy.random.Generator`
+        seeded with SeedSequence(seed, spawn_key=(c,)), and chunks are sampled in a pool of
+        n_workers processes. The result then depends only on seed and chunk_size, not on
+        n_workers, but differs from the global-RNG stream.
+
+        Except for Latin hypercube sampling, every set is a prefix of the larger sets of the same
+        seed and chunk_size, so a set can be extended by generating only scenarios start and up.
+        The per-chunk streams skip the chunks before start; the global stream still has to draw and
+        drop them, which costs time but no memory or I/O.
+
+        Parameters
+        ----------
+        expected_val : dict
+            Mapping cargo_type -> expected OD numpy array
+        std_val : dict
+            Mapping cargo_type -> stddev OD numpy array
+        n_scenarios : int
+            Total number of scenarios to generate
+        chunk_size : int
+            Maximum number of scenarios per chunk
+        seed : int
+            Optional seed for random draws (overrides instance seed for this call)
+        compact : bool
+            If True, yield ODTensors instead of dense arrays.
+        n_workers : int
+            Number of worker processes for per-chunk RNG streams. None keeps the global RNG.
+        start : int
+            Index of the first scenario to yield; the chunks still cover [0, n_scenarios) as
+            without start, the first yielded chunk is cut at start.
+
+        Yields
+        ------
+        chunk : numpy.ndarray or ODTensor
+            Scenario tensor of shape (n, K, P, P) (or (n, K, n_pairs)) with n <= chunk_size.
+        """
+        n_scenarios = int(n_scenarios)
+        chunk_size = max(1, int(chunk_size))
+        start = int(start)
+        if start and self.sampling == "lhs":
+            raise ValueError("Latin hypercube designs depend on their size, a set cannot be extended")
+        T_exp = self._stack_od(expected_val)
+        T_std = self._stack_od(std_val, cargo_types=list(expected_val.keys()))
+        sizes = [min(chunk_size, n_scenarios - begin) for begin in range(0, n_scenarios, chunk_size)]
+        first = start // chunk_size
+
+        if n_workers is None:
+            self._reseed(seed)
+            for c, n in enumerate(sizes):
+                # Only the sampling is timed, not the consumer of the yielded chunk
+                with tracing.span("generator.chunk", chunk=c, scenarios=n, skipped=c < first):
+                    batch = self._sample_batch(T_exp, T_std, n)
+                if c < first:
+                    continue
+                if c == first:
+                    batch = batch[start - c * chunk_size:]
+                yield self._to_od_tensor(batch) if compact else batch
+            return
+
+        # Fix the root entropy once so every chunk derives from the same SeedSequence
+        seed = self.seed if seed is None else seed
+        entropy = np.random.SeedSequence(seed).entropy
+        if int(n_workers) <= 1:
+            for c in range(first, len(sizes)):
+                chunk = self._sample_chunk(T_exp, T_std, sizes[c], entropy, c, compact)
+                yield chunk[start - c * chunk_size:] if c == first else chunk
+            return
+
+        with ProcessPoolExecutor(max_workers=int(n_workers), initializer=_init_chunk_worker,
+                                 initargs=(self, T_exp, T_std)) as pool:
+            # Keep a bounded number of chunks in flight so memory stays independent of n_scenarios
+            pending = deque()
+
+            def ready():
+                c, future = pending.popleft()
+                chunk = future.result()
+                return chunk[start - c * chunk_size:] if c == first else chunk
+
+            for c in range(first, len(sizes)):
+                pending.append((c, pool.submit(_sample_chunk_worker, sizes[c], entropy, c, compact)))
+                if len(pending) >= 2 * int(n_workers):
+                    yield ready()
+            while pending:
+                yield ready()
+
+    def _chunk_rng(self, entropy, chunk_index: int):
+        """
+        Independent Generator for chunk chunk_index, derived from the root entropy.
+        """
+        return np.random.Generator(np.random.PCG64(np.random.SeedSequence(entropy, spawn_key=(int(chunk_index),))))
+
+    def _sample_chunk(self, T_exp, T_std, n_scenarios, entropy, chunk_index, compact=False):
+        with tracing.span("generator.chunk", chunk=int(chunk_index), scenarios=n_scenarios):
+            batch = self._sample_batch(T_exp, T_std, n_scenarios, rng=self._chunk_rng(entropy, chunk_index))
+        return self._to_od_tensor(batch) if compact else batch
+
+    def _reseed(self, seed: int = None):
+        """
+        Seed the global RNGs with seed, or with the instance seed if seed is None.
+        """
         if seed is not None:
             np.random.seed(seed)
             random.seed(seed)
@@ -368,43 +566,247 @@ class DemandGenerator:
             np.random.seed(self.seed)
             random.seed(self.seed)
 
-        scenarios = []
-        for s in range(int(n_scenarios)):
-            scenario = {}
-            for ctype, T_exp in expected_val.items():
-                if self.distribution == "poisson":
-                    T_rand = np.random.poisson(T_exp)
+    def _sample_batch(self, T_exp: np.ndarray, T_std: np.ndarray, n_scenarios: int, rng=np.random):
+        """
+        Draw n_scenarios realizations of the stacked moments (K x P x P) from rng.
 
-                elif self.distribution == "normal":
-                    # todo: normal is biased to clipping => 0, hence samples have higher sample mean than its expected value
-                    T_rand = np.random.normal(T_exp, std_val[ctype]).clip(min=0).astype(int)
+        rng is either the global `np.random` module or a `numpy.random.Generator`; both expose
+        the sampling methods used here. No seeding happens in this method.
+        """
+        n_scenarios = int(n_scenarios)
+        size = (n_scenarios,) + T_exp.shape
+
+        if self.sampling != "mc":
+            return self._sample_batch_inverse(T_exp, T_std, n_scenarios, rng)
+
+        if self.distribution == "poisson":
+            T_rand = rng.poisson(T_exp, size=size)
+
+        elif self.distribution == "normal":
+            # todo: normal is biased to clipping => 0, hence samples have higher sample mean than its expected value
+            T_rand = rng.normal(T_exp, T_std, size=size).clip(min=0).astype(int)
+
+        elif self.distribution == "uniform":
+            # Uniform in [0, 2*mean]
+            T_rand = rng.uniform(low=0, high=2*T_exp, size=size)
+
+        elif self.distribution == "lognormal":
+            # Same dtype as the expected values, i.e. draws are truncated for integer moments
+            T_rand = np.zeros(size, dtype=T_exp.dtype)
+            valid = (T_exp > 0) & (T_std > 0)
+            if np.any(valid):
+                mean = T_exp[valid]
+                std = T_std[valid]
+                mu = np.log(mean**2 / np.sqrt(mean**2 + std**2))
+                sigma = np.sqrt(np.log(1 + std**2 / mean**2))
+                T_rand[:, valid] = rng.lognormal(mu, sigma, size=(n_scenarios, mu.size))
+
+        elif self.distribution == "neg_binomial":
+            # Entries with zero mean stay zero; entries without overdispersion fall back to poisson.
+            # Both are drawn scenario by scenario, so that every set is a prefix of the larger ones.
+            T_rand = np.zeros(size)
+            var = T_std**2
+            valid = (T_exp > 0) & (var > T_exp)
+            equi = (T_exp > 0) & ~valid
+            mean = T_exp[valid]
+            n = mean**2 / (var[valid] - mean)
+            p = mean / var[valid]
+            for s in range(n_scenarios):
+                if np.any(valid):
+                    T_rand[s, valid] = rng.negative_binomial(n, p)
+                if np.any(equi):
+                    T_rand[s, equi] = rng.poisson(T_exp[equi])
 
-                elif self.distribution == "uniform":
-                    # Uniform in [0, 2*mean]
-                    low = 0
-                    high = 2*T_exp
-                    T_rand = np.random.uniform(low=low, high=high, size=T_exp.shape)
+        else:
+            raise ValueError(f"Unknown distribution: {self.distribution}")
 
-                elif self.distribution == "lognormal":
-                    mean = T_exp
-                    std = std_val[ctype]
-                    T_rand = np.zeros_like(mean)
-                    valid = (mean > 0) & (std > 0)
-                    if np.any(valid):
-                        mu = np.log(mean[valid]**2 / np.sqrt(mean[valid]**2 + std[valid]**2))
-                        sigma = np.sqrt(np.log(1 + std[valid]**2 / mean[valid]**2))
-                        T_rand[valid] = np.random.lognormal(mu, sigma)
+        return np.round(T_rand).astype(int)
 
-                elif self.distribution == "neg_binomial":
-                    mean = T_exp
-                    var = std_val[ctype]**2
-                    n = mean**2 / (var - mean)
-                    p = mean / var
-                    T_rand = np.random.negative_binomial(n, p, size=T_exp.shape)
+    # ---------- Random access (counter-based) ----------
+    def _scenario_key(self, seed: int = None):
+        """
+        Philox key of the random-access scenarios for seed (or the instance seed).
+        """
+        seed = self.seed if seed is None else seed
+        return np.random.SeedSequence(seed).generate_state(2, dtype=np.uint64)
+
+    def _scenario_rng(self, key, index: int):
+        """
+        Generator of scenario index: Philox with the set's key and the index in the highest counter
+        word, so every scenario has its own stream of 2**192 blocks and needs no other scenario.
+        """
+        counter = np.array([0, 0, 0, int(index)], dtype=np.uint64)
+        return np.random.Generator(np.random.Philox(key=key, counter=counter))
 
+    def _sample_at(self, T_exp, T_std, indices, key, compact=False):
+        """
+        Scenarios at the given indices of the random-access set with Philox key, shape
+        (len(indices), K, P, P). Scenario i is a pure function of (key, i). With antithetic
+        sampling scenarios 2j and 2j + 1 are the pair drawn from stream j.
+        """
+        if self.sampling in ("lhs", "qmc"):
+            raise ValueError(f"{self.sampling} designs couple their scenarios, random access needs sampling 'mc' or 'antithetic'")
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        batch = np.empty((len(indices),) + T_exp.shape, dtype=int)
+        with tracing.span("generator.sample_at", scenarios=len(indices)):
+            for n, index in enumerate(indices):
+                if self.sampling == "antithetic":
+                    batch[n] = self._sample_batch(T_exp, T_std, 2, rng=self._scenario_rng(key, index // 2))[index % 2]
                 else:
-                    raise ValueError(f"Unknown distribution: {self.distribution}")
-                scenario[ctype] = np.round(T_rand).astype(int)
-            scenarios.append(scenario)
+                    batch[n] = self._sample_batch(T_exp, T_std, 1, rng=self._scenario_rng(key, index))[0]
+        return self._to_od_tensor(batch) if compact else batch
+
+    def _generate_at(self, expected_val: dict, std_val: dict, indices, seed: int = None, compact: bool = False):
+        """
+        Randomize expected OD matrices into the scenarios at the given indices of the random-access
+        scenario set of seed (or the instance seed), without generating any other scenario.
+
+        Parameters
+        ----------
+        expected_val : dict
+            Mapping cargo_type -> expected OD numpy array
+        std_val : dict
+            Mapping cargo_type -> stddev OD numpy array
+        indices : int or array-like of int
+            Scenario indices, in any order and with repetitions.
+        seed : int
+            Optional seed of the scenario set (overrides instance seed for this call)
+        compact : bool
+            If True, return an ODTensor holding only the valid OD pairs.
+
+        Returns
+        -------
+        batch : numpy.ndarray or ODTensor
+            Integer array of shape (len(indices), K, P, P), or the equivalent ODTensor.
+        """
+        T_exp = self._stack_od(expected_val)
+        T_std = self._stack_od(std_val, cargo_types=list(expected_val.keys()))
+        return self._sample_at(T_exp, T_std, indices, self._scenario_key(seed), compact)
+
+    # ---------- Variance-reduced sampling ----------
+    def _uniforms(self, n_scenarios: int, dim: int, rng=np.random):
+        """
+        (n_scenarios, dim) uniforms in (0, 1) of the sampling mode.
+
+        "lhs" stratifies every coordinate into n_scenarios equal intervals, each hit once in random
+        order; "qmc" takes the first n_scenarios points of a scrambled Sobol sequence (balanced for
+        powers of two); "antithetic" pairs every draw u with 1 - u in consecutive rows. The design
+        covers one call, so with chunked generation every chunk is a design of its own.
+        """
+        if self.sampling == "lhs":
+            strata = np.argsort(rng.random((n_scenarios, dim)), axis=0)
+            U = (strata + rng.random((n_scenarios, dim))) / n_scenarios
+        elif self.sampling == "qmc":
+            if dim > qmc.Sobol.MAXDIM:
+                raise ValueError(f"Sobol points exist for up to {qmc.Sobol.MAXDIM} dimensions, the demand has {dim}")
+            seed = int(rng.integers(2**32)) if hasattr(rng, "integers") else int(rng.randint(2**32, dtype=np.int64))
+            with warnings.catch_warnings():
+                warnings.filterwarnings("ignore", message=".*balance properties of Sobol", category=UserWarning)
+                U = qmc.Sobol(dim, scramble=True, seed=seed).random(n_scenarios)
+        elif self.sampling == "antithetic":
+            half = rng.random(((n_scenarios + 1) // 2, dim))
+            U = np.empty((2 * half.shape[0], dim))
+            U[0::2] = half
+            U[1::2] = 1.0 - half
+            U = U[:n_scenarios]
+        else:
+            raise ValueError(f"Unknown sampling mode: {self.sampling}")
+        return np.clip(U, _UNIFORM_EPS, 1.0 - _UNIFORM_EPS)
+
+    def _sample_batch_inverse(self, T_exp: np.ndarray, T_std: np.ndarray, n_scenarios: int, rng=np.random):
+        """
+        `_sample_batch` for the variance-reduced modes: uniforms of the mode for the entries with a
+        positive mean (all others are zero in every distribution), mapped through the inverse CDF
+        with the same parameterization, clipping and truncation as the independent draws.
+        """
+        size = (n_scenarios,) + T_exp.shape
+        active = T_exp > 0
+        T_rand = np.zeros(size, dtype=T_exp.dtype if self.distribution == "lognormal" else float)
+        if not np.any(active):
+            return T_rand.astype(int)
+        U = self._uniforms(n_scenarios, int(active.sum()), rng)
+        mean = T_exp[active].astype(float)
+        std = T_std[active].astype(float)
+
+        if self.distribution == "poisson":
+            draws = _discrete_inverse_cdf(U, poisson, mean)
+
+        elif self.distribution == "normal":
+            draws = (mean + std * ndtri(U)).clip(min=0).astype(int)
+
+        elif self.distribution == "uniform":
+            draws = 2 * mean * U
+
+        elif self.distribution == "lognormal":
+            draws = np.zeros_like(U)
+            valid = std > 0
+            mu = np.log(mean[valid]**2 / np.sqrt(mean[valid]**2 + std[valid]**2))
+            sigma = np.sqrt(np.log(1 + std[valid]**2 / mean[valid]**2))
+            draws[:, valid] = np.exp(mu + sigma * ndtri(U[:, valid]))
+
+        elif self.distribution == "neg_binomial":
+            var = std**2
+            valid = var > mean
+            draws = np.empty_like(U)
+            draws[:, ~valid] = _discrete_inverse_cdf(U[:, ~valid], poisson, mean[~valid])
+            n = mean[valid]**2 / (var[valid] - mean[valid])
+            draws[:, valid] = _discrete_inverse_cdf(U[:, valid], nbinom, n, mean[valid] / var[valid])
+
+        else:
+            raise ValueError(f"Unknown distribution: {self.distribution}")
+
+        T_rand[:, active] = draws
+        return np.round(T_rand).astype(int)
+
+    # ---------- Dict <-> tensor adapters ----------
+    def _stack_od(self, od: dict, cargo_types: list = None):
+        """
+        Stack a dict mapping cargo_type -> P x P array into a (K, P, P) array.
+        Uses the key order of od unless cargo_types is given.
+        """
+        cargo_types = list(od.keys()) if cargo_types is None else cargo_types
+        return np.stack([np.asarray(od[ctype]) for ctype in cargo_types])
+
+    def _to_od_tensor(self, od):
+        """
+        Compact a dict of OD matrices or a (..., P, P) array into an ODTensor.
+        Rows before start_port are dropped, as no demand is generated for them.
+        """
+        dense = self._stack_od(od, cargo_types=self.cargo_types) if isinstance(od, dict) else od
+        return ODTensor.from_dense(dense, start_port=self.start_port)
+
+    def _batch_to_scenarios(self, batch: np.ndarray, cargo_types: list = None):
+        """
+        Expose a (N, K, P, P) tensor as a list of dicts mapping cargo_type -> P x P view.
+        """
+        cargo_types = self.cargo_types if cargo_types is None else cargo_types
+        return [{ctype: batch[s, k] for k, ctype in enumerate(cargo_types)} for s in range(batch.shape[0])]
+
+
+def _discrete_inverse_cdf(U, distribution, *params):
+    """
+    Inverse CDF of a scipy integer distribution at the uniforms of every column j of U, with the
+    parameters params[.][j] of that column. The CDF of each column is tabulated once and searched,
+    which is much faster than distribution.ppf on every draw.
+    """
+    upper = distribution.ppf(1.0 - _UNIFORM_EPS, *params)
+    draws = np.empty(U.shape)
+    for j in range(U.shape[1]):
+        cdf = distribution.cdf(np.arange(upper[j] + 1), *(param[j] for param in params))
+        draws[:, j] = np.minimum(np.searchsorted(cdf, U[:, j]), upper[j])
+    return draws
+
+
+# ---------- Process pool helpers ----------
+# Each worker receives the generator and stacked moments once, then only chunk indices per task.
+_chunk_worker_state = None
+
+
+def _init_chunk_worker(generator, T_exp, T_std):
+    global _chunk_worker_state
+    _chunk_worker_state = (generator, T_exp, T_std)
+
 
-        return scenarios
\ No newline at end of file
+def _sample_chunk_worker(n_scenarios, entropy, chunk_index, compact):
+    generator, T_exp, T_std = _chunk_worker_state
+    return generator._sample_chunk(T_exp, T_std, n_scenarios, entropy, chunk_index, compact)
@@ -0,0 +1,256 @@
+"""
+Benchmarks for the demand generator pipeline of test_stochastic.
+
+Every case (P, N, distribution) runs in a fresh interpreter and times each stage separately:
+
+    loading_list    DemandGenerator.generate_loading_list for port one
+    moments         DemandGenerator._generate_moments
+    sampling        drawing all N scenarios in chunks (the scenarios are discarded)
+    export_binary   writing N scenarios to a triu .scn file
+    export_text     writing N scenarios in the text format read by read_scenario_instance
+
+The export stages write one sampled chunk repeatedly, so they time the writers alone. Each
+stage records its wall time, scenarios per second (sampling and export) and peak RSS. On Linux
+the peak is reset before every stage via /proc/self/clear_refs, so it is the stage's own
+high-water mark; elsewhere it is the process high-water mark so far (ru_maxrss). No solver is
+needed.
+
+Results are appended to a JSON-lines history file, one record per stage, and compared with a
+stored baseline; a stage that got slower or bigger than the baseline by more than the tolerance
+is reported as a regression and makes the script exit with status 1.
+
+    python benchmark_generator.py --preset quick
+    python benchmark_generator.py --preset full --save-baseline
+    python benchmark_generator.py --ports 15 --scenarios 70000 --distributions lognormal --stages sampling
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+STAGES = ("loading_list", "moments", "sampling", "export_binary", "export_text")
+DISTRIBUTIONS = ("poisson", "neg_binomial", "lognormal", "normal", "uniform")
+PRESETS = {
+    "quick": dict(ports=(8, 10, 15), scenarios=(10, 1000), distributions=DISTRIBUTIONS),
+    "full": dict(ports=(8, 10, 15), scenarios=(10, 1000, 15000, 40000, 70000), distributions=DISTRIBUTIONS),
+}
+DEFAULT_HISTORY = "benchmark_history.jsonl"
+DEFAULT_BASELINE = "benchmark_baseline.json"
+
+
+# ---------- Memory ----------
+def _reset_peak_rss():
+    """
+    Reset the kernel's peak RSS counter of this process. Returns False where that is not supported.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    """
+    Peak resident set size of this process in MB, since the last reset where supported.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def _stage(name, n_scenarios, run):
+    resettable = _reset_peak_rss()
+    start = time.perf_counter()
+    result = run()
+    wall = time.perf_counter() - start
+    rate = None if n_scenarios is None else (n_scenarios / wall if wall > 0 else float("inf"))
+    return result, dict(stage=name, wall=wall, scenarios_per_second=rate,
+                        peak_rss_mb=_peak_rss_mb(), stage_peak=resettable)
+
+
+# ---------- Cases ----------
+def run_case(P, n_scenarios, distribution, stages=STAGES, size="S", seed=68418150, chunk_size=1000):
+    """
+    Run the selected stages of one case in this process and return one result dict per stage.
+    """
+    from authentic_generator_np import DemandGenerator
+    from data_generation import generator_params
+    from scenario_io import ScenarioFileWriter, write_text_header, write_text_matrices
+
+    ld_params, moment_params, scenario_params = generator_params(P, size, None, False, seed, distribution)
+    results = []
+
+    dg = DemandGenerator(**ld_params)
+    loading_list, record = _stage("loading_list", None, dg.generate_loading_list)
+    results.append(record)
+
+    dg = DemandGenerator(**moment_params, current_port_ld=loading_list)
+    (mean_demand, std_demand), record = _stage("moments", None, dg._generate_moments)
+    results.append(record)
+
+    dg = DemandGenerator(**scenario_params, current_port_ld=loading_list)
+    chunk_size = min(chunk_size, n_scenarios)
+
+    def sample():
+        first = None
+        for chunk in dg._generate_chunks(mean_demand, std_demand, n_scenarios=n_scenarios, chunk_size=chunk_size):
+            if first is None:
+                first = chunk
+        return first
+
+    if "sampling" in stages or "export_binary" in stages or "export_text" in stages:
+        first, record = _stage("sampling", n_scenarios, sample)
+        results.append(record)
+        sizes = [chunk_size] * (n_scenarios // chunk_size) + ([n_scenarios % chunk_size] if n_scenarios % chunk_size else [])
+
+        with tempfile.TemporaryDirectory() as directory:
+            def export_binary():
+                tensor = dg._to_od_tensor(first)
+                with ScenarioFileWriter(os.path.join(directory, "scenarios.scn"), P, dg.cargo_types, distribution, seed,
+                                        dtype=None, layout="triu", start_port=dg.start_port) as writer:
+                    for n in sizes:
+                        writer.append(tensor[:n])
+
+            def export_text():
+                with open(os.path.join(directory, "scenarios.txt"), "w") as f:
+                    write_text_header(f, P, n_scenarios, dg.cargo_types)
+                    for n in sizes:
+                        write_text_matrices(f, first[:n])
+
+            for name, run in (("export_binary", export_binary), ("export_text", export_text)):
+                if name in stages:
+                    _, record = _stage(name, n_scenarios, run)
+                    results.append(record)
+
+    return [dict(record, P=P, N=n_scenarios, distribution=distribution) for record in results if record["stage"] in stages]
+
+
+def run_isolated(P, n_scenarios, distribution, stages=STAGES, **kwargs):
+    """
+    Run one case in a fresh interpreter, so memory from earlier cases does not leak into its peak RSS.
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(run_case, P, n_scenarios, distribution, stages, **kwargs).result()
+
+
+# ---------- History and baseline ----------
+def case_key(record):
+    return f"P={record['P']},N={record['N']},distribution={record['distribution']},stage={record['stage']}"
+
+
+def environment():
+    """
+    Machine and code identifiers stored with every history record.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return dict(commit=commit, host=platform.node(), machine=platform.machine(), python=platform.python_version(),
+                numpy=np.__version__, cpus=os.cpu_count())
+
+
+def append_history(path, records, run_id, env):
+    with open(path, "a") as f:
+        for record in records:
+            f.write(json.dumps(dict(record, run=run_id, **env), sort_keys=True) + "\n")
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, records, env):
+    baseline = load_baseline(path)
+    for record in records:
+        baseline[case_key(record)] = dict(wall=record["wall"], peak_rss_mb=record["peak_rss_mb"], **env)
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+def regressions(records, baseline, tolerance=0.25, min_wall=0.05):
+    """
+    Records that are slower or use more memory than their baseline by more than `tolerance`
+    (relative). Stages faster than min_wall seconds in both runs are too noisy and only checked for memory.
+    """
+    flagged = []
+    for record in records:
+        base = baseline.get(case_key(record))
+        if base is None:
+            continue
+        reasons = []
+        if max(record["wall"], base["wall"]) >= min_wall and record["wall"] > base["wall"] * (1 + tolerance):
+            reasons.append(f"wall {base['wall']:.3f}s -> {record['wall']:.3f}s")
+        if record["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+            reasons.append(f"peak RSS {base['peak_rss_mb']:.0f}MB -> {record['peak_rss_mb']:.0f}MB")
+        if reasons:
+            flagged.append((case_key(record), reasons))
+    return flagged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the demand generator stages (no solver required).")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick")
+    parser.add_argument("--ports", type=int, nargs="+", help="override the preset's port counts")
+    parser.add_argument("--scenarios", type=int, nargs="+", help="override the preset's scenario counts")
+    parser.add_argument("--distributions", nargs="+", choices=DISTRIBUTIONS, help="override the preset's distributions")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--history", default=DEFAULT_HISTORY, help="JSON-lines file the results are appended to")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline file to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run's results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="relative slowdown or memory growth flagged as regression")
+    args = parser.parse_args()
+
+    preset = PRESETS[args.preset]
+    ports = args.ports or preset["ports"]
+    scenarios = args.scenarios or preset["scenarios"]
+    distributions = args.distributions or preset["distributions"]
+
+    env = environment()
+    run_id = time.strftime("%Y-%m-%dT%H:%M:%S")
+    records = []
+    print(f"{'P':>3} {'N':>6} {'distribution':<13} {'stage':<14} {'wall [s]':>9} {'scen/s':>10} {'peak [MB]':>9}")
+    for P in ports:
+        for n_scenarios in scenarios:
+            for distribution in distributions:
+                case = run_isolated(P, n_scenarios, distribution, tuple(args.stages))
+                append_history(args.history, case, run_id, env)
+                records.extend(case)
+                for r in case:
+                    rate = "-" if r["scenarios_per_second"] is None else f"{r['scenarios_per_second']:.0f}"
+                    print(f"{P:>3} {n_scenarios:>6} {distribution:<13} {r['stage']:<14} {r['wall']:>9.3f} {rate:>10} {r['peak_rss_mb']:>9.0f}")
+
+    flagged = regressions(records, load_baseline(args.baseline), args.tolerance)
+    if args.save_baseline:
+        save_baseline(args.baseline, records, env)
+        print(f"Saved baseline for {len(records)} stages to {args.baseline}")
+    for key, reasons in flagged:
+        print(f"REGRESSION {key}: {', '.join(reasons)}")
+    if flagged and not args.save_baseline:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Accuracy benchmark of the DemandGenerator sampling modes (mc, lhs, qmc, antithetic).
+
+For every distribution, mode and scenario count N the scenario set of test_stochastic is drawn
+R times with different sample seeds, and two estimates are taken from every replication:
+
+    mean      the expected demand, i.e. the sample mean of all (cargo type, origin, destination)
+              entries
+    centers   the cluster centers of minibatch_kmeans with a fixed seed, as used to build the
+              clustered instances
+
+The error of an estimate is its spread over the replications, relative to the norm of the
+expected demand: the root mean square distance of the replications' mean from their average,
+and for the centers the average distance between the optimally matched centers of two
+replications (scipy.optimize.linear_sum_assignment). All modes sample the same distribution, so
+the spread alone compares them.
+
+The target is the plain-MC error at the largest N. For every mode the smallest N reaching it is
+reported, together with the reduction factor against that N and the sampling time.
+
+    python benchmark_sampling.py --ports 8 --scenarios 250 500 1000 2000 4000 --replications 8
+    python benchmark_sampling.py --distributions lognormal --scenarios 1000 4000 15000 --output sampling.json
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from benchmark_generator import DISTRIBUTIONS
+
+MODES = ("mc", "lhs", "qmc", "antithetic")
+
+
+# ---------- Estimates ----------
+def draw(dg, mean_demand, std_demand, n_scenarios, sample_seed, chunk_size):
+    """
+    One scenario set of n_scenarios as a dense (N, K, P, P) array, and the sampling time.
+    """
+    start = time.perf_counter()
+    chunks = list(dg._generate_chunks(mean_demand, std_demand, n_scenarios=n_scenarios, chunk_size=chunk_size,
+                                      seed=sample_seed))
+    return np.concatenate(chunks), time.perf_counter() - start
+
+
+def center_distance(a, b):
+    """
+    Mean Euclidean distance between the centers of a and b (n, d) under the best one-to-one matching.
+    """
+    cost = np.sqrt(((a[:, None, :] - b[None, :, :])**2).sum(axis=-1))
+    rows, cols = linear_sum_assignment(cost)
+    return cost[rows, cols].mean()
+
+
+def spread(means, centers, scale):
+    """
+    Relative errors of the replications' mean estimates (R, d) and cluster centers (R, n, d).
+    """
+    mean_error = np.sqrt(((means - means.mean(axis=0))**2).sum(axis=1).mean()) / scale
+    pairs = [(r, s) for r in range(len(centers)) for s in range(r + 1, len(centers))]
+    center_error = np.mean([center_distance(centers[r], centers[s]) for r, s in pairs]) / scale if pairs else np.nan
+    return mean_error, center_error
+
+
+def run_distribution(P, distribution, scenarios, modes=MODES, replications=8, n_clusters=10, size="S", seed=68418150,
+                     chunk_size=4096, verbose=True):
+    """
+    Errors and sampling times of every mode and scenario count for one distribution.
+
+    Returns a list of dicts with "distribution", "sampling", "N", "mean_error", "center_error" and
+    "seconds" (average sampling time of one replication).
+    """
+    from authentic_generator_np import DemandGenerator
+    from data_generation import generator_params
+    from scenario_reduction import minibatch_kmeans
+
+    ld_params, moment_params, scenario_params = generator_params(P, size, None, False, seed, distribution)
+    loading_list = DemandGenerator(**ld_params).generate_loading_list()
+    dg = DemandGenerator(**moment_params, current_port_ld=loading_list)
+    mean_demand, std_demand = dg._generate_moments()
+    scale = np.linalg.norm(dg._stack_od(mean_demand))
+
+    records = []
+    for sampling in modes:
+        dg = DemandGenerator(**dict(scenario_params, sampling=sampling), current_port_ld=loading_list)
+        for n_scenarios in scenarios:
+            means, centers, seconds = [], [], 0.0
+            for r in range(replications):
+                batch, elapsed = draw(dg, mean_demand, std_demand, n_scenarios, seed + 1 + r, chunk_size)
+                seconds += elapsed
+                means.append(batch.reshape(n_scenarios, -1).mean(axis=0))
+                result = minibatch_kmeans(batch, min(n_clusters, n_scenarios), seed=seed)
+                centers.append(result["centers"].reshape(len(result["centers"]), -1))
+            mean_error, center_error = spread(np.array(means), np.array(centers), scale)
+            records.append(dict(distribution=distribution, sampling=sampling, N=n_scenarios, mean_error=mean_error,
+                                center_error=center_error, seconds=seconds / replications))
+            if verbose:
+                print(f"{distribution:<13} {sampling:<11} {n_scenarios:>7} {mean_error:>12.3e} {center_error:>12.3e} "
+                      f"{seconds / replications:>9.2f}", flush=True)
+    return records
+
+
+# ---------- Equivalent sample sizes ----------
+def equivalent_n(records, metric):
+    """
+    Per mode the smallest N whose error in metric is at most the plain-MC error at the largest N.
+    Returns {mode: (N or None, target N)}.
+    """
+    mc = [r for r in records if r["sampling"] == "mc"]
+    if not mc:
+        return {}
+    reference = max(mc, key=lambda r: r["N"])
+    result = {}
+    for sampling in dict.fromkeys(r["sampling"] for r in records):
+        reached = [r["N"] for r in records if r["sampling"] == sampling and r[metric] <= reference[metric]]
+        result[sampling] = (min(reached) if reached else None, reference["N"])
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the accuracy of the DemandGenerator sampling modes.")
+    parser.add_argument("--ports", type=int, default=8)
+    parser.add_argument("--size", default="S", choices=["S", "M", "L"])
+    parser.add_argument("--scenarios", type=int, nargs="+", default=[250, 500, 1000, 2000, 4000])
+    parser.add_argument("--distributions", nargs="+", choices=DISTRIBUTIONS, default=list(DISTRIBUTIONS))
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--replications", type=int, default=8, help="scenario sets per mode and N")
+    parser.add_argument("--clusters", type=int, default=10, help="cluster count of the center estimate")
+    parser.add_argument("--chunk-size", type=int, default=4096, help="scenarios per design (a power of two suits qmc)")
+    parser.add_argument("--seed", type=int, default=68418150)
+    parser.add_argument("--output", default=None, help="JSON file of all results")
+    args = parser.parse_args()
+
+    scenarios = sorted(args.scenarios)
+    records = []
+    print(f"{'distribution':<13} {'sampling':<11} {'N':>7} {'mean error':>12} {'center error':>12} {'time [s]':>9}")
+    for distribution in args.distributions:
+        records.extend(run_distribution(args.ports, distribution, scenarios, args.modes, args.replications,
+                                        args.clusters, args.size, args.seed, args.chunk_size))
+
+    print()
+    print(f"Scenarios needed to match plain MC at N={scenarios[-1]}")
+    print(f"{'distribution':<13} {'sampling':<11} {'mean':>8} {'factor':>7} {'centers':>8} {'factor':>7}")
+    summary = []
+    for distribution in args.distributions:
+        subset = [r for r in records if r["distribution"] == distribution]
+        by_mean, by_centers = equivalent_n(subset, "mean_error"), equivalent_n(subset, "center_error")
+        for sampling in by_mean:
+            cells = []
+            for n, target in (by_mean[sampling], by_centers[sampling]):
+                cells += [f">{scenarios[-1]}", "-"] if n is None else [str(n), f"{target / n:.1f}"]
+            print(f"{distribution:<13} {sampling:<11} {cells[0]:>8} {cells[1]:>7} {cells[2]:>8} {cells[3]:>7}")
+            summary.append(dict(distribution=distribution, sampling=sampling, mean_n=by_mean[sampling][0],
+                                center_n=by_centers[sampling][0], target_n=by_mean[sampling][1]))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(dict(P=args.ports, size=args.size, replications=args.replications, clusters=args.clusters,
+                           results=records, equivalent=summary), f, indent=2)
+        print(f"Results exported to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
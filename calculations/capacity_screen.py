@@ -0,0 +1,181 @@
+"""
+Vectorized pre-screen of scenario sets against the aggregate capacity of the ship.
+
+A scenario whose cargo on board exceeds what the whole vessel can carry on some leg can only
+be served in build_stochastic_model_2 by leaving containers behind (q_20, q_40), which shows
+up after a long MIP solve. The screen finds such scenarios from the demand alone: for every
+scenario and every leg j (departing port j + 1, 1-based) it sums the cargo with origin <= j <
+destination, i.e. the transports TR_ON of the model, in the four measures of
+ship_reader.CAPACITY_MEASURES
+
+    TEU       20' containers count 1, 40' containers 2    (capacity constraint, C_20)
+    FEU       40' containers                              (40' capacity constraint, C_40)
+    reefer    types of the model's reefer row, in TEU     (reefer constraint, C_R)
+    weight    cargo weight in tons                        (location_weight_capacity)
+
+and divides by the ship's capacity summed over all locations. The TEU, FEU and reefer
+coefficients are those of mps_writer.cargo_coefficients, so the reefer measure follows the
+model as written: its 40' indices are shifted by T_40 (reefers40 in Julia) and count 40' dry
+types rather than the physical 40' reefers. The port-one loading list is on
+board on the first legs of every scenario and is added when given. Per-location limits are
+ignored, so a load factor above 1 proves overbooking, one below 1 does not prove a fit.
+
+The whole set is processed as two tensor contractions per block of scenarios, on the compact
+OD vectors of a .scn file, ODTensor or CounterScenarioSet:
+
+    python capacity_screen.py S_scenarios_8_15000_false_nothing_lognormal_12908330.scn --ship S \\
+        --port-one S_port_one_8_false_nothing_lognormal_12908330.scn --max-load 1.0 --output kept.scn
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+from mps_writer import cargo_coefficients
+from od_tensor import od_pairs
+from scenario_io import open_od_tensor, write_scenario_file
+from scenario_reduction import _as_od_tensor
+from ship_reader import CAPACITY_MEASURES, load_ship_instance
+
+
+def cargo_measures(cargo_types):
+    """
+    (K, 4) contribution of one container of every cargo type to CAPACITY_MEASURES, from
+    (length, weight, type) tuples with length 20, 40, "20ft" or "40ft", 20' types first. The
+    reefer column is the reefer row of the model (mps_writer.cargo_coefficients), not the
+    physical "RC" and "HR" types.
+    """
+    _, teu, reefer_types, reefer_teu = cargo_coefficients(cargo_types)
+    W = np.zeros((len(cargo_types), len(CAPACITY_MEASURES)))
+    W[:, 0] = teu
+    W[:, 1] = teu == 2
+    W[reefer_types, 2] = reefer_teu
+    W[:, 3] = [float(weight) for _, weight, _ in cargo_types]
+    return W
+
+
+def leg_incidence(P: int, start_port: int = 0):
+    """
+    (n_pairs, P - 1) 0/1 matrix of the OD pairs of od_pairs(P, start_port) on board on every leg.
+    """
+    origins, destinations = od_pairs(P, start_port)
+    legs = np.arange(P - 1)
+    return ((origins[:, None] <= legs[None, :]) & (legs[None, :] < destinations[:, None])).astype(np.float64)
+
+
+def onboard(scenarios, cargo_types=None, loading_list=None, block_size: int = 4096):
+    """
+    Cargo on board of every scenario and leg in CAPACITY_MEASURES.
+
+    Parameters
+    ----------
+    scenarios : str, ODTensor, CounterScenarioSet or numpy.ndarray
+        Scenario set: path of a .scn file, compact set or dense (N, K, P, P) array.
+    cargo_types : list of tuple, optional
+        Cargo type table; taken from the file or set when omitted.
+    loading_list : str, ODTensor or numpy.ndarray, optional
+        Port-one loading list (.scn file, ODTensor of one matrix stack or dense (K, P, P)),
+        added to every scenario.
+    block_size : int, optional
+        Scenarios per contraction.
+
+    Returns
+    -------
+    totals : numpy.ndarray
+        Array of shape (N, P - 1, 4).
+    """
+    X, found = _as_od_tensor(scenarios)
+    cargo_types = found if cargo_types is None else cargo_types
+    if cargo_types is None:
+        raise ValueError("cargo_types are needed for scenarios without a header")
+    W = cargo_measures(cargo_types)
+    A = leg_incidence(X.P, X.start_port)
+
+    totals = np.empty((len(X), X.P - 1, W.shape[1]))
+    for start in range(0, len(X), block_size):
+        block = np.asarray(X[start:start + block_size].data, dtype=np.float64)
+        totals[start:start + len(block)] = np.einsum("bnm,nj->bjm", np.einsum("bkn,km->bnm", block, W), A)
+
+    if loading_list is not None:
+        if isinstance(loading_list, np.ndarray) and loading_list.ndim == 3:
+            loading_list = loading_list[None]
+        ld, _ = _as_od_tensor(loading_list)
+        if ld.P != X.P:
+            raise ValueError(f"loading list has {ld.P} ports, the scenarios {X.P}")
+        block = np.asarray(ld.data, dtype=np.float64).sum(axis=0)
+        totals += np.einsum("nm,nj->jm", np.einsum("kn,km->nm", block, W), leg_incidence(ld.P, ld.start_port))
+    return totals
+
+
+def screen(scenarios, ship, cargo_types=None, loading_list=None, max_load: float = 1.0, block_size: int = 4096):
+    """
+    Flag the scenarios whose cargo on board exceeds max_load times the aggregate ship capacity
+    on some leg and in some measure.
+
+    Parameters
+    ----------
+    scenarios, cargo_types, loading_list, block_size
+        As in onboard.
+    ship : ShipInstance
+        Ship read with ship_reader.
+    max_load : float, optional
+        Largest accepted load factor. Defaults to 1.0, i.e. flag what cannot fit.
+
+    Returns
+    -------
+    result : dict
+        "load"         (N, P - 1, 4) cargo on board relative to the capacity
+        "load_factor"  (N,) largest load over legs and measures
+        "binding"      (N,) index into CAPACITY_MEASURES of that largest load
+        "leg"          (N,) 0-based leg of that largest load
+        "overbooked"   (N,) bool, load_factor > max_load
+        "kept"         indices of the scenarios that are not overbooked
+    """
+    load = onboard(scenarios, cargo_types, loading_list, block_size) / ship.capacity()
+    flat = load.reshape(len(load), -1).argmax(axis=1)
+    leg, binding = np.unravel_index(flat, load.shape[1:])
+    load_factor = load.reshape(len(load), -1)[np.arange(len(load)), flat]
+    overbooked = load_factor > max_load
+    return {"load": load, "load_factor": load_factor, "binding": binding, "leg": leg,
+            "overbooked": overbooked, "kept": np.nonzero(~overbooked)[0]}
+
+
+def resolve_ship(ship):
+    """
+    Ship file of a size label ("S", "M", "L") or the given path.
+    """
+    from model_size import SHIP_FILES, ship_file
+    return ship_file(ship) if ship in SHIP_FILES else ship
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Screen a binary scenario file against the aggregate ship capacity.")
+    parser.add_argument("scenarios", help=".scn file written by data_generation.test_stochastic")
+    parser.add_argument("--ship", required=True, help="S, M, L or a ship file")
+    parser.add_argument("--port-one", default=None, help=".scn loading list of port one, added to every scenario")
+    parser.add_argument("--max-load", type=float, default=1.0, help="largest accepted load factor")
+    parser.add_argument("--block-size", type=int, default=4096)
+    parser.add_argument("--output", default=None, help=".scn file of the scenarios that pass")
+    args = parser.parse_args()
+
+    ship = load_ship_instance(resolve_ship(args.ship))
+    header, od = open_od_tensor(args.scenarios)
+    result = screen(od, ship, header["cargo_types"], args.port_one, args.max_load, args.block_size)
+
+    load = result["load"].max(axis=1)
+    print(f"{len(od)} scenarios, {int(result['overbooked'].sum())} with a load factor above {args.max_load}")
+    print(f"{'measure':<8} {'capacity':>10} {'median':>8} {'p99':>8} {'max':>8} {'binding':>8}")
+    for m, name in enumerate(CAPACITY_MEASURES):
+        print(f"{name:<8} {ship.capacity()[m]:>10.0f} {np.median(load[:, m]):>8.3f} {np.percentile(load[:, m], 99):>8.3f} "
+              f"{load[:, m].max():>8.3f} {int((result['binding'][result['overbooked']] == m).sum()):>8}")
+
+    if args.output:
+        if len(result["kept"]) == 0:
+            raise ValueError(f"no scenario has a load factor of at most {args.max_load}, nothing to export")
+        write_scenario_file(args.output, od[result["kept"]], header["cargo_types"], header["distribution"], header["seed"])
+        print(f"{len(result['kept'])} scenarios exported to {os.path.abspath(args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -38,4 +38,16 @@ function build_clustered_instances(data, result)
     cluster_counts = result.counts
 
     return ClusteredInstances(n_ports, n_scenarios, container_types, containers, cluster_counts)
-end
\ No newline at end of file
+end
+
+# Reader for reduced instances written by scenario_reduction.py: a scenario file whose
+# scenarios are the (rounded) cluster centers, followed by one line with the cluster counts.
+# Requires read_scenario_instance from scenarios_instance_reader.jl.
+function read_clustered_instance(filename::String)
+    data = read_scenario_instance(filename)
+    cluster_counts = parse.(Int, split(last(readlines(filename))))
+    if length(cluster_counts) != data.n_scenarios
+        error("$(filename) has $(length(cluster_counts)) cluster counts for $(data.n_scenarios) scenarios")
+    end
+    return ClusteredInstances(data.n_ports, data.n_scenarios, data.container_types, data.containers, cluster_counts)
+end
@@ -0,0 +1,163 @@
+using PyCall
+using Clustering
+using JuMP
+using Gurobi
+using Serialization
+
+include("scenarios_instance_reader.jl")
+include("cluster_instance_reader.jl")
+include("ship_reader.jl")
+include("StochasticModel_2.5.jl")
+include("mip_start.jl")
+
+# One job of the comparison sweep, as run by sweep.py. Same steps as comparison_*.jl, split so
+# that jobs of one sweep can run side by side:
+#
+#   julia comparison_job.jl deterministic S 8 15000 - uniform 12908330 [threads]
+#       solves the deterministic (one cluster) model and stores its first-stage solution
+#   julia comparison_job.jl comparison S 8 15000 10 uniform 12908330 [threads]
+#       solves the expected stochastic model (first stage fixed to the stored solution) and the
+#       stochastic model with 10 clusters
+#
+# Logs are written to the same files as in comparison_*.jl. The objective values are not appended
+# to the shared objective_value_*_{P}_{N}_{distribution}.csv files, since jobs run concurrently and
+# may be rerun on resume: every job writes its own file, with the seed and n_clusters in the name
+# and as columns, replaced atomically, e.g.
+#   data_MIP_5/stochastic/objective_value_stochastic_comparison_S_8_15000_10_uniform_12908330.csv
+#
+# The model is build_stochastic_model_2 of StochasticModel_2.5.jl. comparison_*.jl include
+# StochasticModel_2.5_simple.jl instead, which is not in the repository, so their objective values
+# need not be comparable with the ones of this script.
+
+job, size, p, N, n, d, s = ARGS[1], ARGS[2], parse(Int, ARGS[3]), parse(Int, ARGS[4]), ARGS[5], ARGS[6], parse(Int, ARGS[7])
+threads = length(ARGS) >= 8 ? parse(Int, ARGS[8]) : 1
+
+path = pwd()
+py"""
+import sys
+sys.path.insert(0, $path)
+import importlib
+"""
+
+# Import the Python module
+data_gen = pyimport("data_generation")
+
+mkpath("log_MIP_5/gurobi_deterministic_logs")
+mkpath("log_MIP_5/gurobi_expected_stochastic_logs")
+mkpath("log_MIP_5/gurobi_stochastic_logs")
+mkpath("data_MIP_5/deterministic")
+mkpath("data_MIP_5/expected_stochastic")
+mkpath("data_MIP_5/stochastic")
+
+ship_names = Dict("S" => "Small", "M" => "Medium", "L" => "Large")
+ship_file = "$(ship_names[size])_ship.txt"
+data_ship = read_ship_instance(ship_file)
+FactorK_O = 10
+
+solution_file = "data_MIP_5/deterministic/first_stage_$(size)_$(p)_$(N)_$(d)_$(s).jls"
+
+# One-row CSV of an objective value, written to a temporary file and moved in place
+function write_objective(filename, n_clusters, objective)
+    tmp = filename * ".tmp"
+    open(tmp, "w") do io
+        println(io, "size,P,N,n_clusters,distribution,seed,objective")
+        println(io, "$(size),$(p),$(N),$(n_clusters),$(d),$(s),$(objective)")
+    end
+    mv(tmp, filename; force=true)
+end
+
+function solve_logged(model, logfile)
+    open(logfile, "w") do io
+        redirect_stdout(io) do
+            set_optimizer_attribute(model, "Threads", threads)
+            set_optimizer_attribute(model, "ConcurrentMIP", 1)
+            set_optimizer_attribute(model, "MIPGap", 0.05)
+
+            optimize!(model)
+        end
+    end
+    return objective_value(model)
+end
+
+# Jobs of the same (P, distribution, seed) run concurrently, so each generates its data files in
+# its own directory. With STOWAGE_DEMAND_CACHE set only the first job actually samples.
+data_dir = mktempdir(pwd())
+data_file_port_one, data_file_scenarios = cd(data_dir) do
+    data_gen.test_stochastic(p, size, nothing, false, s, N, d, "binary")
+end
+data_port_one = read_binary_scenario_instance(joinpath(data_dir, data_file_port_one))
+data_scenarios = read_binary_scenario_instance(joinpath(data_dir, data_file_scenarios))
+rm(data_dir; recursive=true)
+
+n_scenarios_saved = data_scenarios.n_scenarios
+X = hcat(data_scenarios.scenario_vectors...)
+
+if job == "deterministic"
+    result_det = kmeans(X, 1)
+    data_deterministic = build_clustered_instances(data_scenarios, result_det)
+    result_det = nothing
+    X = nothing
+    GC.gc(true)
+
+    model_deterministic, x_20_deterministic, x_40_deterministic, z_20_deterministic, z_40_deterministic = build_stochastic_model_2(data_port_one, data_deterministic, data_ship, n_scenarios_saved)
+    set_greedy_start!(model_deterministic, data_port_one, data_deterministic, ship_file, n_scenarios_saved)
+    det_obj = solve_logged(model_deterministic, "log_MIP_5/gurobi_deterministic_logs/gurobi_solve_log_deterministic_$(size)_$(p)_$(N)_$(d)_$(s).txt")
+
+    write_objective("data_MIP_5/deterministic/objective_value_deterministic_comparison_$(size)_$(p)_$(N)_$(d)_$(s).csv", 1, det_obj)
+
+    # First-stage solution for the comparison jobs, written atomically
+    tmp = solution_file * ".tmp"
+    serialize(tmp, (value.(x_20_deterministic), value.(x_40_deterministic), value.(z_20_deterministic), value.(z_40_deterministic)))
+    mv(tmp, solution_file; force=true)
+
+    # The same plan for evaluate_plan.py: x (T, DEP, L) and z (T, DEP), 20' types first and the
+    # transports from port one in sorted (origin, destination) order as in mps_writer.py
+    np = pyimport("numpy")
+    L = data_ship.n_locations
+    transport_keys = collect(keys(data_port_one.containers[1]))
+    dep = [findfirst(==((1, d)), transport_keys) for d in 2:p]
+    x_plan = vcat([value(x_20_deterministic[tau, t, l]) for tau in axes(x_20_deterministic, 1), t in dep, l in 1:L],
+                  [value(x_40_deterministic[tau, t, l]) for tau in axes(x_40_deterministic, 1), t in dep, l in 1:L])
+    z_plan = vcat([value(z_20_deterministic[tau, t]) for tau in axes(z_20_deterministic, 1), t in dep],
+                  [value(z_40_deterministic[tau, t]) for tau in axes(z_40_deterministic, 1), t in dep])
+    np.savez(replace(solution_file, ".jls" => ".npz"), x=x_plan, z=z_plan, P=p)
+
+elseif job == "comparison"
+    n = parse(Int, n)
+    x_20_det_values, x_40_det_values, z_20_det_values, z_40_det_values = deserialize(solution_file)
+
+    result = kmeans(X, n)
+    data_cluster = build_clustered_instances(data_scenarios, result)
+    result = nothing
+    X = nothing
+    GC.gc(true)
+
+    model_stochastic, x_20_stochastic, x_40_stochastic, z_20_stochastic, z_40_stochastic = build_stochastic_model_2(data_port_one, data_cluster, data_ship, n_scenarios_saved)
+
+    T_20 = count(x -> x.length == 20, data_cluster.container_types)
+    T_40 = count(x -> x.length == 40, data_cluster.container_types)
+    L = data_ship.n_locations
+    transport_keys = collect(keys(data_port_one.containers[1]))
+    TR_DEP_1 = [t_idx for (t_idx, (load, discharge)) in enumerate(transport_keys) if load == 1]
+
+    @constraint(model_stochastic, [tau_20=1:T_20, t=TR_DEP_1, l=1:L], x_20_stochastic[tau_20, t, l] == x_20_det_values[tau_20, t, l])
+    @constraint(model_stochastic, [tau_40=1:T_40, t=TR_DEP_1, l=1:L], x_40_stochastic[tau_40, t, l] == x_40_det_values[tau_40, t, l])
+    @constraint(model_stochastic, [tau_20=1:T_20, t=TR_DEP_1], z_20_stochastic[tau_20, t] == z_20_det_values[tau_20, t])
+    @constraint(model_stochastic, [tau_40=1:T_40, t=TR_DEP_1], z_40_stochastic[tau_40, t] == z_40_det_values[tau_40, t])
+
+    expected_stoc_obj = solve_logged(model_stochastic, "log_MIP_5/gurobi_expected_stochastic_logs/gurobi_solve_log_expected_stochastic_$(size)_$(p)_$(N)_$(n)_$(d)_$(s).txt")
+    write_objective("data_MIP_5/expected_stochastic/objective_value_expected_stochastic_comparison_$(size)_$(p)_$(N)_$(n)_$(d)_$(s).csv",
+                    n, expected_stoc_obj)
+    model_stochastic = nothing
+    GC.gc(true)
+
+    # Now build and solve the stochastic model without fixing deterministic variables
+    # The expected stochastic model above has its first stage fixed, so only this one gets the greedy start
+    model_stochastic_unfixed, _, _, _, _ = build_stochastic_model_2(data_port_one, data_cluster, data_ship, n_scenarios_saved)
+    set_greedy_start!(model_stochastic_unfixed, data_port_one, data_cluster, ship_file, n_scenarios_saved)
+    stoc_obj = solve_logged(model_stochastic_unfixed, "log_MIP_5/gurobi_stochastic_logs/gurobi_solve_log_stochastic_$(size)_$(p)_$(N)_$(n)_$(d)_$(s).txt")
+    write_objective("data_MIP_5/stochastic/objective_value_stochastic_comparison_$(size)_$(p)_$(N)_$(n)_$(d)_$(s).csv", n, stoc_obj)
+
+else
+    error("unknown job $(job), expected deterministic or comparison")
+end
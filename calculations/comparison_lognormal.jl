@@ -35,7 +35,7 @@ FactorK_O = 10
 
 N = 70000
 
-deg2rad = ["lognormal"]
+d = "lognormal"
 n_cluster = [10, 20, 30, 40, 50]
 ports = [8, 10, 15]
 seeds = [12908330, 77804901, 96998883, 76515133]
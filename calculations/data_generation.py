@@ -1,5 +1,13 @@
 from authentic_generator_np import DemandGenerator
+from demand_cache import ENV_CACHE_DIR, DemandCache, cache_key
+from od_tensor import ODTensor
+from scenario_io import ScenarioFileWriter, open_od_tensor, read_scenario_header, write_scenario_file, write_text_header, write_text_matrices
+from scenario_set import CounterScenarioSet
+import json
 import numpy as np
+import os
+import shutil
+import tracing
 
 # Fixed cargo types to ensure consistency
 cargo_types = [
@@ -11,18 +19,12 @@ cargo_types = [
     ("40ft", 14.0, "HR"), ("40ft", 21.0, "HR"), ("40ft", 27.0, "HR")
 ]
 
-def test_stochastic(p, size, middle_leg, loading_only, seed, n_scenarios, distribution):
+def generator_params(p, size, middle_leg, loading_only, seed, distribution, sampling="mc"):
     '''
-    input:
-    p:            (Int)       Amount of ports.
-    size:         (String)    "S", "M" or "L".
-    middle_leg:   (Int)       Last port to include loading.
-    loading_only: (Boolean)   True/False
-    seed:         (Int)       
-    n_scenarios:  (Int)       Number of scenarios.
-    distribution: (String)    "normal", "poisson", "neg_binomial", "lognormal" or "uniform".
+    DemandGenerator keyword arguments of the three stages of test_stochastic: the port-one loading list,
+    the moments and the scenarios. The moment and scenario stages additionally take
+    current_port_ld=<loading list>. sampling only applies to the scenarios.
     '''
-
     # Set vessel capacity based on size
     if size == "S":
         C = 7476
@@ -47,8 +49,8 @@ def test_stochastic(p, size, middle_leg, loading_only, seed, n_scenarios, distri
     else:
         target_utils_adjusted = target_utils[1:]
 
-    # Generate port 1 LD for stochastic
-    dg = DemandGenerator(
+    # Port 1 LD for stochastic
+    ld_params = dict(
         P=p,
         C=C,
         target_utils=np.ones(1) * 0.90,  # This is correct for current_port LD
@@ -62,16 +64,13 @@ def test_stochastic(p, size, middle_leg, loading_only, seed, n_scenarios, distri
         seed=seed
     )
 
-    loading_list = dg.generate_loading_list()
-
-    # Generate moments for stochastic scenarios
-    dg = DemandGenerator(
+    # Moments for stochastic scenarios
+    moment_params = dict(
         P=p,
         C=C,
         target_utils=target_utils_adjusted,  # This is correct for current_port LD
         current_port=1,
         include_current_port=False,
-        current_port_ld=loading_list,
         middle_leg=middle_leg,
         loading_only=loading_only,
         sparsity=0.0,
@@ -80,16 +79,13 @@ def test_stochastic(p, size, middle_leg, loading_only, seed, n_scenarios, distri
         seed=seed
     )
 
-    mean_demand, std_demand = dg._generate_moments()
-
-    # Generate scenarios
-    dg = DemandGenerator(
+    # Scenarios
+    scenario_params = dict(
         P=p,
         C=C,
         target_utils=target_utils_adjusted,
         current_port=1,
         include_current_port=False,
-        current_port_ld=loading_list,
         middle_leg=None,
         loading_only=loading_only,
         sparsity=0.0,
@@ -97,35 +93,219 @@ def test_stochastic(p, size, middle_leg, loading_only, seed, n_scenarios, distri
         distribution=distribution,
         seed=seed
     )
+    # Only set for the variance-reduced modes, so that the cache keys of plain sampling are unchanged
+    if sampling != "mc":
+        scenario_params["sampling"] = sampling
+
+    return ld_params, moment_params, scenario_params
+
+
+def scenario_stream(size, middle_leg, loading_only, sampling="mc", chunk_size=None, n_workers=None, random_access=False):
+    '''
+    Identity of the random stream behind a scenario set of test_stochastic, stored in the header of its
+    binary file. Two sets of the same P, seed and distribution start with the same scenarios only if their
+    streams are equal. "stream" is "global" (one stream of seed), "chunk" (one stream per chunk, n_workers)
+    or "philox" (one counter-based stream per scenario, random_access); chunk_size is kept where it changes
+    the scenarios.
+    '''
+    if random_access:
+        kind, chunk = "philox", None
+    elif n_workers is not None:
+        kind, chunk = "chunk", 1000 if chunk_size is None else chunk_size
+    else:
+        # Chunking the single stream reproduces it, except for the variance-reduced modes, whose designs cover one chunk
+        kind, chunk = "global", None if sampling == "mc" else chunk_size
+    return dict(size=size, middle_leg=middle_leg, loading_only=loading_only, sampling=sampling, stream=kind, chunk_size=chunk)
+
+
+def random_access_scenarios(p, size, middle_leg, loading_only, seed, n_scenarios, distribution, sampling="mc"):
+    '''
+    The scenario set of test_stochastic(..., random_access=True) without generating or storing it.
+    Returns (loading list dict, scenario_set.CounterScenarioSet); scenario i of the set equals scenario
+    i of the exported file.
+    '''
+    ld_params, moment_params, scenario_params = generator_params(p, size, middle_leg, loading_only, seed, distribution, sampling)
+    loading_list = DemandGenerator(**ld_params).generate_loading_list()
+    dg = DemandGenerator(**moment_params, current_port_ld=loading_list)
+    mean_demand, std_demand = dg._generate_moments()
+    dg = DemandGenerator(**scenario_params, current_port_ld=loading_list)
+    return loading_list, CounterScenarioSet(dg, mean_demand, std_demand, n_scenarios)
+
+
+def test_stochastic(p, size, middle_leg, loading_only, seed, n_scenarios, distribution, output_format="text", chunk_size=None, n_workers=None, cache_dir=None, sampling="mc", random_access=False, extend=None):
+    '''
+    input:
+    p:             (Int)       Amount of ports.
+    size:          (String)    "S", "M" or "L".
+    middle_leg:    (Int)       Last port to include loading.
+    loading_only:  (Boolean)   True/False
+    seed:          (Int)       
+    n_scenarios:   (Int)       Number of scenarios.
+    distribution:  (String)    "normal", "poisson", "neg_binomial", "lognormal" or "uniform".
+    output_format: (String)    "text", "binary" or "both". Binary files (.scn) are read with scenario_io
+                               or read_binary_scenario_instance in Julia. The returned file names are the
+                               binary ones only for "binary".
+    chunk_size:    (Int)       If set, scenarios are generated and appended to the output files in chunks of
+                               this many scenarios, bounding peak memory independently of n_scenarios.
+                               The files are identical to the unchunked export for the same seed.
+    n_workers:     (Int)       If set, chunks are sampled in parallel by this many processes, each chunk from
+                               its own RNG stream derived from seed. The output then depends on seed and
+                               chunk_size (default 1000) but not on n_workers. It differs from the
+                               default single stream output.
+    cache_dir:     (String)    Directory of the demand cache (demand_cache.DemandCache). The loading list,
+                               expected demand and scenario set are read from it when they were already
+                               generated with the same parameters, and stored in it otherwise. Defaults to
+                               the STOWAGE_DEMAND_CACHE environment variable; no caching if neither is set.
+    sampling:      (String)    "mc", "lhs", "qmc" or "antithetic", see DemandGenerator. The designs of the
+                               other modes cover one chunk, so for them chunk_size (best a power of two for
+                               "qmc") changes the scenarios also without n_workers.
+    random_access: (Boolean)   If True, scenario i is drawn from its own counter-based stream of seed
+                               (scenario_set.CounterScenarioSet), so the output depends on seed alone, not on
+                               chunk_size or n_workers, and any scenario can be regenerated without the file.
+                               Needs sampling "mc" or "antithetic".
+    extend:        (String)    Binary scenario file of the same instance with at most n_scenarios scenarios.
+                               The first n scenarios of a set are those of every smaller set of the same
+                               stream (except for "lhs"), so only the missing scenarios are generated and
+                               appended to that file, which is then renamed to this call's file name. The
+                               file must have been written by an earlier call with the same p, size,
+                               middle_leg, loading_only, seed, distribution and stream (scenario_stream of
+                               sampling, chunk_size, n_workers and random_access), as recorded in its header;
+                               any other file is rejected. Needs output_format "binary"; the scenario set is
+                               not cached.
+
+    With the STOWAGE_TRACE environment variable set, the stages are recorded as spans keyed by
+    (P, N, distribution, seed), see tracing.py.
+    '''
+    with tracing.context(P=p, N=n_scenarios, distribution=distribution, seed=seed, size=size, sampling=sampling), \
+         tracing.span("test_stochastic", output_format=output_format) as run:
+        if output_format not in ("text", "binary", "both"):
+            raise ValueError("output_format must be 'text', 'binary' or 'both'")
+        if extend is not None and output_format != "binary":
+            raise ValueError("only binary scenario files can be extended")
+
+        ld_params, moment_params, scenario_params = generator_params(p, size, middle_leg, loading_only, seed, distribution, sampling)
+
+        if cache_dir is None:
+            cache_dir = os.environ.get(ENV_CACHE_DIR)
+        cache = DemandCache(cache_dir) if cache_dir else None
+
+        # Generate port 1 LD for stochastic
+        dg = DemandGenerator(**ld_params)
+
+        with tracing.span("loading_list", cached=cache is not None):
+            if cache is None:
+                loading_list = dg.generate_loading_list()
+            else:
+                ld_key = cache_key("loading_list", ld_params)
+                loading_list = cache.od_dict(ld_key, dg.generate_loading_list, dg.cargo_types)
+
+        # Generate moments for stochastic scenarios
+        dg = DemandGenerator(**moment_params, current_port_ld=loading_list)
+
+        with tracing.span("moments", cached=cache is not None):
+            if cache is None:
+                mean_demand, std_demand = dg._generate_moments()
+            else:
+                # std is cv_demand * mean, so only the expected demand is stored
+                mean_key = cache_key("moments", dict(moment_params, current_port_ld=ld_key))
+                mean_demand = cache.od_dict(mean_key, lambda: dg._generate_moments()[0], dg.cargo_types)
+                std_demand = {ctype: dg.cv_demand * mean_demand[ctype] for ctype in dg.cargo_types}
+
+        # Generate scenarios
+        dg = DemandGenerator(**scenario_params, current_port_ld=loading_list)
+
+        # Stream scenarios in chunks of at most chunk_size so peak memory does not grow with n_scenarios
+        step = 1000 if chunk_size is None else chunk_size
+
+        def generate(start=0):
+            if random_access:
+                return CounterScenarioSet(dg, mean_demand, std_demand, n_scenarios).chunks(step, start)
+            if chunk_size is None and n_workers is None:
+                if start == 0:
+                    return [dg._generate_batch(mean_demand, std_demand, n_scenarios=n_scenarios)]
+                # Chunks reproduce the single stream, the designs of the other modes cover the whole set
+                return dg._generate_chunks(mean_demand, std_demand, n_scenarios=n_scenarios,
+                                           chunk_size=step if sampling == "mc" else n_scenarios, start=start)
+            return dg._generate_chunks(mean_demand, std_demand, n_scenarios=n_scenarios, chunk_size=step,
+                                       n_workers=n_workers, start=start)
+
+        identity = scenario_stream(size, middle_leg, loading_only, sampling, chunk_size, n_workers, random_access)
+        cached_scenarios = None
+        if extend is not None:
+            header = read_scenario_header(extend)
+            if header["stream"] is None:
+                raise ValueError(f"{extend} does not record its generator stream (written before format version 3), "
+                                 f"it cannot be extended")
+            expected = dict(P=p, K=len(dg.cargo_types), seed=seed, distribution=distribution, layout="triu", start_port=dg.start_port,
+                            stream=json.loads(json.dumps(identity)))
+            found = {key: header[key] for key in expected}
+            if found != expected or header["cargo_types"] != dg.cargo_types:
+                raise ValueError(f"{extend} is not a scenario file of this instance: {found}, expected {expected}")
+            if header["N"] > n_scenarios:
+                raise ValueError(f"{extend} already has {header['N']} scenarios, more than {n_scenarios}")
+            chunks = generate(header["N"])
+        elif cache is None:
+            chunks = generate()
+        else:
+            stream = "counter" if identity["stream"] == "philox" else identity["chunk_size"]
+            scenario_key = cache_key("scenarios", dict(scenario_params, current_port_ld=ld_key, moments=mean_key,
+                                                       n_scenarios=n_scenarios, stream=stream))
+            cached_scenarios = cache.scenario_file(scenario_key, generate, p, dg.cargo_types, dg._to_od_tensor,
+                                                   distribution, seed, start_port=dg.start_port, stream=identity)
+            _, tensor = open_od_tensor(cached_scenarios)
+            chunks = (tensor[i:i + step].to_dense(dtype=int) for i in range(0, len(tensor), step))
+
+        FileName_Port_One = f"{size}_port_one_{p}_{loading_only}_{middle_leg}_{distribution}_{seed}.txt"
+        FileName_Scenarios = f"{size}_scenarios_{p}_{n_scenarios}_{loading_only}_{middle_leg}_{distribution}_{seed}.txt"
+        Binary_Port_One = FileName_Port_One[:-len(".txt")] + ".scn"
+        Binary_Scenarios = FileName_Scenarios[:-len(".txt")] + ".scn"
+
+        text_scenarios = None
+        binary_scenarios = None
+        if output_format in ("binary", "both"):
+            write_scenario_file(Binary_Port_One, ODTensor.from_dense(dg._stack_od(loading_list, dg.cargo_types)[None]), dg.cargo_types, distribution, seed)
+            print(f"LD exported to {Binary_Port_One}")
+            if cached_scenarios is not None:
+                shutil.copyfile(cached_scenarios, Binary_Scenarios)
+            elif extend is not None:
+                binary_scenarios = ScenarioFileWriter.reopen(extend)
+            else:
+                binary_scenarios = ScenarioFileWriter(Binary_Scenarios, p, dg.cargo_types, distribution, seed, dtype=None, layout="triu", start_port=dg.start_port,
+                                                       stream=identity)
+        if output_format in ("text", "both"):
+            # Export loading_list to a .txt file
+            with open(FileName_Port_One, "w") as f:
+                write_text_header(f, p, 1, cargo_types)
+                write_text_matrices(f, dg._stack_od(loading_list, dg.cargo_types))
+            print(f"LD exported to {FileName_Port_One}")
+            text_scenarios = open(FileName_Scenarios, "w")
+            write_text_header(text_scenarios, p, n_scenarios, cargo_types)
+
+        # Sampling happens while the chunks are consumed, so it is the part of this span outside write_chunk
+        with tracing.span("scenarios", scenarios=n_scenarios, cargo_types=len(dg.cargo_types)):
+            if binary_scenarios is not None or text_scenarios is not None:
+                for chunk in chunks:
+                    with tracing.span("write_chunk", scenarios=len(chunk)):
+                        if binary_scenarios is not None:
+                            binary_scenarios.append(dg._to_od_tensor(chunk))
+                        if text_scenarios is not None:
+                            write_text_matrices(text_scenarios, chunk)
+            if binary_scenarios is not None:
+                binary_scenarios.close()
+            if text_scenarios is not None:
+                text_scenarios.close()
 
-    scenarios = dg._generate(mean_demand, std_demand, n_scenarios=n_scenarios)
-
-    # Export loading_list to a .txt file
-    FileName_Port_One = f"{size}_port_one_{p}_{loading_only}_{middle_leg}_{distribution}_{seed}.txt"
-    with open(FileName_Port_One, "w") as f:
-        f.write(f"{p} 1\n")
-        for ctype in cargo_types:
-            size_val, weight, ctype_str = ctype
-            size_int = int(str(size_val).replace('ft', ''))
-            f.write(f"{size_int} {weight} {ctype_str}\n")
-        for ctype in dg.cargo_types:
-            matrix = loading_list[ctype]
-            for row in matrix:
-                f.write(" ".join(str(int(x)) for x in row) + "\n")
-    print(f"LD exported to {FileName_Port_One}")
-
-    # Data file name, automatically set based on number of ports and scenarios
-    FileName_Scenarios = f"{size}_scenarios_{p}_{n_scenarios}_{loading_only}_{middle_leg}_{distribution}_{seed}.txt"
-    with open(FileName_Scenarios, "w") as f:
-        f.write(f"{p} {n_scenarios}\n")
-        for ctype in cargo_types:
-            size_val, weight, ctype_str = ctype
-            size_int = int(str(size_val).replace('ft', ''))
-            f.write(f"{size_int} {weight} {ctype_str}\n")
-        for scenario in scenarios:
-            for ctype in dg.cargo_types:
-                matrix = scenario[ctype]
-                for row in matrix:
-                    f.write(" ".join(str(int(x)) for x in row) + "\n")
-    print(f"Scenarios exported to {FileName_Scenarios}")
-    return FileName_Port_One, FileName_Scenarios
\ No newline at end of file
+        written = []
+        if output_format in ("binary", "both"):
+            if extend is not None and os.path.abspath(extend) != os.path.abspath(Binary_Scenarios):
+                os.replace(extend, Binary_Scenarios)
+            print(f"Scenarios exported to {Binary_Scenarios}")
+            written += [Binary_Port_One, Binary_Scenarios]
+        if output_format in ("text", "both"):
+            print(f"Scenarios exported to {FileName_Scenarios}")
+            written += [FileName_Port_One, FileName_Scenarios]
+        if tracing.enabled():
+            run.add(bytes=sum(os.path.getsize(path) for path in written))
+        if output_format == "binary":
+            return Binary_Port_One, Binary_Scenarios
+        return FileName_Port_One, FileName_Scenarios
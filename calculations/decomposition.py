@@ -0,0 +1,474 @@
+"""
+L-shaped decomposition of the two-stage stowage model with parallel scenario subproblems.
+
+In build_stochastic_model_2 the scenario variables (s, delta, y_O, q) of different scenarios
+never share a row; they are linked only through the first-stage stowage x and the unloaded
+containers z of port one. The extensive form therefore splits into a master problem over (x, z)
+and one recourse problem per scenario, whose constraints read b_i - T_i x for the fixed x.
+
+The recourse problems contain the binary overstowage indicators delta, so their value functions
+are not convex and Benders cuts only exist for their LP relaxation. This module runs the
+multi-cut L-shaped method (Birge & Louveaux, 1988) on that relaxation: every iteration solves
+the master LP, solves all scenario LPs in parallel worker processes with HiGHS
+(scipy.optimize.linprog) and adds one optimality cut per scenario from the LP duals. The
+scenarios are queried between the master solution and the best plan so far (in-out
+stabilization, Ben-Ameur & Neto, 2007), which damps the oscillation of the master. The master
+objective is a lower bound for the MIP, since it bounds the LP relaxation from below.
+
+The integer part is handled by evaluating and improving first-stage plans. A plan is evaluated
+exactly by solving the scenario MIPs for it in parallel (scipy.optimize.milp), which gives a
+feasible solution of the extensive form and an upper bound. The candidates are the best LP plan,
+the last master plan and an optional incumbent, such as the greedy plan of stowage_heuristic.py.
+Each of them is improved by fix-and-optimize rounds: the overstowage indicators of every
+scenario are fixed to their values in its MIP solution, which leaves a convex two-stage LP that
+the same L-shaped loop solves, and the plan found is evaluated with the scenario MIPs again. The
+fixed problem contains the current solution, so a round can only improve the plan; the rounds
+stop when one does not, and the best plan over all candidates is kept. This does not prove optimality. The lower bound stays that of
+the LP relaxation, and the reported gap includes the integrality gap of the recourse.
+
+Capacity and constraint (8) rows of a scenario can be violated by x alone, whatever the
+scenario does, so the master also gets the rows they induce on x (with the scenario variables
+at their most favourable bounds, identical rows merged). With them every master solution has a
+feasible recourse (s = 0, q = demand, delta = 1 and y_O large), so no feasibility cuts are needed.
+
+    python decomposition.py S_port_one_8_False_None_uniform_1.scn clustered_10.txt --workers 32 --greedy --output plan.npz
+"""
+
+import argparse
+import math
+import os
+import time
+from multiprocessing import Pool
+
+import numpy as np
+from scipy.optimize import Bounds, LinearConstraint, linprog, milp
+from scipy.sparse import coo_matrix, csr_matrix, vstack
+
+from mps_writer import assemble_model, read_demand
+from ship_reader import read_ship_instance
+from stowage_heuristic import greedy_stowage
+
+FIRST_STAGE = ("x", "z")
+FIRST_STAGE_BLOCKS = ("load_list_current", "load_list_current_balance")
+
+
+# ---------- Splitting ----------
+def split_model(model):
+    """
+    Split an assembled model (mps_writer.assemble_model) into the first stage and its scenarios.
+
+    Returns
+    -------
+    master : dict
+        "columns" (indices of x and z in the model), "A", "sense", "rhs" of the first-stage rows
+        and "objective" of the first-stage columns.
+    scenarios : list of dict
+        Per scenario "columns" (its own columns in the model), "W" and "T" (its rows over its own
+        and the first-stage columns), "sense", "rhs", "objective", "upper" (1 for delta, inf
+        otherwise) and "integrality".
+    """
+    n_rows, n_cols = model["n_rows"], model["n_cols"]
+    N = model["layout"]["delta"][1][0]
+    col_scenario = np.full(n_cols, -1, dtype=np.int64)
+    for name, (start, shape) in model["layout"].items():
+        if name not in FIRST_STAGE:
+            size = int(np.prod(shape))
+            col_scenario[start:start + size] = np.arange(size) // (size // N)
+    row_scenario = np.full(n_rows, -1, dtype=np.int64)
+    for name, (start, size) in model["row_blocks"].items():
+        if name not in FIRST_STAGE_BLOCKS:
+            row_scenario[start:start + size] = np.arange(size) // (size // N)
+
+    A = coo_matrix((model["values"], (model["rows"], model["cols"])), shape=(n_rows, n_cols)).tocsr()
+    first = np.flatnonzero(col_scenario < 0)
+    first_rows = np.flatnonzero(row_scenario < 0)
+    master = dict(columns=first, A=A[first_rows][:, first], sense=model["sense"][first_rows],
+                  rhs=model["rhs"][first_rows], objective=model["objective"][first])
+
+    scenarios = []
+    rows_by_scenario = np.argsort(row_scenario, kind="stable")
+    cols_by_scenario = np.argsort(col_scenario, kind="stable")
+    row_starts = np.searchsorted(row_scenario[rows_by_scenario], np.arange(N + 1))
+    col_starts = np.searchsorted(col_scenario[cols_by_scenario], np.arange(N + 1))
+    for i in range(N):
+        rows = rows_by_scenario[row_starts[i]:row_starts[i + 1]]
+        cols = cols_by_scenario[col_starts[i]:col_starts[i + 1]]
+        block = A[rows]
+        integrality = model["integrality"][cols]
+        scenarios.append(dict(columns=cols, W=block[:, cols], T=block[:, first], sense=model["sense"][rows],
+                              rhs=model["rhs"][rows], objective=model["objective"][cols],
+                              upper=np.where(integrality == 1, 1.0, np.inf), integrality=integrality))
+    return master, scenarios
+
+
+def first_stage_vector(model, x, z, columns):
+    """
+    Values of the first-stage columns of an assembled model for a plan x (T, DEP, L), z (T, DEP).
+    """
+    values = np.zeros(model["n_cols"])
+    for name, plan in (("x", x), ("z", z)):
+        start, shape = model["layout"][name]
+        if np.shape(plan) != tuple(shape):
+            raise ValueError(f"plan {name} has shape {np.shape(plan)}, the model expects {tuple(shape)}")
+        values[start:start + plan.size] = np.ravel(plan)
+    return values[columns]
+
+
+def _bounds(scenario, fixed=None):
+    """
+    Lower and upper bounds of the recourse columns, with the binary columns fixed to the values
+    fixed if given.
+    """
+    lower, upper = np.zeros(len(scenario["upper"])), scenario["upper"].copy()
+    if fixed is not None:
+        binary = scenario["integrality"] == 1
+        lower[binary] = upper[binary] = fixed
+    return lower, upper
+
+
+def induced_rows(scenarios, fixed=None):
+    """
+    First-stage rows implied by the scenario rows: for a <= row with first-stage part T x and
+    recourse part W y, T x <= b - min(W y) over the bounds of y. Rows where W y is unbounded below
+    imply nothing. Identical rows of different scenarios are merged. fixed optionally holds per
+    scenario the values its binary columns are fixed to.
+
+    Returns (A, rhs) over the first-stage columns, all rows <=.
+    """
+    seen = {}
+    for i, scenario in enumerate(scenarios):
+        W, T = scenario["W"], scenario["T"]
+        lower, upper = _bounds(scenario, None if fixed is None else fixed[i])
+        # most negative value of each row's recourse part, -inf if a negative coefficient is unbounded
+        negative = W.multiply(W < 0).tocsr()
+        lowest = negative @ np.where(np.isinf(upper), 0.0, upper) + W.multiply(W > 0).tocsr() @ lower
+        unbounded = (negative @ np.isinf(upper).astype(float)) < 0
+        for r in np.flatnonzero((scenario["sense"] == "L") & ~unbounded & (np.diff(T.indptr) > 0)):
+            lo, hi = T.indptr[r], T.indptr[r + 1]
+            key = (T.indices[lo:hi].tobytes(), T.data[lo:hi].tobytes())
+            bound = scenario["rhs"][r] - lowest[r]
+            if key not in seen or bound < seen[key][2]:
+                seen[key] = (T.indices[lo:hi].copy(), T.data[lo:hi].copy(), bound)
+    n_first = scenarios[0]["T"].shape[1] if scenarios else 0
+    if not seen:
+        return csr_matrix((0, n_first)), np.zeros(0)
+    indices, data, rhs = zip(*seen.values())
+    indptr = np.concatenate([[0], np.cumsum([len(i) for i in indices])])
+    return csr_matrix((np.concatenate(data), np.concatenate(indices), indptr), shape=(len(rhs), n_first)), np.array(rhs)
+
+
+# ---------- Scenario subproblems ----------
+_SCENARIOS = None
+
+
+def _init_worker(scenarios):
+    global _SCENARIOS
+    _SCENARIOS = scenarios
+
+
+def _rows(scenario, x):
+    b = scenario["rhs"] - scenario["T"] @ x
+    ub, eq = scenario["sense"] == "L", scenario["sense"] == "E"
+    return ub, eq, b
+
+
+def solve_recourse_lp(scenario, x, fixed=None):
+    """
+    LP relaxation of one recourse problem for the first-stage values x, with the binary columns
+    fixed to the values fixed if given.
+
+    Returns (value, gradient): the optimal value Q(x) and a subgradient of Q at x over the
+    first-stage columns, from the duals of the rows (and thus a cut Q(y) >= value + gradient (y - x)).
+    """
+    ub, eq, b = _rows(scenario, x)
+    W = scenario["W"]
+    result = linprog(scenario["objective"], A_ub=W[ub], b_ub=b[ub], A_eq=W[eq], b_eq=b[eq],
+                     bounds=np.column_stack(_bounds(scenario, fixed)), method="highs")
+    if result.status != 0:
+        raise RuntimeError(f"recourse LP not solved: {result.message}")
+    duals = np.zeros(len(b))
+    duals[ub] = result.ineqlin.marginals
+    duals[eq] = result.eqlin.marginals
+    return result.fun, -(scenario["T"].T @ duals)
+
+
+def solve_recourse_mip(scenario, x, time_limit=None, mip_gap=None):
+    """
+    Recourse MIP of one scenario for the first-stage values x. Returns (value, bound, status), where
+    bound is the dual bound HiGHS proved (equal to value when solved to optimality).
+    """
+    result = _recourse_mip(scenario, x, time_limit, mip_gap)
+    bound = getattr(result, "mip_dual_bound", None)
+    return result.fun, result.fun if bound is None else bound, result.status
+
+
+def _recourse_mip(scenario, x, time_limit=None, mip_gap=None):
+    ub, eq, b = _rows(scenario, x)
+    lower = np.where(eq, b, -np.inf)
+    options = {}
+    if time_limit is not None:
+        options["time_limit"] = time_limit
+    if mip_gap is not None:
+        options["mip_rel_gap"] = mip_gap
+    result = milp(scenario["objective"], constraints=LinearConstraint(scenario["W"], lower, b),
+                  integrality=scenario["integrality"], bounds=Bounds(0.0, scenario["upper"]), options=options)
+    if result.x is None:
+        raise RuntimeError(f"recourse MIP not solved: {result.message}")
+    return result
+
+
+def _lp_task(task):
+    i, x, fixed = task
+    return i, solve_recourse_lp(_SCENARIOS[i], x, fixed)
+
+
+def _mip_task(task):
+    # value, dual bound and the values of the binary columns
+    i, x, time_limit, mip_gap = task
+    scenario = _SCENARIOS[i]
+    result = _recourse_mip(scenario, x, time_limit, mip_gap)
+    bound = getattr(result, "mip_dual_bound", None)
+    return i, (result.fun, result.fun if bound is None else bound, np.rint(result.x[scenario["integrality"] == 1]))
+
+
+# ---------- L-shaped method ----------
+def _solve_master(master, induced, cuts, n_scenarios):
+    """
+    Master LP over the first stage and one theta per scenario.
+    cuts is a list of (scenario, gradient, constant) with theta_i >= constant + gradient x.
+    """
+    n_first = len(master["columns"])
+    c = np.concatenate([master["objective"], np.ones(n_scenarios)])
+    ub, eq = master["sense"] == "L", master["sense"] == "E"
+    pad = lambda A: csr_matrix((A.data, A.indices, A.indptr), shape=(A.shape[0], n_first + n_scenarios))
+    blocks = [pad(master["A"][ub]), pad(induced[0])]
+    b_ub = [master["rhs"][ub], induced[1]]
+    if cuts:
+        scenario, gradient, constant = zip(*cuts)
+        theta = coo_matrix((-np.ones(len(cuts)), (np.arange(len(cuts)), n_first + np.array(scenario))),
+                           shape=(len(cuts), n_first + n_scenarios))
+        blocks.append(pad(csr_matrix(np.array(gradient))) + theta)
+        b_ub.append(-np.array(constant))
+    result = linprog(c, A_ub=vstack(blocks).tocsr(), b_ub=np.concatenate(b_ub), A_eq=pad(master["A"][eq]),
+                     b_eq=master["rhs"][eq], bounds=(0, None), method="highs")
+    if result.status != 0:
+        raise RuntimeError(f"master LP not solved: {result.message}")
+    return result.x[:n_first], result.x[n_first:], result.fun
+
+
+def _cutting_planes(pool, master, induced, n_scenarios, fixed, tolerance, max_iter, deadline, alpha, verbose, start,
+                    label=""):
+    """
+    Multi-cut L-shaped loop on the LP relaxation of the recourse, with the binary columns of
+    scenario i fixed to fixed[i] unless fixed is None.
+
+    Returns (lower_bound, best_value, best_x, x, history): the last master objective, the LP value
+    and plan of the best query point, the last master solution and one dict per iteration.
+    """
+    c1 = master["objective"]
+    cuts, history = [], []
+    best_value, best_x = math.inf, None
+    for iteration in range(1, max_iter + 1):
+        x, theta, lower_bound = _solve_master(master, induced, cuts, n_scenarios)
+        # In-out stabilization: query the scenarios between the master point and the best plan
+        # so far; the cuts are valid anywhere, only those violated at the master point count.
+        # If none is, query the master point itself before concluding.
+        for weight in ((alpha, 1.0) if best_x is not None and alpha < 1.0 else (1.0,)):
+            query = x if weight == 1.0 else weight * x + (1.0 - weight) * best_x
+            values = np.empty(n_scenarios)
+            new_cuts = 0
+            tasks = ((i, query, None if fixed is None else fixed[i]) for i in range(n_scenarios))
+            for i, (value, gradient) in pool.imap_unordered(_lp_task, tasks):
+                values[i] = value
+                cut = value + gradient @ (x - query)
+                if cut > theta[i] + tolerance * max(1.0, abs(cut)) / n_scenarios:
+                    cuts.append((i, gradient, value - gradient @ query))
+                    new_cuts += 1
+            lp_value = float(c1 @ query + values.sum())
+            if lp_value < best_value:
+                best_value, best_x = lp_value, query
+            if new_cuts:
+                break
+        gap = (best_value - lower_bound) / max(abs(best_value), 1e-9)
+        history.append(dict(iteration=iteration, lower_bound=lower_bound, lp_value=lp_value, best=best_value,
+                            cuts=len(cuts), time=time.perf_counter() - start))
+        if verbose:
+            print(f"{label}{iteration:>4} {lower_bound:>14.4f} {lp_value:>14.4f} {best_value:>14.4f} {100 * gap:>8.3f}% "
+                  f"{new_cuts:>5} cuts {history[-1]['time']:>8.1f}s", flush=True)
+        if gap <= tolerance or new_cuts == 0:
+            break
+        if deadline is not None and time.perf_counter() > deadline:
+            break
+    return lower_bound, best_value, best_x, x, history
+
+
+def _evaluate(pool, plan, c1, n_scenarios, mip_time_limit, mip_gap):
+    """
+    MIP value of a first-stage plan: (value, bound, scenario costs, binary values per scenario).
+    """
+    costs, bounds, binaries = np.empty(n_scenarios), np.empty(n_scenarios), [None] * n_scenarios
+    tasks = ((i, plan, mip_time_limit, mip_gap) for i in range(n_scenarios))
+    for i, (value, bound, binary) in pool.imap_unordered(_mip_task, tasks):
+        costs[i], bounds[i], binaries[i] = value, bound, binary
+    return float(c1 @ plan + costs.sum()), float(c1 @ plan + bounds.sum()), costs, binaries
+
+
+def l_shaped(model, n_workers=None, tolerance=1e-4, max_iter=200, time_limit=None, alpha=0.5, mip=True,
+             mip_time_limit=None, mip_gap=None, verbose=True, incumbent=None, improve_rounds=5):
+    """
+    Solve an assembled model with the multi-cut L-shaped method on the LP relaxation of the
+    recourse, then evaluate the candidate first-stage plans with the scenario MIPs and improve each
+    of them by fix-and-optimize rounds.
+
+    Parameters
+    ----------
+    model : dict
+        Model from mps_writer.assemble_model.
+    n_workers : int, optional
+        Worker processes for the scenario problems; all cores if None.
+    tolerance : float
+        Relative gap between the master bound and the LP value of the best plan at which to stop,
+        and smallest relative improvement that continues the fix-and-optimize rounds.
+    max_iter : int
+        Maximum number of master iterations per L-shaped loop.
+    time_limit : float, optional
+        Seconds after which no new iteration or round is started.
+    alpha : float
+        In-out stabilization weight of the master point; the scenarios are queried at
+        alpha * x_master + (1 - alpha) * x_best. 1 disables the stabilization.
+    mip : bool
+        Solve the scenario MIPs for the candidate plans to get a feasible solution and upper bound.
+    mip_time_limit, mip_gap : float, optional
+        HiGHS time limit and relative gap per scenario MIP.
+    incumbent : tuple, optional
+        First-stage plan (x, z) in the layout shapes, e.g. of stowage_heuristic.greedy_stowage,
+        evaluated as one more candidate.
+    improve_rounds : int
+        Maximum number of fix-and-optimize rounds per candidate, 0 to only evaluate the candidates.
+
+    Returns
+    -------
+    result : dict
+        "lower_bound" (valid for the MIP), "lp_value" of the best LP plan, "upper_bound" (MIP value
+        of the returned plan, None without mip), "mip_bound" (lower bound of that evaluation),
+        "source" (the candidate or round the plan comes from), "x", "z" (first-stage values in the
+        layout shapes), "iterations" (list of dicts with "iteration", "lower_bound", "lp_value",
+        "best", "cuts", "time" of the LP relaxation), "rounds" (list of dicts with "candidate",
+        "round", "value", "time" of the fix-and-optimize rounds) and "scenario_costs" (MIP recourse
+        cost of each scenario, weighted as in the objective).
+    """
+    start = time.perf_counter()
+    deadline = None if time_limit is None else start + time_limit
+    master, scenarios = split_model(model)
+    N = len(scenarios)
+    c1 = master["objective"]
+    rounds = []
+
+    with Pool(n_workers, initializer=_init_worker, initargs=(scenarios,)) as pool:
+        lower_bound, best_value, best_x, x, history = _cutting_planes(
+            pool, master, induced_rows(scenarios), N, None, tolerance, max_iter, deadline, alpha, verbose, start)
+
+        upper_bound = mip_bound = scenario_costs = None
+        plan_x, source = best_x, "best LP plan"
+        if mip:
+            # Split stowage of a stabilized plan switches on more overstowage indicators than a
+            # vertex, so the last master solution is evaluated as well and the better plan kept.
+            candidates = [("best LP plan", best_x)]
+            if not np.array_equal(x, best_x):
+                candidates.append(("last master plan", x))
+            if incumbent is not None:
+                candidates.append(("incumbent", first_stage_vector(model, *incumbent, master["columns"])))
+            for name, plan in candidates:
+                value, bound, costs, binaries = _evaluate(pool, plan, c1, N, mip_time_limit, mip_gap)
+                if verbose:
+                    print(f"MIP value of the {name} {value:.4f}", flush=True)
+                # Fix-and-optimize: with the indicators fixed the recourse is convex and the current
+                # plan is feasible, so the L-shaped optimum of the fixed problem is at least as good.
+                # Every candidate is improved, as the rounds end in different local optima.
+                r = 0
+                while True:
+                    if upper_bound is None or value < upper_bound:
+                        upper_bound, mip_bound, scenario_costs = value, bound, costs
+                        plan_x, source = plan, name if r == 0 else f"{name}, fix-and-optimize round {r}"
+                    if r == improve_rounds or (deadline is not None and time.perf_counter() > deadline):
+                        break
+                    r += 1
+                    _, _, improved, _, _ = _cutting_planes(pool, master, induced_rows(scenarios, binaries), N, binaries,
+                                                           tolerance, max_iter, deadline, alpha, False, start)
+                    result = _evaluate(pool, improved, c1, N, mip_time_limit, mip_gap)
+                    rounds.append(dict(candidate=name, round=r, value=result[0], time=time.perf_counter() - start))
+                    if verbose:
+                        print(f"MIP value after fix-and-optimize round {r} {result[0]:.4f}", flush=True)
+                    if result[0] >= value - tolerance * max(1.0, abs(value)):
+                        break
+                    plan, (value, bound, costs, binaries) = improved, result
+            if verbose:
+                print(f"Upper bound {upper_bound:.4f} from the {source} (lower bound {lower_bound:.4f}, "
+                      f"gap {100 * (upper_bound - lower_bound) / max(abs(upper_bound), 1e-9):.2f}%)", flush=True)
+
+    values = np.zeros(model["n_cols"])
+    values[master["columns"]] = plan_x
+    (x0, x_shape), (z0, z_shape) = model["layout"]["x"], model["layout"]["z"]
+    return dict(lower_bound=lower_bound, lp_value=best_value, upper_bound=upper_bound, mip_bound=mip_bound, source=source,
+                x=values[x0:x0 + int(np.prod(x_shape))].reshape(x_shape),
+                z=values[z0:z0 + int(np.prod(z_shape))].reshape(z_shape),
+                iterations=history, rounds=rounds, scenario_costs=scenario_costs)
+
+
+def save_plan(path, x, z, P):
+    """
+    Store a first-stage plan: x (T, DEP, L) and z (T, DEP) with transports in sorted (origin,
+    destination) order, as in mps_writer.assemble_model.
+    """
+    np.savez(path, x=x, z=z, P=P)
+
+
+def load_plan(path):
+    """
+    Read a plan written by save_plan. Returns (x, z, P).
+    """
+    with np.load(path) as plan:
+        return plan["x"], plan["z"], int(plan["P"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve the two-stage stowage model by L-shaped decomposition over parallel scenario LPs.")
+    parser.add_argument("port_one", help="port one loading list (.scn or text)")
+    parser.add_argument("scenarios", help="scenarios or clustered instance (.scn or text, with cluster counts)")
+    parser.add_argument("--ship", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "Ships", "Small_ship.txt"))
+    parser.add_argument("--n-scenarios", type=int, default=None, help="sampled scenarios behind the clusters (default: sum of counts)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--tolerance", type=float, default=1e-4, help="relative gap of the LP relaxation to stop at")
+    parser.add_argument("--max-iter", type=int, default=200)
+    parser.add_argument("--time-limit", type=float, default=None, help="seconds after which no new iteration starts")
+    parser.add_argument("--alpha", type=float, default=0.5, help="in-out stabilization weight, 1 to disable")
+    parser.add_argument("--no-mip", action="store_true", help="do not evaluate the plan with the scenario MIPs")
+    parser.add_argument("--mip-time-limit", type=float, default=None, help="HiGHS time limit per scenario MIP")
+    parser.add_argument("--mip-gap", type=float, default=None, help="HiGHS relative gap per scenario MIP")
+    parser.add_argument("--greedy", action="store_true", help="evaluate the greedy plan of stowage_heuristic.py as well")
+    parser.add_argument("--incumbent", default=None, help="first-stage plan (.npz of save_plan) to evaluate as well")
+    parser.add_argument("--improve-rounds", type=int, default=5, help="fix-and-optimize rounds, 0 to disable")
+    parser.add_argument("--output", default=None, help="write the first-stage plan to this .npz file")
+    args = parser.parse_args()
+
+    ship = read_ship_instance(args.ship)
+    _, port_one, _ = read_demand(args.port_one)
+    header, demand, counts = read_demand(args.scenarios)
+    model = assemble_model(port_one, demand, ship, header["cargo_types"], counts, args.n_scenarios)
+    print(f"{'iter':>4} {'lower bound':>14} {'LP value':>14} {'best LP':>14} {'gap':>9}")
+    incumbent = None
+    if args.incumbent:
+        incumbent = load_plan(args.incumbent)[:2]
+    elif args.greedy:
+        solution = greedy_stowage(port_one, demand, ship, header["cargo_types"], counts, args.n_scenarios)
+        incumbent = solution["x"], solution["z"]
+        print(f"Greedy plan with objective {solution['objective']:.4f}")
+    result = l_shaped(model, args.workers, args.tolerance, args.max_iter, args.time_limit, args.alpha, not args.no_mip,
+                      args.mip_time_limit, args.mip_gap, incumbent=incumbent, improve_rounds=args.improve_rounds)
+    if args.output:
+        save_plan(args.output, result["x"], result["z"], header["P"])
+        print(f"First-stage plan exported to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
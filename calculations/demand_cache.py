@@ -0,0 +1,212 @@
+"""
+Content-addressed on-disk cache for generated demand.
+
+`data_generation.test_stochastic` rebuilds the port-one loading list, the expected demand and
+every scenario on each call, and the Julia drivers call it again for every port, seed and
+distribution. Each of these artifacts is a deterministic function of the generator parameters,
+so it is stored once under the SHA-256 of those parameters, in the binary scenario format of
+scenario_io, and reused by any later call with the same inputs.
+
+Keys are chained: the expected demand key contains the loading list key and the scenario key
+contains the expected demand key, so changing an upstream parameter invalidates everything
+built on it. A fingerprint of authentic_generator_np.py is part of every key, so editing the
+generator invalidates the whole cache.
+
+Entries are single files written to a temporary name and renamed into place, so an interrupted
+run never leaves a partial entry behind. The cache is bounded by `max_bytes` and evicts the
+least recently used entries; a hit refreshes an entry's modification time.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from functools import lru_cache
+
+import numpy as np
+
+from od_tensor import ODTensor
+from scenario_io import ScenarioFileWriter, open_od_tensor, write_scenario_file
+
+CACHE_VERSION = 1
+DEFAULT_MAX_BYTES = 20 * 1024**3
+ENV_CACHE_DIR = "STOWAGE_DEMAND_CACHE"
+SUFFIX = ".scn"
+
+
+@lru_cache(maxsize=None)
+def _generator_fingerprint():
+    """
+    SHA-256 of the generator source, so cached demand is rebuilt when the generator changes.
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "authentic_generator_np.py")
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _canonical(value):
+    """
+    Convert parameters to a JSON-serializable form with a unique text representation.
+    """
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in sorted(value.items(), key=lambda item: str(item[0]))}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def cache_key(kind: str, params: dict):
+    """
+    Hex SHA-256 identifying an artifact of the given kind built from params.
+
+    Parameters
+    ----------
+    kind : str
+        Artifact kind, e.g. "loading_list", "moments" or "scenarios".
+    params : dict
+        Every input that determines the artifact. Values may be nested lists, tuples, dicts,
+        NumPy arrays or scalars; 2.0 and 2 hash the same.
+    """
+    payload = {"cache_version": CACHE_VERSION, "generator": _generator_fingerprint(), "kind": kind, "params": _canonical(params)}
+    text = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class DemandCache:
+    """
+    Size-bounded LRU cache of binary scenario files keyed by content hash.
+
+    Parameters
+    ----------
+    root : str, optional
+        Cache directory. Defaults to the STOWAGE_DEMAND_CACHE environment variable, or
+        ~/.cache/stowage_demand if that is unset. Created if missing.
+    max_bytes : int, optional
+        Total size the cache is trimmed to after every insert. Defaults to 20 GiB.
+    """
+
+    def __init__(self, root=None, max_bytes: int = DEFAULT_MAX_BYTES):
+        if root is None:
+            root = os.environ.get(ENV_CACHE_DIR, os.path.join(os.path.expanduser("~"), ".cache", "stowage_demand"))
+        self.root = os.path.abspath(root)
+        self.max_bytes = int(max_bytes)
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, key: str):
+        return os.path.join(self.root, key[:2], key + SUFFIX)
+
+    def get(self, key: str):
+        """
+        Path of the cached artifact, or None on a miss. A hit marks the entry as recently used.
+        """
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key: str, write):
+        """
+        Store an artifact. `write(path)` must create the file at the given temporary path.
+        Returns the path of the cached entry.
+        """
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        os.close(fd)
+        try:
+            write(tmp)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self.evict(keep=key)
+        return path
+
+    def _entries(self):
+        entries = []
+        for sub in os.listdir(self.root):
+            directory = os.path.join(self.root, sub)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if name.endswith(SUFFIX):
+                    stat = os.stat(os.path.join(directory, name))
+                    entries.append((stat.st_mtime, stat.st_size, name[:-len(SUFFIX)]))
+        return entries
+
+    def size(self):
+        """
+        Total size in bytes of all cached artifacts.
+        """
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, keep: str = None):
+        """
+        Remove least recently used entries until the cache fits into max_bytes.
+        The entry `keep` is never removed, even if it alone exceeds the budget.
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """
+        Remove every cached artifact.
+        """
+        for sub in os.listdir(self.root):
+            directory = os.path.join(self.root, sub)
+            if os.path.isdir(directory):
+                shutil.rmtree(directory)
+
+    # ---------- OD dictionaries ----------
+    def od_dict(self, key: str, build, cargo_types: list):
+        """
+        Cached dict of cargo_type -> OD matrix, as returned by `generate_loading_list` or the
+        expected demand of `_generate_moments`. On a miss, `build()` is called and its result stored.
+        """
+        path = self.get(key)
+        if path is not None:
+            _, tensor = open_od_tensor(path)
+            dense = tensor.to_dense(dtype=int)[0]
+            return {ctype: dense[k] for k, ctype in enumerate(cargo_types)}
+        od = build()
+        stacked = np.stack([od[ctype] for ctype in cargo_types])
+        self.put(key, lambda tmp: write_scenario_file(tmp, ODTensor.from_dense(stacked[None]), cargo_types))
+        return od
+
+    # ---------- Scenario sets ----------
+    def scenario_file(self, key: str, generate, P: int, cargo_types: list, to_tensor, distribution=None, seed=None, start_port: int = 0,
+                      stream=None):
+        """
+        Path of a cached triu scenario file. On a miss, every batch of the iterable returned by
+        `generate()` is converted with `to_tensor` and appended to a new entry, whose header
+        records the generator stream.
+        """
+        path = self.get(key)
+        if path is not None:
+            return path
+
+        def write(tmp):
+            with ScenarioFileWriter(tmp, P, cargo_types, distribution, seed, dtype=None, layout="triu", start_port=start_port,
+                                    stream=stream) as writer:
+                for batch in generate():
+                    writer.append(to_tensor(batch))
+
+        return self.put(key, write)
@@ -0,0 +1,288 @@
+"""
+Out-of-sample evaluation of a fixed first-stage plan (EEV, VSS).
+
+The comparison drivers compute the EEV by rebuilding the stochastic model with the deterministic
+x and z fixed by equality constraints and solving it as one MIP. With the first stage fixed the
+model separates by scenario, so here every scenario's recourse MIP is assembled and solved on
+its own in a pool of worker processes (HiGHS through decomposition.solve_recourse_mip), and the
+costs are accumulated as they come in. The scenario set can be any scenario file, including a
+clustered instance with its counts, or a fresh draw of the DemandGenerator with another sample
+seed, streamed in chunks so that its size is not limited by memory.
+
+StochasticModel_2.5.jl lets constraint (8) of scenario i read locations_under[i], so the recourse
+problem depends on the position of a scenario in its set. Each scenario is assembled at its
+position, which reproduces the EEV of the drivers; sets larger than the number of ship
+locations, which the Julia model cannot be built for, wrap around.
+
+For sampled scenarios the expected cost is reported with a Student t confidence interval. For a
+clustered instance the counts are used as frequency weights, which reproduces the EEV objective
+of the drivers but treats the cluster centers as if they were the sampled scenarios.
+
+    python evaluate_plan.py first_stage_S_8_15000_uniform_1.npz S_port_one_8_False_None_uniform_1.scn \
+        --sample 100000 --size S --distribution uniform --seed 1 --sample-seed 2 --workers 32
+"""
+
+import argparse
+import csv
+import math
+import time
+from multiprocessing import Pool
+
+import numpy as np
+from scipy.stats import t as student_t
+
+from decomposition import first_stage_vector, load_plan, solve_recourse_mip, split_model
+from mps_writer import assemble_model, read_demand
+from ship_reader import read_ship_instance
+
+
+# ---------- Scenario subproblems ----------
+_CONTEXT = None
+
+
+def _init_worker(port_one, ship, cargo_types, x, z, factor_overstow):
+    global _CONTEXT
+    _CONTEXT = (port_one, ship, cargo_types, x, z, factor_overstow)
+
+
+def recourse_cost(demand, index, port_one, ship, cargo_types, x, z, factor_overstow=10, time_limit=None, mip_gap=None):
+    """
+    Recourse cost of one scenario (K, P, P) at position index of its set for the plan (x, z),
+    unweighted. Constraint (8) of the scenario reads locations_under[index], wrapped around for
+    sets larger than the ship.
+
+    Returns (value, bound, status) as decomposition.solve_recourse_mip, with value and bound NaN
+    if HiGHS found no feasible recourse (status then holds the message).
+    """
+    model = assemble_model(port_one, demand[None], ship, cargo_types, factor_overstow=factor_overstow,
+                           first_index=index % len(ship.locations_under))
+    master, (scenario,) = split_model(model)
+    try:
+        return solve_recourse_mip(scenario, first_stage_vector(model, x, z, master["columns"]), time_limit, mip_gap)
+    except RuntimeError as error:
+        return math.nan, math.nan, str(error)
+
+
+def _cost_task(task):
+    index, demand, time_limit, mip_gap = task
+    port_one, ship, cargo_types, x, z, factor_overstow = _CONTEXT
+    return index, recourse_cost(demand, index, port_one, ship, cargo_types, x, z, factor_overstow, time_limit, mip_gap)
+
+
+# ---------- Statistics ----------
+class RunningCost:
+    """
+    Weighted mean and variance of the scenario costs, updated one scenario at a time (West, 1979).
+    Weights are frequencies: a weight of 3 counts like three identical scenarios.
+    """
+
+    def __init__(self):
+        self.weight = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.count = 0
+        self.failed = 0
+
+    def add(self, value, weight=1.0):
+        if math.isnan(value):
+            self.failed += 1
+            return
+        self.count += 1
+        self.weight += weight
+        delta = value - self.mean
+        self.mean += weight / self.weight * delta
+        self.m2 += weight * delta * (value - self.mean)
+
+    def std_error(self):
+        if self.weight <= 1:
+            return math.inf
+        return math.sqrt(self.m2 / (self.weight - 1) / self.weight)
+
+    def interval(self, confidence=0.95):
+        """
+        Two-sided Student t confidence interval of the mean cost.
+        """
+        if self.weight <= 1:
+            return -math.inf, math.inf
+        half = student_t.ppf(0.5 + confidence / 2, self.weight - 1) * self.std_error()
+        return self.mean - half, self.mean + half
+
+
+# ---------- Scenario sources ----------
+def file_chunks(path, chunk_size=1000):
+    """
+    Scenarios of a scenario file in chunks. Returns (header, generator of (demand chunk, counts chunk)),
+    counts being ones unless the file is a clustered instance.
+    """
+    header, demand, counts = read_demand(path)
+    counts = np.ones(len(demand)) if counts is None else counts.astype(float)
+
+    def chunks():
+        for start in range(0, len(demand), chunk_size):
+            yield demand[start:start + chunk_size], counts[start:start + chunk_size]
+
+    return header, chunks()
+
+
+def sample_chunks(P, size, distribution, seed, sample_seed, n_scenarios, chunk_size=1000, middle_leg=None, loading_only=False,
+                  random_access=False):
+    """
+    Fresh scenarios of the instance data_generation.test_stochastic builds for (P, size, seed,
+    distribution): same loading list and expected demand, scenarios drawn with sample_seed instead
+    of seed. With random_access the scenarios come from the counter-based set of sample_seed
+    (scenario_set.CounterScenarioSet). Returns (loading list (K, P, P), cargo types, generator of
+    (demand chunk, counts chunk)).
+    """
+    from authentic_generator_np import DemandGenerator
+    from data_generation import generator_params
+    from scenario_set import CounterScenarioSet
+
+    ld_params, moment_params, scenario_params = generator_params(P, size, middle_leg, loading_only, seed, distribution)
+    loading_list = DemandGenerator(**ld_params).generate_loading_list()
+    dg = DemandGenerator(**moment_params, current_port_ld=loading_list)
+    mean_demand, std_demand = dg._generate_moments()
+    dg = DemandGenerator(**scenario_params, current_port_ld=loading_list)
+
+    def chunks():
+        if random_access:
+            source = CounterScenarioSet(dg, mean_demand, std_demand, n_scenarios, seed=sample_seed).chunks(chunk_size)
+        else:
+            source = dg._generate_chunks(mean_demand, std_demand, n_scenarios=n_scenarios, chunk_size=chunk_size, seed=sample_seed)
+        for chunk in source:
+            yield chunk, np.ones(len(chunk))
+
+    return dg._stack_od(loading_list, dg.cargo_types), dg.cargo_types, chunks()
+
+
+# ---------- Evaluation ----------
+def evaluate_plan(x, z, port_one, chunks, ship, cargo_types, n_workers=None, confidence=0.95, factor_overstow=10,
+                  mip_time_limit=None, mip_gap=None, on_cost=None, verbose=True):
+    """
+    Expected cost of the first-stage plan (x, z) over a stream of scenarios.
+
+    Parameters
+    ----------
+    x, z : numpy.ndarray
+        First-stage plan as written by decomposition.save_plan.
+    port_one : numpy.ndarray
+        Loading list of port one (K, P, P) the plan was made for.
+    chunks : iterable of (numpy.ndarray, numpy.ndarray)
+        Scenario demand (n, K, P, P) and frequency weights (n,), e.g. from file_chunks or sample_chunks.
+    n_workers : int, optional
+        Worker processes; all cores if None.
+    confidence : float
+        Level of the confidence interval.
+    mip_time_limit, mip_gap : float, optional
+        HiGHS time limit and relative gap per scenario MIP.
+    on_cost : callable, optional
+        Called as on_cost(index, weight, value, bound, status) for every scenario as it finishes.
+
+    Returns
+    -------
+    result : dict
+        "first_stage" (cost of the plan itself), "recourse" (weighted mean recourse cost),
+        "expected_cost" (their sum, the EEV for a deterministic plan), "std_error", "interval" of
+        the expected cost, "bound" (weighted mean of the HiGHS dual bounds plus the first stage),
+        "scenarios", "failed" (scenarios without feasible recourse, left out of the mean) and "time".
+    """
+    start = time.perf_counter()
+    model = assemble_model(port_one, np.zeros((1,) + np.shape(port_one)[-3:], dtype=np.int64), ship, cargo_types,
+                           factor_overstow=factor_overstow)
+    master, _ = split_model(model)
+    first_stage = float(master["objective"] @ first_stage_vector(model, x, z, master["columns"]))
+    cost, bound = RunningCost(), RunningCost()
+
+    with Pool(n_workers, initializer=_init_worker, initargs=(port_one, ship, cargo_types, x, z, factor_overstow)) as pool:
+        offset = 0
+        for demand, weights in chunks:
+            tasks = ((offset + j, demand[j], mip_time_limit, mip_gap) for j in range(len(demand)))
+            for index, (value, dual_bound, status) in pool.imap_unordered(_cost_task, tasks):
+                weight = weights[index - offset]
+                cost.add(value, weight)
+                bound.add(dual_bound, weight)
+                if on_cost is not None:
+                    on_cost(index, weight, value, dual_bound, status)
+            offset += len(demand)
+            if verbose:
+                low, high = cost.interval(confidence)
+                print(f"{offset:>9} scenarios  expected cost {first_stage + cost.mean:>14.4f}  "
+                      f"{100 * confidence:.0f}% CI [{first_stage + low:.4f}, {first_stage + high:.4f}]  "
+                      f"{cost.failed} failed  {time.perf_counter() - start:>8.1f}s", flush=True)
+
+    low, high = cost.interval(confidence)
+    return dict(first_stage=first_stage, recourse=cost.mean, expected_cost=first_stage + cost.mean,
+                std_error=cost.std_error(), interval=(first_stage + low, first_stage + high),
+                bound=first_stage + bound.mean, scenarios=cost.count + cost.failed, failed=cost.failed,
+                time=time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate a fixed first-stage plan on a scenario set with parallel scenario MIPs (EEV/VSS).")
+    parser.add_argument("plan", help="first-stage plan (.npz from decomposition.py or comparison_job.jl)")
+    parser.add_argument("port_one", help="port one loading list the plan was made for (.scn or text)")
+    parser.add_argument("--scenarios", default=None, help="scenario file or clustered instance to evaluate on")
+    parser.add_argument("--sample", type=int, default=None, help="number of fresh scenarios to draw instead")
+    parser.add_argument("--size", default="S", choices=["S", "M", "L"], help="ship size of the instance to sample from")
+    parser.add_argument("--distribution", default=None, help="distribution of the instance to sample from")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the instance to sample from")
+    parser.add_argument("--sample-seed", type=int, default=None, help="seed of the fresh scenarios (default: seed + 1)")
+    parser.add_argument("--random-access", action="store_true", help="draw the fresh scenarios from counter-based streams")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--ship", default=None, help="ship file (default: the one of --size)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--mip-time-limit", type=float, default=None, help="HiGHS time limit per scenario MIP")
+    parser.add_argument("--mip-gap", type=float, default=None, help="HiGHS relative gap per scenario MIP")
+    parser.add_argument("--rp", type=float, default=None, help="objective of the stochastic solution, to report the VSS")
+    parser.add_argument("--output", default=None, help="CSV file of the per-scenario costs")
+    args = parser.parse_args()
+
+    if (args.scenarios is None) == (args.sample is None):
+        parser.error("give exactly one of --scenarios and --sample")
+    x, z, P = load_plan(args.plan)
+    header, port_one, _ = read_demand(args.port_one)
+    port_one = port_one.reshape(port_one.shape[-3:])
+    cargo_types = header["cargo_types"]
+    if args.scenarios is not None:
+        _, chunks = file_chunks(args.scenarios, args.chunk_size)
+    else:
+        if args.distribution is None or args.seed is None:
+            parser.error("--sample needs --distribution and --seed")
+        sample_seed = args.seed + 1 if args.sample_seed is None else args.sample_seed
+        loading_list, _, chunks = sample_chunks(P, args.size, args.distribution, args.seed, sample_seed, args.sample, args.chunk_size,
+                                                random_access=args.random_access)
+        if not np.array_equal(loading_list, port_one):
+            raise ValueError(f"the loading list of {args.port_one} is not the one of seed {args.seed}")
+
+    from model_size import ship_file
+    ship = read_ship_instance(args.ship or ship_file(args.size))
+
+    writer, output = None, None
+    if args.output:
+        output = open(args.output, "w", newline="")
+        writer = csv.writer(output)
+        writer.writerow(["scenario", "weight", "cost", "bound", "status"])
+    on_cost = None if writer is None else lambda *row: writer.writerow(row)
+    try:
+        result = evaluate_plan(x, z, port_one, chunks, ship, cargo_types, args.workers, args.confidence,
+                               mip_time_limit=args.mip_time_limit, mip_gap=args.mip_gap, on_cost=on_cost)
+    finally:
+        if output is not None:
+            output.close()
+
+    low, high = result["interval"]
+    print(f"First-stage cost {result['first_stage']:.4f}, expected recourse cost {result['recourse']:.4f}")
+    print(f"Expected cost {result['expected_cost']:.4f} +- {result['std_error']:.4f} "
+          f"({100 * args.confidence:.0f}% CI [{low:.4f}, {high:.4f}]) over {result['scenarios']} scenarios "
+          f"in {result['time']:.1f}s")
+    if result["failed"]:
+        print(f"WARNING {result['failed']} scenarios have no feasible recourse and are not in the mean")
+    if args.rp is not None:
+        print(f"VSS {result['expected_cost'] - args.rp:.4f} ({100 * args.confidence:.0f}% CI "
+              f"[{low - args.rp:.4f}, {high - args.rp:.4f}])")
+    if args.output:
+        print(f"Scenario costs exported to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+using PyCall
+using JuMP
+
+# MIP start for build_stochastic_model_2 from the greedy heuristic of stowage_heuristic.py.
+#
+#   objective = set_greedy_start!(model, data_CP, data_omega, ship_file, N_scenarios)
+#
+# runs the heuristic on the port-one loading list and the (clustered) scenarios the model was built
+# from and sets the result as start value of every variable. Requires the calculations folder on
+# the Python path, as set up by the drivers.
+
+# Demand of a vector of (origin, destination) => counts dicts as an array (N, K, P, P)
+function demand_array(containers, n_ports, n_types)
+    demand = zeros(Int, length(containers), n_types, n_ports, n_ports)
+    for (i, transports) in enumerate(containers)
+        for ((o, d), counts) in transports
+            demand[i, :, o, d] = counts
+        end
+    end
+    return demand
+end
+
+# Set the start values of a MIP start file written by stowage_heuristic.py with names="jump".
+# Transports are written as their ports (o, d) and mapped to the model's transport index here;
+# variables not in the file start at zero.
+function read_mip_start!(model, filename::String, transport_keys)
+    transport = Dict(key => t for (t, key) in enumerate(transport_keys))
+    set_start_value.(all_variables(model), 0.0)
+    for line in eachline(filename)
+        if isempty(strip(line)) || startswith(line, "#")
+            continue
+        end
+        name, value = split(line)
+        m = match(r"^(\w+)\[(.*)\]$", name)
+        base = Symbol(m[1])
+        index = parse.(Int, split(m[2], ","))
+        if base in (:delta, :y_O)
+            variable = model[base][index...]
+        else
+            # x and z are indexed (tau, o, d, ...), s and q (i, tau, o, d, ...)
+            k = m[1][1] in ('s', 'q') ? 2 : 1
+            t = transport[(index[k + 1], index[k + 2])]
+            variable = model[base][index[1:k]..., t, index[k + 3:end]...]
+        end
+        set_start_value(variable, parse(Float64, value))
+    end
+end
+
+function set_greedy_start!(model, data_CP, data_omega, ship_file::String, N_scenarios)
+    heuristic = pyimport("stowage_heuristic")
+    P = data_CP.n_ports
+    K = length(data_CP.container_types)
+    cargo_types = [(ct.length, ct.weight, ct.cargo_type) for ct in data_CP.container_types]
+    counts = hasproperty(data_omega, :cluster_counts) ? data_omega.cluster_counts : ones(Int, data_omega.n_scenarios)
+
+    filename = tempname() * ".mst"
+    objective = heuristic.greedy_mip_start(filename, demand_array(data_CP.containers, P, K),
+                                           demand_array(data_omega.containers, P, K), ship_file, cargo_types,
+                                           counts, N_scenarios)
+    read_mip_start!(model, filename, collect(keys(data_CP.containers[1])))
+    rm(filename)
+    return objective
+end
@@ -0,0 +1,348 @@
+"""
+Size, memory and runtime prediction for build_stochastic_model_2 (StochasticModel_2.5.jl).
+
+The model has one block of variables and constraints per JuMP macro. With T = T_20 + T_40
+cargo types, L locations, n scenarios (clusters), DEP = P - 1 transports leaving port one and
+FU = P(P-1)/2 - DEP future transports:
+
+    x_20, x_40      T DEP L             z_20, z_40      T DEP
+    s_20, s_40      n T FU L            q_20, q_40      n T FU
+    delta (binary)  n P L               y_O             n P L
+
+    capacity, reefer, 40'   3 n P L rows        load lists (current port)  2 T DEP rows
+    overstow (8), (9)       2 n P |L_O| rows    load lists (future)        2 n T FU rows
+
+The nonzeros follow from the transports on board, arriving/leaving and overstowing at each
+port. Two details of the Julia code are reproduced as written, because they determine the
+counts in the logs: reefers40 are the 40' reefer indices shifted by T_40, and constraint (8)
+of scenario i reads locations_under[i], so only scenarios whose index is a location with a
+below-deck counterpart get x/s terms in (8). The deterministic run is the same model with one
+scenario, and the expected stochastic run adds one equality per first-stage variable to fix it.
+
+The counts match the "Optimize a model" headers of all solve logs exactly, which is checked by
+
+    python model_size.py --validate
+
+Memory is estimated from the counts with per-row, per-column and per-nonzero byte costs of the
+JuMP model plus the Gurobi copy, plus the scenario matrices the comparison scripts hold; the
+defaults are rough and can be overridden. Runtime is predicted by a log-log fit of the runtime
+against the number of nonzeros over the indexed logs (results_step_2/results_index.py). Both
+are meant to reject or reschedule sweep points before anything is built:
+
+    python model_size.py --ports 8 10 15 --clusters 10 20 30 40 50 --memory-limit 64 --time-limit 36000
+"""
+
+import argparse
+import math
+import os
+import sys
+
+import numpy as np
+
+from ship_reader import read_ship_instance
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(HERE, "..", "results_step_2")
+SHIP_FILES = {"S": "Small_ship.txt", "M": "Medium_ship.txt", "L": "Large_ship.txt"}
+MODELS = ("stochastic", "expected_stochastic", "deterministic")
+SIZE_FIELDS = ("rows", "columns", "nonzeros", "continuous", "binary", "objective_coefficients")
+
+# Rough memory costs: MOI terms and names on the JuMP side, the original and presolved model in Gurobi
+BYTES_PER_NONZERO = 48
+BYTES_PER_COLUMN = 160
+BYTES_PER_ROW = 120
+# comparison_*.jl keeps every scenario as a P x P Int64 matrix per cargo type and again flattened for kmeans
+BYTES_PER_SCENARIO_ENTRY = 16
+
+
+def ship_file(size):
+    """
+    Path of the ship file for a size label of the log names ("S", "M" or "L").
+    """
+    if size not in SHIP_FILES:
+        raise ValueError(f"unknown ship size {size!r}, expected one of {tuple(SHIP_FILES)}")
+    return os.path.join(HERE, "Ships", SHIP_FILES[size])
+
+
+def _cargo_table(cargo_types):
+    """
+    Lengths and reefer flags of a cargo type table as read by scenarios_instance_reader.jl,
+    from (length, weight, type) tuples with length 20, 40, "20ft" or "40ft".
+    """
+    lengths = np.array([int(str(length).removesuffix("ft")) for length, _, _ in cargo_types])
+    reefer = np.array([kind in ("RC", "HR") for _, _, kind in cargo_types])
+    return lengths, reefer
+
+
+# ---------- Model size ----------
+def constraint_blocks(P, n_clusters, ship, cargo_types, model="stochastic"):
+    """
+    Rows and nonzeros of every constraint block of build_stochastic_model_2.
+
+    Parameters
+    ----------
+    P : int
+        Number of ports.
+    n_clusters : int
+        Number of scenarios in the model (clusters); forced to 1 for model="deterministic".
+    ship : ShipInstance
+        Ship read with ship_reader.read_ship_instance.
+    cargo_types : list of tuple
+        Cargo type table, e.g. data_generation.cargo_types.
+    model : str
+        "stochastic", "expected_stochastic" (first stage fixed) or "deterministic".
+
+    Returns
+    -------
+    blocks : dict
+        Block name -> (rows, nonzeros).
+    """
+    if model not in MODELS:
+        raise ValueError(f"model must be one of {MODELS}")
+    N = 1 if model == "deterministic" else int(n_clusters)
+    L = ship.n_locations
+    lengths, reefer = _cargo_table(cargo_types)
+    T_20 = int(np.sum(lengths == 20))
+    T_40 = int(np.sum(lengths == 40))
+    T = T_20 + T_40
+    reefers20 = int(np.sum(reefer & (lengths == 20)))
+    reefers40 = np.flatnonzero(reefer & (lengths == 40)) + 1 - T_40
+    if np.any((reefers40 < 1) | (reefers40 > T_40)):
+        raise ValueError("reefers40 indices fall outside 1:T_40, the model cannot be built for this cargo table")
+    if N > len(ship.locations_under):
+        raise ValueError(f"constraint (8) reads locations_under[i] for i = 1:{N}, but the ship has only {len(ship.locations_under)} locations")
+
+    # transports (load, discharge) with 1 <= load < discharge <= P, and per port p which are on board etc.
+    load, discharge = np.triu_indices(P, k=1)
+    load, discharge = load + 1, discharge + 1
+    dep = load == 1
+    DEP = int(dep.sum())
+    FU = len(load) - DEP
+    port = np.arange(1, P + 1)[:, None]
+    on_board = ((load <= port) & (port < discharge)).sum(axis=1)
+    handled = ((load == port) | (discharge == port)).sum(axis=1)
+    overstowing = ((load < port) & (port < discharge)).sum(axis=1)
+
+    n_over = len(ship.locations_over)
+    under = np.asarray(ship.locations_under)[:N]
+    with_under = int(np.sum(under > 0))
+
+    blocks = {
+        "capacity": (N * P * L, N * L * T * int(on_board.sum())),
+        "reefer_capacity": (N * P * L, N * L * (reefers20 + len(reefers40)) * int(on_board.sum())),
+        "capacity_40": (N * P * L, N * L * T_40 * int(on_board.sum())),
+        "load_list_current": (2 * T * DEP, T * DEP * L + T * DEP * (L + 1)),
+        "load_list_future": (2 * N * T * FU, N * T * FU * L + N * T * FU * (L + 1)),
+        "lower_unload_later": (N * P * n_over, with_under * n_over * T * int(handled.sum()) + N * P * n_over),
+        "overstowage": (N * P * n_over, N * n_over * (T * int(overstowing.sum()) + 2 * P)),
+    }
+    if model == "expected_stochastic":
+        blocks["fix_first_stage"] = (T * DEP * L + T * DEP, T * DEP * L + T * DEP)
+    return blocks
+
+
+def predict_model_size(P, n_clusters, ship, cargo_types, model="stochastic"):
+    """
+    Rows, columns, nonzeros, binaries and objective coefficients of build_stochastic_model_2, as
+    printed in the Gurobi log header. Arguments as in constraint_blocks.
+
+    Returns
+    -------
+    size : dict
+        Counts named as in SIZE_FIELDS (and the gurobi_log_parser summary).
+    """
+    blocks = constraint_blocks(P, n_clusters, ship, cargo_types, model)
+    N = 1 if model == "deterministic" else int(n_clusters)
+    L = ship.n_locations
+    T = len(cargo_types)
+    DEP = P - 1
+    FU = P * (P - 1) // 2 - DEP
+
+    binary = N * P * L
+    columns = T * DEP * L + N * T * FU * L + 2 * N * P * L + T * DEP + N * T * FU
+    return dict(
+        rows=sum(rows for rows, _ in blocks.values()),
+        columns=columns,
+        nonzeros=sum(nonzeros for _, nonzeros in blocks.values()),
+        continuous=columns - binary,
+        binary=binary,
+        # z, y_O and q
+        objective_coefficients=T * DEP + N * P * L + N * T * FU,
+    )
+
+
+# ---------- Memory and runtime ----------
+def estimate_memory(size, P=None, n_scenarios=0, n_cargo_types=28, bytes_per_nonzero=BYTES_PER_NONZERO,
+                    bytes_per_column=BYTES_PER_COLUMN, bytes_per_row=BYTES_PER_ROW):
+    """
+    Rough peak memory in bytes of building and solving a model of the given size, plus the
+    n_scenarios sampled P x P matrices the comparison scripts keep in memory meanwhile.
+    """
+    model = size["nonzeros"] * bytes_per_nonzero + size["columns"] * bytes_per_column + size["rows"] * bytes_per_row
+    scenarios = 0 if not n_scenarios else n_scenarios * n_cargo_types * P * P * BYTES_PER_SCENARIO_ENTRY
+    return model + scenarios
+
+
+def fit_runtime(summary, model=None):
+    """
+    Least squares fit of log(runtime) = intercept + slope * log(nonzeros) over solved logs.
+
+    Parameters
+    ----------
+    summary : dict of numpy arrays
+        Summary columns with "model", "nonzeros", "runtime" and "last_time", e.g. from
+        ResultsIndex.query(). Logs that were cut off count with their last printed time, which
+        makes the fit a lower bound for them.
+    model : str, optional
+        Only fit logs of this model type.
+
+    Returns
+    -------
+    fit : dict
+        "intercept", "slope", "sigma" (residual standard deviation in log space) and "logs".
+    """
+    runtime = np.where(np.isnan(summary["runtime"]), summary["last_time"], summary["runtime"])
+    keep = ~np.isnan(runtime) & (runtime > 0) & ~np.isnan(summary["nonzeros"])
+    if model is not None:
+        keep &= summary["model"] == model
+    if keep.sum() < 2:
+        raise ValueError("need at least two logs with a runtime to fit")
+    x = np.log(summary["nonzeros"][keep])
+    y = np.log(runtime[keep])
+    slope, intercept = np.polyfit(x, y, 1)
+    residual = y - (intercept + slope * x)
+    return dict(intercept=float(intercept), slope=float(slope), sigma=float(residual.std(ddof=min(2, len(y) - 1))),
+                logs=int(keep.sum()))
+
+
+def predict_runtime(fit, nonzeros, quantile=0.5):
+    """
+    Runtime in seconds predicted by a fit_runtime fit. quantile > 0.5 gives a pessimistic estimate
+    assuming log-normal residuals, e.g. 0.9 for a time budget that 90% of similar runs meet.
+    """
+    from statistics import NormalDist
+    z = NormalDist().inv_cdf(quantile)
+    return float(np.exp(fit["intercept"] + fit["slope"] * np.log(nonzeros) + z * fit["sigma"]))
+
+
+def screen(points, cargo_types, fit=None, memory_limit=None, time_limit=None, quantile=0.5, model="stochastic"):
+    """
+    Size, memory and runtime estimates for sweep points, and whether they fit the limits.
+
+    Parameters
+    ----------
+    points : iterable of dict
+        Points with "P", "n_clusters", "size" ("S", "M" or "L") and optionally "N" (sampled scenarios).
+    cargo_types : list of tuple
+        Cargo type table.
+    fit : dict, optional
+        Runtime fit from fit_runtime. Without it no runtime is predicted.
+    memory_limit, time_limit : float, optional
+        Limits in bytes and seconds.
+    quantile : float
+        Quantile of the runtime prediction compared with time_limit.
+
+    Returns
+    -------
+    rows : list of dict
+        The point, its predicted size, "memory", "runtime" and "verdict" ("ok", "memory" or "time").
+    """
+    ships = {}
+    rows = []
+    for point in points:
+        if point["size"] not in ships:
+            ships[point["size"]] = read_ship_instance(ship_file(point["size"]))
+        size = predict_model_size(point["P"], point["n_clusters"], ships[point["size"]], cargo_types, model)
+        memory = estimate_memory(size, point["P"], point.get("N", 0), len(cargo_types))
+        runtime = None if fit is None else predict_runtime(fit, size["nonzeros"], quantile)
+        verdict = "ok"
+        if memory_limit is not None and memory > memory_limit:
+            verdict = "memory"
+        elif time_limit is not None and runtime is not None and runtime > time_limit:
+            verdict = "time"
+        rows.append(dict(point, **size, memory=memory, runtime=runtime, verdict=verdict))
+    return rows
+
+
+# ---------- Validation ----------
+def _results_modules():
+    if RESULTS_DIR not in sys.path:
+        sys.path.insert(0, RESULTS_DIR)
+    import results_index
+    return results_index
+
+
+def validate(summary, cargo_types):
+    """
+    Compare predicted sizes with the model headers of parsed logs.
+
+    Returns a list of (log, field, logged, predicted) for every mismatch. Logs without a header
+    (killed before Gurobi started) or with an unknown name are skipped.
+    """
+    mismatches = []
+    ships = {}
+    for i, log in enumerate(summary["log"]):
+        size, P, n_clusters = summary["size"][i], summary["P"][i], summary["n_clusters"][i]
+        if np.isnan(summary["rows"][i]) or size not in SHIP_FILES or np.isnan(P):
+            continue
+        if size not in ships:
+            ships[size] = read_ship_instance(ship_file(size))
+        n_clusters = 1 if np.isnan(n_clusters) else int(n_clusters)
+        predicted = predict_model_size(int(P), n_clusters, ships[size], cargo_types, summary["model"][i])
+        for field in SIZE_FIELDS:
+            if field in summary and not np.isnan(summary[field][i]) and summary[field][i] != predicted[field]:
+                mismatches.append((log, field, int(summary[field][i]), predicted[field]))
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Predict the size, memory and runtime of build_stochastic_model_2.")
+    parser.add_argument("--ports", type=int, nargs="+", default=[8, 10, 15])
+    parser.add_argument("--clusters", type=int, nargs="+", default=[10, 20, 30, 40, 50])
+    parser.add_argument("--size", choices=sorted(SHIP_FILES), default="S", help="ship size")
+    parser.add_argument("--scenarios", type=int, default=70000, help="sampled scenarios held in memory while solving")
+    parser.add_argument("--model", choices=MODELS, default="stochastic")
+    parser.add_argument("--memory-limit", type=float, default=None, help="memory limit in GB")
+    parser.add_argument("--time-limit", type=float, default=None, help="time limit in seconds")
+    parser.add_argument("--quantile", type=float, default=0.9, help="runtime quantile compared with the time limit")
+    parser.add_argument("--index", default=os.path.join(RESULTS_DIR, "results_index.sqlite"), help="SQLite results index")
+    parser.add_argument("--root", default=RESULTS_DIR, help="directory containing the gurobi_*_logs directories")
+    parser.add_argument("--no-runtime", action="store_true", help="do not fit the runtime from the logs")
+    parser.add_argument("--validate", action="store_true", help="check the predictions against all log headers")
+    args = parser.parse_args()
+
+    from data_generation import cargo_types
+
+    summary = None
+    if args.validate or not args.no_runtime:
+        results_index = _results_modules()
+        with results_index.ResultsIndex(args.index, args.root) as index:
+            index.refresh()
+            summary = index.query()
+
+    if args.validate:
+        mismatches = validate(summary, cargo_types)
+        checked = int(np.sum(~np.isnan(summary["rows"])))
+        for log, field, logged, predicted in mismatches:
+            print(f"MISMATCH {log}: {field} logged {logged}, predicted {predicted}")
+        print(f"Checked {checked} log headers, {len(mismatches)} mismatches")
+        if mismatches:
+            sys.exit(1)
+        return
+
+    fit = None if args.no_runtime else fit_runtime(summary, args.model)
+    points = [dict(P=P, n_clusters=n, size=args.size, N=args.scenarios) for P in args.ports for n in args.clusters]
+    memory_limit = None if args.memory_limit is None else args.memory_limit * 1024**3
+    rows = screen(points, cargo_types, fit, memory_limit, args.time_limit, args.quantile, args.model)
+
+    if fit is not None:
+        print(f"runtime ~ {math.exp(fit['intercept']):.3g} * nonzeros^{fit['slope']:.2f} (sigma {fit['sigma']:.2f}, {fit['logs']} logs)")
+    print(f"{'P':>3} {'n':>3} {'rows':>9} {'columns':>10} {'nonzeros':>11} {'binary':>7} {'memory [GB]':>11} {'runtime [s]':>11}  verdict")
+    for r in rows:
+        runtime = "-" if r["runtime"] is None else f"{r['runtime']:.0f}"
+        print(f"{r['P']:>3} {r['n_clusters']:>3} {r['rows']:>9} {r['columns']:>10} {r['nonzeros']:>11} {r['binary']:>7} "
+              f"{r['memory'] / 1024**3:>11.1f} {runtime:>11}  {r['verdict']}")
+
+
+if __name__ == "__main__":
+    main()
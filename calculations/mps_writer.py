@@ -0,0 +1,479 @@
+"""
+Vectorized assembler and MPS writer for the two-stage stowage model of build_stochastic_model_2.
+
+JuMP builds the model one term at a time through its macros, which takes seconds already for
+10 scenarios (results_step_1) and grows with every 1:N x 1:P x 1:L constraint family. Here the
+constraint matrix is assembled block by block as COO index arrays with NumPy broadcasting and
+written as a free-format MPS file that Gurobi, HiGHS, CPLEX or SCIP can read directly.
+
+The formulation, block order, coefficients and right-hand sides are those of
+StochasticModel_2.5.jl, including its quirks (see model_size.py): the 40' reefer indices are
+shifted by T_40, and constraint (8) of scenario i reads locations_under[i]. The sizes therefore
+equal model_size.predict_model_size and the Gurobi log headers. Two things differ from the JuMP
+model without changing it: transports are numbered in sorted (origin, destination) order instead
+of Dict key order, and the load list equalities are written as sum(x) + z == LD instead of
+LD - sum(x) == z. Rows are named R<i> and columns C<j>; `layout` gives the column range of every
+variable block, in the index order documented in `assemble_model`. The whole matrix is held in
+memory, about 80 bytes per nonzero while writing (1.2 GB for P=10 with 10 clusters).
+
+    python mps_writer.py S_port_one_8_False_None_uniform_1.scn S_scenarios_8_10_False_None_uniform_1.scn --output model.mps
+    python mps_writer.py port_one.txt clustered_10.txt --ship Ships/Large_ship.txt --validate
+
+`--validate` checks the counts against model_size and, for small instances, solves the assembled
+arrays and the written file read back with HiGHS (scipy.optimize.milp) and compares the optimal
+objectives.
+"""
+
+import argparse
+import math
+import os
+
+import numpy as np
+
+from od_tensor import od_pairs
+from scenario_io import open_od_tensor, read_text_scenario_file
+from ship_reader import read_ship_instance
+
+FACTOR_OVERSTOW = 10
+VARIABLES = ("x", "s", "delta", "y_O", "z", "q")
+
+
+def _broadcast(rows, cols, values):
+    rows, cols, values = np.broadcast_arrays(rows, cols, values)
+    return rows.ravel(), cols.ravel(), values.ravel()
+
+
+# ---------- Assembly ----------
+def cargo_coefficients(cargo_types):
+    """
+    Capacity coefficients of a cargo type table (length, weight, type), 20' types first.
+
+    Returns (T_20, teu, reefer_types, reefer_teu): the number of 20' types, the TEU of every
+    type, and the types counted by the reefer constraint with their TEU. As in Julia the 40'
+    reefer indices are shifted by T_40, so reefer_types are not the 40' reefers of the table.
+    """
+    lengths = np.array([int(str(length).removesuffix("ft")) for length, _, _ in cargo_types])
+    reefer = np.array([kind in ("RC", "HR") for _, _, kind in cargo_types])
+    T_20 = int(np.sum(lengths == 20))
+    T_40 = len(cargo_types) - T_20
+    if np.any(lengths[:T_20] != 20):
+        raise ValueError("the cargo type table must match the demand and list the 20' types first")
+    teu = np.where(lengths == 40, 2.0, 1.0)
+    # reefers40 = findall(40' reefers) .- T_40 indexes x_40, i.e. cargo type T_20 + that index
+    reefers40 = np.flatnonzero(reefer & (lengths == 40)) + 1 - T_40
+    if np.any((reefers40 < 1) | (reefers40 > T_40)):
+        raise ValueError("reefers40 indices fall outside 1:T_40, the model cannot be built for this cargo table")
+    reefer_types = np.concatenate([np.flatnonzero(reefer & (lengths == 20)), T_20 + reefers40 - 1])
+    return T_20, teu, reefer_types, teu[reefer_types]
+
+
+def assemble_model(port_one, scenarios, ship, cargo_types, counts=None, n_scenarios=None, factor_overstow=FACTOR_OVERSTOW,
+                   first_index=0):
+    """
+    Assemble build_stochastic_model_2 as sparse arrays.
+
+    Parameters
+    ----------
+    port_one : numpy.ndarray
+        Loading list of port one, shape (K, P, P) or (1, K, P, P).
+    scenarios : numpy.ndarray
+        Scenario or cluster center demand, shape (N, K, P, P), rounded to integers as in Julia.
+    ship : ShipInstance
+        Ship read with ship_reader.read_ship_instance.
+    cargo_types : list of tuple
+        Cargo type table (length, weight, type), 20' types first as in data_generation.cargo_types.
+    counts : array-like of int, optional
+        Number of sampled scenarios behind each scenario (cluster counts). Defaults to ones.
+    n_scenarios : int, optional
+        Number of sampled scenarios N_scenarios the weights are divided by. Defaults to sum(counts).
+    factor_overstow : float
+        Objective weight of overstowage, FactorK_O in Julia.
+    first_index : int
+        Position of the first scenario in the full scenario set. Constraint (8) of scenario i reads
+        locations_under[first_index + i], so a part of a set is assembled as in the whole model.
+
+    Returns
+    -------
+    model : dict
+        "rows", "cols", "values" : COO arrays of the constraint matrix
+        "sense" : array of "L" (<=) and "E" (==) per row
+        "rhs", "objective" : right-hand sides and objective coefficients
+        "integrality" : 1 for the binary columns, 0 otherwise
+        "n_rows", "n_cols" : matrix shape
+        "layout" : variable name -> (first column, shape), with index order
+                   x (T, DEP, L), s (N, T, FU, L), delta and y_O (N, P, L), z (T, DEP), q (N, T, FU),
+                   where transports are the sorted (origin, destination) pairs, DEP those from port one
+        "row_blocks" : constraint block name -> (first row, number of rows)
+    """
+    port_one = np.asarray(port_one).reshape(np.shape(port_one)[-3:])
+    scenarios = np.asarray(scenarios)
+    N, T, P = scenarios.shape[0], scenarios.shape[1], scenarios.shape[-1]
+    L = ship.n_locations
+    counts = np.ones(N) if counts is None else np.asarray(counts, dtype=float)
+    n_scenarios = counts.sum() if n_scenarios is None else n_scenarios
+
+    if len(cargo_types) != T:
+        raise ValueError("the cargo type table must match the demand and list the 20' types first")
+    if first_index + N > len(ship.locations_under):
+        raise ValueError(f"constraint (8) reads locations_under[i] for i = {first_index + 1}:{first_index + N}, "
+                         f"but the ship has only {len(ship.locations_under)} locations")
+    T_20, teu, reefer_types, reefer_teu = cargo_coefficients(cargo_types)
+    T_40 = T - T_20
+    forty = np.arange(T_20, T)
+
+    C_20 = np.asarray(ship.location_TEU_capacity, dtype=float)
+    C_40 = np.asarray(ship.location_FEU_capacity, dtype=float)
+    C_R = np.asarray(ship.location_reefer_capacity, dtype=float)
+    M = float(C_20.max() + C_40.max())
+    over = np.asarray(ship.locations_over) - 1
+    under = np.asarray(ship.locations_under)[first_index:first_index + N] - 1   # -1 (or less) where there is no location below
+
+    # transports and, per port, which are on board, arriving/leaving and overstowing
+    origin, destination = od_pairs(P)
+    dep = origin == 0
+    DEP, FU = int(dep.sum()), int((~dep).sum())
+    slot = np.empty(len(origin), dtype=np.int64)   # index within DEP or FU
+    slot[dep] = np.arange(DEP)
+    slot[~dep] = np.arange(FU)
+    port = np.arange(P)[:, None]
+    on_board = (origin <= port) & (port < destination)
+    handled = (origin == port) | (destination == port)
+    overstowing = (origin < port) & (port < destination)
+
+    # ---------- Columns ----------
+    layout = {}
+    offset = 0
+    for name, shape in (("x", (T, DEP, L)), ("s", (N, T, FU, L)), ("delta", (N, P, L)), ("y_O", (N, P, L)),
+                        ("z", (T, DEP)), ("q", (N, T, FU))):
+        layout[name] = (offset, shape)
+        offset += int(np.prod(shape))
+    n_cols = offset
+    x0, s0, d0, y0, z0, q0 = (layout[name][0] for name in VARIABLES)
+
+    def x(k, t, l):
+        return x0 + (k * DEP + t) * L + l
+
+    def s(i, k, f, l):
+        return s0 + ((i * T + k) * FU + f) * L + l
+
+    i_ = np.arange(N)
+    l_ = np.arange(L)
+    k_ = np.arange(T)
+    parts = []
+    sense, rhs, row_blocks = [], [], {}
+    n_rows = 0
+
+    def block(name, n, kind, b, terms):
+        nonlocal n_rows
+        row_blocks[name] = (n_rows, n)
+        for rows, cols, values in terms:
+            parts.append(_broadcast(n_rows + rows, cols, values))
+        sense.append(np.full(n, kind))
+        rhs.append(np.broadcast_to(np.asarray(b, dtype=float), (n,)))
+        n_rows += n
+
+    def port_terms(mask, types, coef, row, location):
+        """
+        Terms of x (first stage) and s (scenario i) over the transports of mask[p] and the given
+        cargo types, for rows row(i, p, ...) at locations location(...), all broadcast over
+        (i, pair, type, location) with i, pair and type on axes 0, 1 and 2.
+        """
+        p, t = np.nonzero(mask)
+        terms = []
+        for first in (True, False):
+            keep = dep[t] if first else ~dep[t]
+            pp, tt = p[keep][None, :, None, None], slot[t[keep]][None, :, None, None]
+            kk = types[None, None, :, None]
+            ii = i_[:, None, None, None]
+            loc = location(ii, pp)
+            cols = x(kk, tt, loc) if first else s(ii, kk, tt, loc)
+            terms.append((row(ii, pp, loc), cols, coef[None, None, :, None]))
+        return terms
+
+    # Capacity, reefer and 40' capacity per (i, p, l)
+    def capacity_row(ii, pp, loc):
+        return (ii * P + pp) * L + loc
+
+    every_location = lambda ii, pp: l_[None, None, None, :]
+    block("capacity", N * P * L, "L", np.tile(C_20, N * P),
+          port_terms(on_board, k_, teu, capacity_row, every_location))
+    block("reefer_capacity", N * P * L, "L", np.tile(C_R, N * P),
+          port_terms(on_board, reefer_types, reefer_teu, capacity_row, every_location))
+    block("capacity_40", N * P * L, "L", np.tile(C_40, N * P),
+          port_terms(on_board, forty, np.ones(T_40), capacity_row, every_location))
+
+    # Load lists of port one: sum_l x <= LD, and sum_l x + z == LD
+    demand = port_one[:, origin[dep], destination[dep]]                       # (T, DEP)
+    rows = (k_[:, None, None] * DEP + np.arange(DEP)[None, :, None])
+    cols = x(k_[:, None, None], np.arange(DEP)[None, :, None], l_[None, None, :])
+    block("load_list_current", T * DEP, "L", demand.ravel(), [(rows, cols, 1.0)])
+    block("load_list_current_balance", T * DEP, "E", demand.ravel(),
+          [(rows, cols, 1.0), (rows[..., 0], z0 + rows[..., 0], 1.0)])
+
+    # Load lists of the future transports per scenario
+    demand = scenarios[:, :, origin[~dep], destination[~dep]]                 # (N, T, FU)
+    rows = (i_[:, None, None, None] * T + k_[None, :, None, None]) * FU + np.arange(FU)[None, None, :, None]
+    cols = s(i_[:, None, None, None], k_[None, :, None, None], np.arange(FU)[None, None, :, None], l_)
+    block("load_list_future", N * T * FU, "L", demand.ravel(), [(rows, cols, 1.0)])
+    block("load_list_future_balance", N * T * FU, "E", demand.ravel(),
+          [(rows, cols, 1.0), (rows[..., 0], q0 + rows[..., 0], 1.0)])
+
+    # (8) lower containers unload later: terms at location locations_under[i], only where it exists
+    n_over = len(over)
+    o_ = np.arange(n_over)
+    with_under = np.flatnonzero(under >= 0)
+    terms = []
+    for first in (True, False):
+        p, t = np.nonzero(handled & (dep if first else ~dep)[None, :])
+        ii = with_under[:, None, None, None, None]
+        pp, tt = p[None, :, None, None, None], slot[t][None, :, None, None, None]
+        kk = k_[None, None, :, None, None]
+        oo = o_[None, None, None, :, None]
+        loc = under[ii]
+        cols = x(kk, tt, loc) if first else s(ii, kk, tt, loc)
+        terms.append(((ii * P + pp) * n_over + oo, cols, 1.0))
+    rows = (i_[:, None, None] * P + np.arange(P)[None, :, None]) * n_over + o_[None, None, :]
+    delta = d0 + (i_[:, None, None] * P + np.arange(P)[None, :, None]) * L + over[None, None, :]
+    terms.append((rows, delta, -M))
+    block("lower_unload_later", N * P * n_over, "L", 0.0, terms)
+
+    # (9) overstowage: sum x + sum s + M delta - y_O <= M
+    terms = port_terms(overstowing, k_, np.ones(T), lambda ii, pp, loc: (ii * P + pp) * n_over + o_[None, None, None, :],
+                       lambda ii, pp: over[None, None, None, :])
+    terms.append((rows, delta, M))
+    terms.append((rows, delta - d0 + y0, -1.0))
+    block("overstowage", N * P * n_over, "L", M, terms)
+
+    # ---------- Objective ----------
+    weight = counts / n_scenarios
+    objective = np.zeros(n_cols)
+    objective[z0:z0 + T * DEP] = 1.0
+    objective[y0:y0 + N * P * L] = np.repeat(weight * factor_overstow, P * L)
+    objective[q0:q0 + N * T * FU] = np.repeat(weight, T * FU)
+
+    integrality = np.zeros(n_cols, dtype=np.int8)
+    integrality[d0:d0 + N * P * L] = 1
+
+    rows, cols, values = (np.concatenate(a) for a in zip(*parts))
+    index = np.int32 if max(n_rows, n_cols) < 2**31 else np.int64
+    return dict(rows=rows.astype(index), cols=cols.astype(index), values=values.astype(float),
+                sense=np.concatenate(sense), rhs=np.concatenate(rhs), objective=objective, integrality=integrality,
+                n_rows=n_rows, n_cols=n_cols, layout=layout, row_blocks=row_blocks)
+
+
+def model_counts(model):
+    """
+    Sizes of an assembled model, named as in model_size.SIZE_FIELDS.
+    """
+    binary = int(model["integrality"].sum())
+    return dict(rows=model["n_rows"], columns=model["n_cols"], nonzeros=int(np.count_nonzero(model["values"])),
+                continuous=model["n_cols"] - binary, binary=binary,
+                objective_coefficients=int(np.count_nonzero(model["objective"])))
+
+
+# ---------- MPS ----------
+def _number(value):
+    return str(int(value)) if float(value).is_integer() and abs(value) < 2**53 else repr(float(value))
+
+
+def write_mps(path, model, name="stowage", chunk_size=1 << 20):
+    """
+    Write an assembled model as a free-format MPS file.
+
+    Entries are grouped by column as MPS requires; the binary columns are marked as integer and
+    given BV bounds, all other columns keep the default bounds [0, inf).
+    """
+    n_rows, n_cols = model["n_rows"], model["n_cols"]
+    # columns without any entry (delta at locations that are not on deck) are declared by a zero
+    # objective entry; the objective is row -1, so it comes first within each column
+    used = np.zeros(n_cols, dtype=bool)
+    used[model["cols"]] = True
+    objective = np.flatnonzero((model["objective"] != 0) | ~used)
+    rows = np.concatenate([np.full(len(objective), -1, dtype=np.int64), model["rows"]])
+    cols = np.concatenate([objective, model["cols"]])
+    values = np.concatenate([model["objective"][objective], model["values"]])
+    order = np.lexsort((rows, cols))
+    rows, cols, values = rows[order], cols[order], values[order]
+    unique, value_index = np.unique(values, return_inverse=True)
+    text = [_number(v) for v in unique]
+    integer = np.flatnonzero(model["integrality"])
+    # the marker positions, as entry indices where the integer columns start and end
+    marks = {}
+    if len(integer):
+        marks[int(np.searchsorted(cols, integer[0]))] = "    MARKER 'MARKER' 'INTORG'\n"
+        marks[int(np.searchsorted(cols, integer[-1], side="right"))] = "    MARKER 'MARKER' 'INTEND'\n"
+    if np.any(np.diff(integer) != 1):
+        raise ValueError("write_mps expects the integer columns to be contiguous")
+
+    with open(path, "w") as f:
+        f.write(f"NAME {name}\nROWS\n N OBJ\n")
+        for start in range(0, n_rows, chunk_size):
+            stop = min(n_rows, start + chunk_size)
+            f.write("".join(f" {kind} R{i}\n" for i, kind in zip(range(start, stop), model["sense"][start:stop].tolist())))
+        f.write("COLUMNS\n")
+        start = 0
+        for stop in sorted(marks) + [len(rows)]:
+            for lo in range(start, stop, chunk_size):
+                hi = min(stop, lo + chunk_size)
+                f.write("".join(f"    C{c} {'OBJ' if r < 0 else f'R{r}'} {text[v]}\n"
+                                for c, r, v in zip(cols[lo:hi].tolist(), rows[lo:hi].tolist(), value_index[lo:hi].tolist())))
+            if stop in marks:
+                f.write(marks[stop])
+            start = stop
+        f.write("RHS\n")
+        nonzero = np.flatnonzero(model["rhs"])
+        for lo in range(0, len(nonzero), chunk_size):
+            chunk = nonzero[lo:lo + chunk_size]
+            f.write("".join(f"    RHS R{i} {_number(b)}\n" for i, b in zip(chunk.tolist(), model["rhs"][chunk].tolist())))
+        f.write("BOUNDS\n")
+        f.write("".join(f" BV BND C{j}\n" for j in integer.tolist()))
+        f.write("ENDATA\n")
+    return path
+
+
+def read_mps(path):
+    """
+    Read a free-format MPS file as written by write_mps back into the arrays of assemble_model
+    (without layout and row_blocks). Only the sections and bound types write_mps produces are
+    supported.
+    """
+    row_index, sense = {}, []
+    entries = []
+    rhs, integer = {}, set()
+    section = None
+    in_integer = False
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if not fields:
+                continue
+            if not line[0].isspace():
+                section = fields[0]
+                continue
+            if section == "ROWS":
+                if fields[0] != "N":
+                    row_index[fields[1]] = len(sense)
+                    sense.append(fields[0])
+            elif section == "COLUMNS":
+                if fields[1] == "'MARKER'":
+                    in_integer = fields[2] == "'INTORG'"
+                    continue
+                column = int(fields[0][1:])
+                if in_integer:
+                    integer.add(column)
+                for r, v in zip(fields[1::2], fields[2::2]):
+                    entries.append((row_index.get(r, -1), column, float(v)))
+            elif section == "RHS":
+                for r, v in zip(fields[1::2], fields[2::2]):
+                    rhs[row_index[r]] = float(v)
+            elif section == "BOUNDS" and fields[0] == "BV":
+                integer.add(int(fields[2][1:]))
+    rows, cols, values = (np.array(a) for a in zip(*entries))
+    n_rows, n_cols = len(sense), int(cols.max()) + 1
+    is_objective = rows < 0
+    objective = np.zeros(n_cols)
+    objective[cols[is_objective]] = values[is_objective]
+    b = np.zeros(n_rows)
+    b[list(rhs)] = list(rhs.values())
+    integrality = np.zeros(n_cols, dtype=np.int8)
+    integrality[sorted(integer)] = 1
+    keep = ~is_objective
+    return dict(rows=rows[keep].astype(np.int64), cols=cols[keep].astype(np.int64), values=values[keep],
+                sense=np.array(sense), rhs=b, objective=objective, integrality=integrality, n_rows=n_rows, n_cols=n_cols)
+
+
+# ---------- Validation ----------
+def solve_highs(model, time_limit=None):
+    """
+    Solve an assembled model with HiGHS through scipy.optimize.milp. Returns the scipy result.
+    """
+    from scipy.optimize import Bounds, LinearConstraint, milp
+    from scipy.sparse import coo_matrix
+
+    A = coo_matrix((model["values"], (model["rows"], model["cols"])), shape=(model["n_rows"], model["n_cols"])).tocsr()
+    upper = model["rhs"]
+    lower = np.where(model["sense"] == "E", model["rhs"], -np.inf)
+    bounds = Bounds(np.zeros(model["n_cols"]), np.where(model["integrality"] == 1, 1.0, np.inf))
+    options = {} if time_limit is None else {"time_limit": time_limit}
+    return milp(model["objective"], constraints=LinearConstraint(A, lower, upper), integrality=model["integrality"],
+                bounds=bounds, options=options)
+
+
+def validate(model, path, P, ship, cargo_types, solve=True, time_limit=None):
+    """
+    Check an assembled model and its MPS file: the counts against model_size.predict_model_size and
+    the file read back against the arrays, and with solve=True the HiGHS optimal objective of the
+    arrays against that of the file. Returns a list of problems, empty if everything matches.
+    """
+    from model_size import predict_model_size
+
+    problems = []
+    N = model["layout"]["delta"][1][0]
+    predicted = predict_model_size(P, N, ship, cargo_types)
+    for field, value in model_counts(model).items():
+        if value != predicted[field]:
+            problems.append(f"{field}: assembled {value}, predicted {predicted[field]}")
+
+    read = read_mps(path)
+    if model_counts(read) != model_counts(model):
+        problems.append(f"file read back has sizes {model_counts(read)}, expected {model_counts(model)}")
+    if not solve:
+        return problems
+    direct, loaded = solve_highs(model, time_limit), solve_highs(read, time_limit)
+    if direct.status != 0 or loaded.status != 0:
+        problems.append(f"HiGHS did not solve to optimality: {direct.message} / {loaded.message}")
+    elif not math.isclose(direct.fun, loaded.fun, rel_tol=1e-9, abs_tol=1e-6):
+        problems.append(f"optimal objective {direct.fun} from the arrays, {loaded.fun} from the file")
+    else:
+        print(f"HiGHS optimal objective {direct.fun:.6f} for both the arrays and the file")
+    return problems
+
+
+# ---------- Input ----------
+def read_demand(path):
+    """
+    Demand of a scenario file as (header, dense (N, K, P, P) array, counts or None). Binary .scn
+    files and text files of data_generation are supported, text files with a trailing cluster
+    counts line (scenario_reduction.write_clustered_instance) return those counts.
+    """
+    if path.endswith(".scn"):
+        header, od = open_od_tensor(path)
+        return header, od.to_dense(dtype=np.int64), None
+    header, scenarios = read_text_scenario_file(path)
+    with open(path) as f:
+        lines = [line for line in f.read().splitlines() if line.strip()]
+    expected = 1 + header["K"] + header["N"] * header["K"] * header["P"]
+    counts = np.array(lines[expected].split(), dtype=np.int64) if len(lines) > expected else None
+    return header, scenarios, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write build_stochastic_model_2 as an MPS file straight from the demand files.")
+    parser.add_argument("port_one", help="port one loading list (.scn or text)")
+    parser.add_argument("scenarios", help="scenarios or clustered instance (.scn or text, with cluster counts)")
+    parser.add_argument("--ship", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "Ships", "Small_ship.txt"))
+    parser.add_argument("--n-scenarios", type=int, default=None, help="sampled scenarios behind the clusters (default: sum of counts)")
+    parser.add_argument("--output", default=None, help="MPS file (default: scenario file name with .mps)")
+    parser.add_argument("--validate", action="store_true", help="check counts and, for small models, the HiGHS optimum")
+    parser.add_argument("--time-limit", type=float, default=None, help="HiGHS time limit for --validate")
+    args = parser.parse_args()
+
+    ship = read_ship_instance(args.ship)
+    _, port_one, _ = read_demand(args.port_one)
+    header, scenarios, counts = read_demand(args.scenarios)
+    model = assemble_model(port_one, scenarios, ship, header["cargo_types"], counts, args.n_scenarios)
+    output = args.output or os.path.splitext(args.scenarios)[0] + ".mps"
+    write_mps(output, model)
+    sizes = model_counts(model)
+    print(f"Model with {sizes['rows']} rows, {sizes['columns']} columns and {sizes['nonzeros']} nonzeros "
+          f"({sizes['binary']} binary) exported to {output}")
+    if args.validate:
+        problems = validate(model, output, header["P"], ship, header["cargo_types"], solve=True, time_limit=args.time_limit)
+        for problem in problems:
+            print(f"MISMATCH {problem}")
+        if problems:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+"""
+Binary scenario file format for the stochastic stowage pipeline.
+
+The text export of `data_generation.test_stochastic` writes one line per OD matrix row, which
+for N=70000 and P=15 amounts to hundreds of MB that Julia has to parse line by line. This
+module stores the same data as a fixed header followed by one contiguous integer payload in
+C order, so it can be memory-mapped from both Python and Julia (`read_binary_scenario_instance`
+in scenarios_instance_reader.jl). The payload is either dense, (N, K, P, P), or holds only the
+valid OD pairs, (N, K, n_pairs), as in od_tensor.ODTensor.
+
+Layout (little endian)
+----------------------
+    magic           8s   b"STOWSCN\\0"
+    version         u2
+    dtype           4s   numpy dtype string of the payload, e.g. "<i4"
+    P               u4   number of ports
+    N               u8   number of scenarios
+    K               u4   number of cargo types
+    seed            i8   generator seed, -1 if unknown
+    distribution    16s  distribution name, NUL padded
+    data_offset     u8   byte offset of the payload (64-byte aligned)
+    layout          u1   0 = dense, 1 = triu (version >= 2)
+    start_port      u4   first origin kept by the triu layout (version >= 2)
+    cargo table     K x (length u2, weight f8, type 4s)
+    stream_length   u2   length of the stream record, 0 if unknown (version >= 3)
+    stream          stream_length bytes of JSON identifying the generator stream (version >= 3)
+    payload         N x K x P x P (dense) or N x K x n_pairs (triu) elements of dtype
+
+Version 1 files have no layout fields and are always dense. The stream record of version 3
+holds what, besides the fields above, decides the scenarios of a generated set (instance size,
+sampling mode, kind of random stream, chunk size), so that a file is only ever extended with
+scenarios of the same stream. Readers that do not know it skip it through data_offset.
+"""
+
+import json
+import os
+import shutil
+import struct
+
+import numpy as np
+
+from od_tensor import ODTensor, narrow, od_pairs, smallest_int_dtype
+
+
+MAGIC = b"STOWSCN\0"
+VERSION = 3
+HEADER = struct.Struct("<8sH4sIQIq16sQ")
+LAYOUT = struct.Struct("<BI")
+LAYOUTS = ("dense", "triu")
+CARGO_RECORD = struct.Struct("<Hd4s")
+STREAM_LENGTH = struct.Struct("<H")
+ALIGNMENT = 64
+# Offset of the N field inside the header, patched when a streamed file is closed
+N_OFFSET = 8 + 2 + 4 + 4
+
+
+def _encode_cargo_type(ctype):
+    size, weight, ctype_str = ctype
+    return CARGO_RECORD.pack(int(str(size).replace("ft", "")), float(weight), ctype_str.encode("ascii"))
+
+
+def _decode_cargo_type(raw):
+    size, weight, ctype_str = CARGO_RECORD.unpack(raw)
+    return (f"{size}ft", weight, ctype_str.rstrip(b"\0").decode("ascii"))
+
+
+def _encode_stream(stream):
+    return b"" if stream is None else json.dumps(stream, sort_keys=True).encode("ascii")
+
+
+def _data_offset(K, stream=None):
+    end = HEADER.size + LAYOUT.size + K * CARGO_RECORD.size + STREAM_LENGTH.size + len(_encode_stream(stream))
+    return -(-end // ALIGNMENT) * ALIGNMENT
+
+
+def _pack_header(P, N, cargo_types, dtype, distribution, seed, layout="dense", start_port=0, stream=None):
+    dtype = np.dtype(dtype)
+    if dtype.kind not in "iu":
+        raise ValueError(f"payload dtype must be an integer type, got {dtype}")
+    if layout not in LAYOUTS:
+        raise ValueError(f"layout must be one of {LAYOUTS}, got {layout!r}")
+    K = len(cargo_types)
+    header = HEADER.pack(MAGIC, VERSION, dtype.str.encode("ascii"), int(P), int(N), K,
+                         -1 if seed is None else int(seed),
+                         ("" if distribution is None else distribution).encode("ascii"),
+                         _data_offset(K, stream))
+    header += LAYOUT.pack(LAYOUTS.index(layout), int(start_port))
+    table = b"".join(_encode_cargo_type(ctype) for ctype in cargo_types)
+    record = _encode_stream(stream)
+    return (header + table + STREAM_LENGTH.pack(len(record)) + record).ljust(_data_offset(K, stream), b"\0")
+
+
+def read_scenario_header(path):
+    """
+    Read the header of a binary scenario file.
+
+    Returns
+    -------
+    header : dict
+        Keys: version, dtype, P, N, K, seed, distribution, data_offset, layout, start_port,
+        shape (of the payload), cargo_types and stream (dict, None if unknown).
+    """
+    with open(path, "rb") as f:
+        raw = f.read(HEADER.size)
+        if len(raw) < HEADER.size or raw[:8] != MAGIC:
+            raise ValueError(f"{path} is not a binary scenario file")
+        magic, version, dtype, P, N, K, seed, distribution, data_offset = HEADER.unpack(raw)
+        if version > VERSION:
+            raise ValueError(f"{path} has format version {version}, this reader supports up to {VERSION}")
+        layout, start_port = LAYOUT.unpack(f.read(LAYOUT.size)) if version >= 2 else (0, 0)
+        table = f.read(K * CARGO_RECORD.size)
+        stream = None
+        if version >= 3:
+            length, = STREAM_LENGTH.unpack(f.read(STREAM_LENGTH.size))
+            stream = json.loads(f.read(length)) if length else None
+    layout = LAYOUTS[layout]
+    shape = (N, K, P, P) if layout == "dense" else (N, K, len(od_pairs(P, start_port)[0]))
+    cargo_types = [_decode_cargo_type(table[i * CARGO_RECORD.size:(i + 1) * CARGO_RECORD.size]) for i in range(K)]
+    return {"version": version,
+            "dtype": np.dtype(dtype.rstrip(b"\0").decode("ascii")),
+            "P": P,
+            "N": N,
+            "K": K,
+            "seed": None if seed < 0 else seed,
+            "distribution": distribution.rstrip(b"\0").decode("ascii"),
+            "data_offset": data_offset,
+            "layout": layout,
+            "start_port": start_port,
+            "shape": shape,
+            "cargo_types": cargo_types,
+            "stream": stream}
+
+
+def open_scenario_file(path, mode="r"):
+    """
+    Memory-map the payload of a binary scenario file.
+
+    Parameters
+    ----------
+    path : str
+        File written by `write_scenario_file` or `ScenarioFileWriter`.
+    mode : str, optional
+        numpy.memmap mode, "r" (default) or "r+".
+
+    Returns
+    -------
+    header : dict
+        See `read_scenario_header`.
+    scenarios : numpy.memmap
+        Payload array, of shape (N, K, P, P) for dense files or (N, K, n_pairs) for triu files.
+    """
+    header = read_scenario_header(path)
+    shape = header["shape"]
+    if header["N"] == 0:
+        return header, np.zeros(shape, dtype=header["dtype"])
+    scenarios = np.memmap(path, dtype=header["dtype"], mode=mode, offset=header["data_offset"], shape=shape)
+    return header, scenarios
+
+
+def open_od_tensor(path):
+    """
+    Open a binary scenario file as an ODTensor of shape (N, K, n_pairs).
+    Triu files are memory-mapped; dense files are compacted in memory.
+    """
+    header, scenarios = open_scenario_file(path)
+    if header["layout"] == "triu":
+        return header, ODTensor(scenarios, header["P"], header["start_port"])
+    return header, ODTensor.from_dense(scenarios)
+
+
+def _check_range(scenarios, dtype):
+    info = np.iinfo(dtype)
+    if scenarios.size and (scenarios.min() < info.min or scenarios.max() > info.max):
+        raise OverflowError(f"scenario values do not fit into {np.dtype(dtype)}")
+
+
+class ScenarioFileWriter:
+    """
+    Append-only writer for binary scenario files.
+
+    The header is written on open with N=0 and the scenario count is patched after every
+    append, so scenarios can be written batch by batch and the file stays readable up to the
+    last complete batch if the process dies. `reopen` continues an existing file.
+
+    Parameters
+    ----------
+    path : str
+        Output file.
+    P : int
+        Number of ports.
+    cargo_types : list of tuple
+        Cargo type table, e.g. DemandGenerator.cargo_types.
+    distribution : str, optional
+        Distribution name stored in the header.
+    seed : int, optional
+        Seed stored in the header.
+    dtype : numpy dtype, optional
+        Payload integer type. Defaults to int32. If None, the smallest integer type that holds
+        the values is used, and the payload written so far is widened when a later batch
+        needs a larger type.
+    layout : str, optional
+        "dense" (default) or "triu" to store only the valid OD pairs.
+    start_port : int, optional
+        First origin (0-based) kept by the triu layout. Defaults to 0.
+    stream : dict, optional
+        JSON-serializable identity of the generator stream stored in the header, see
+        data_generation.scenario_stream.
+    """
+
+    def __init__(self, path, P, cargo_types, distribution=None, seed=None, dtype=np.int32, layout="dense", start_port=0,
+                 stream=None):
+        self.path = path
+        self.P = int(P)
+        self.K = len(cargo_types)
+        self.cargo_types = cargo_types
+        self.distribution = distribution
+        self.seed = seed
+        self.auto_dtype = dtype is None
+        self.dtype = np.dtype(np.uint8 if dtype is None else dtype)
+        self.layout = layout
+        self.start_port = int(start_port)
+        self.stream = stream
+        self.n_written = 0
+        self._file = open(path, "wb")
+        self._file.write(self._header(0))
+
+    @classmethod
+    def reopen(cls, path):
+        """
+        Open an existing binary scenario file for appending more scenarios to it. The payload
+        type is widened as for dtype=None if a later batch needs it.
+        """
+        header = read_scenario_header(path)
+        if header["version"] < 2:
+            raise ValueError(f"{path} has format version {header['version']}, only version 2 files can be extended")
+        writer = cls.__new__(cls)
+        writer.path = path
+        writer.P = header["P"]
+        writer.K = header["K"]
+        writer.cargo_types = header["cargo_types"]
+        writer.distribution = header["distribution"] or None
+        writer.seed = header["seed"]
+        writer.auto_dtype = True
+        writer.dtype = header["dtype"]
+        writer.layout = header["layout"]
+        writer.start_port = header["start_port"]
+        writer.stream = header["stream"]
+        writer.n_written = header["N"]
+        writer._file = open(path, "r+b")
+        # Drop a partial batch an interrupted append may have left behind the last counted scenario
+        row = header["dtype"].itemsize * int(np.prod(header["shape"][1:]))
+        writer._file.truncate(header["data_offset"] + header["N"] * row)
+        writer._file.seek(0, os.SEEK_END)
+        return writer
+
+    def _header(self, N):
+        return _pack_header(self.P, N, self.cargo_types, self.dtype, self.distribution, self.seed, self.layout, self.start_port,
+                            self.stream)
+
+    def _widen(self, lo, hi):
+        """
+        Rewrite the payload written so far with a dtype that also holds [lo, hi].
+        """
+        current = np.iinfo(self.dtype)
+        dtype = smallest_int_dtype(min(lo, current.min), max(hi, current.max))
+        if dtype == self.dtype:
+            return
+        self._file.close()
+        # A reopened file keeps the data offset of its own format version
+        offset = read_scenario_header(self.path)["data_offset"]
+        row = self.K * (self.P * self.P if self.layout == "dense" else len(od_pairs(self.P, self.start_port)[0]))
+        old_dtype, self.dtype = self.dtype, dtype
+        tmp_path = self.path + ".tmp"
+        with open(self.path, "rb") as src, open(tmp_path, "wb") as dst:
+            dst.write(self._header(self.n_written))
+            src.seek(offset)
+            block = max(1, (1 << 24) // (row * old_dtype.itemsize)) * row * old_dtype.itemsize
+            while True:
+                raw = src.read(block)
+                if not raw:
+                    break
+                dst.write(np.frombuffer(raw, dtype=old_dtype).astype(dtype).tobytes())
+        shutil.move(tmp_path, self.path)
+        self._file = open(self.path, "r+b")
+        self._file.seek(0, os.SEEK_END)
+
+    def append(self, scenarios):
+        """
+        Append a batch of scenarios, either dense with shape (n, K, P, P) (or a single (K, P, P)
+        scenario) or as an ODTensor of shape (n, K, n_pairs).
+        """
+        if isinstance(scenarios, ODTensor):
+            if self.layout == "dense":
+                scenarios = scenarios.to_dense()
+            elif (scenarios.P, scenarios.start_port) != (self.P, self.start_port):
+                raise ValueError("ODTensor ports or start_port do not match the file")
+            else:
+                scenarios = scenarios.data
+        elif self.layout == "triu":
+            scenarios = ODTensor.from_dense(scenarios, self.start_port, dtype=np.int64).data
+        scenarios = np.asarray(scenarios)
+        if (self.layout == "dense" and scenarios.ndim == 3) or (self.layout == "triu" and scenarios.ndim == 2):
+            scenarios = scenarios[None]
+        expected = (self.K, self.P, self.P) if self.layout == "dense" else (self.K, len(od_pairs(self.P, self.start_port)[0]))
+        if scenarios.shape[1:] != expected:
+            raise ValueError(f"expected scenarios of shape (n, {', '.join(map(str, expected))}), got {scenarios.shape}")
+        if self.auto_dtype and scenarios.size:
+            self._widen(int(scenarios.min()), int(scenarios.max()))
+        _check_range(scenarios, self.dtype)
+        self._file.write(np.ascontiguousarray(scenarios, dtype=self.dtype).tobytes())
+        self.n_written += scenarios.shape[0]
+        self._file.seek(N_OFFSET)
+        self._file.write(struct.pack("<Q", self.n_written))
+        self._file.seek(0, os.SEEK_END)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_scenario_file(path, scenarios, cargo_types, distribution=None, seed=None, dtype=None):
+    """
+    Write a scenario set to a binary scenario file.
+
+    A dense (N, K, P, P) array is stored with the dense layout and an ODTensor with the triu
+    layout. dtype defaults to the smallest integer type that holds the values.
+
+    Returns the path written.
+    """
+    if isinstance(scenarios, ODTensor):
+        P, layout, start_port, values = scenarios.P, "triu", scenarios.start_port, scenarios.data
+    else:
+        values = np.asarray(scenarios)
+        P, layout, start_port = values.shape[-1], "dense", 0
+    dtype = narrow(values).dtype if dtype is None else dtype
+    with ScenarioFileWriter(path, P, cargo_types, distribution, seed, dtype, layout, start_port) as writer:
+        writer.append(scenarios)
+    return path
+
+
+def write_text_header(f, P, N, cargo_types):
+    """
+    Write the "P N" line and the cargo type table of a text scenario file.
+    """
+    f.write(f"{P} {N}\n")
+    for ctype in cargo_types:
+        size_val, weight, ctype_str = ctype
+        size_int = int(str(size_val).replace('ft', ''))
+        f.write(f"{size_int} {weight} {ctype_str}\n")
+
+
+def write_text_matrices(f, matrices):
+    """
+    Write OD matrices (any array of shape (..., P, P)) as one whitespace separated line per row.
+    """
+    matrices = np.asarray(matrices)
+    np.savetxt(f, matrices.reshape(-1, matrices.shape[-1]), fmt="%d")
+
+
+def read_text_scenario_file(path):
+    """
+    Read a text scenario file as written by `data_generation.test_stochastic`.
+
+    Returns
+    -------
+    header : dict
+        Keys: P, N, K, cargo_types.
+    scenarios : numpy.ndarray
+        Array of shape (N, K, P, P).
+    """
+    with open(path, "r") as f:
+        P, N = (int(x) for x in f.readline().split())
+        cargo_types = []
+        line = f.readline().split()
+        # The cargo type table ends where the first matrix row (P integers) begins
+        while len(line) == 3 and not line[2].lstrip("-").isdigit():
+            cargo_types.append((f"{line[0]}ft", float(line[1]), line[2]))
+            line = f.readline().split()
+        K = len(cargo_types)
+        rest = np.array(line, dtype=np.int64)
+        body = np.fromstring(f.read(), dtype=np.int64, sep=" ")
+    # Trailing lines after the last matrix (e.g. cluster counts) are not part of the scenarios
+    scenarios = np.concatenate([rest, body])[:N * K * P * P].reshape(N, K, P, P)
+    return {"P": P, "N": N, "K": K, "cargo_types": cargo_types}, scenarios
+
+
+def convert_text_scenario_file(text_path, binary_path=None, distribution=None, seed=None, dtype=None, layout="triu"):
+    """
+    Convert a text scenario file to the binary format. Defaults to the same name with a .scn suffix
+    and the triu layout.
+    """
+    binary_path = os.path.splitext(text_path)[0] + ".scn" if binary_path is None else binary_path
+    header, scenarios = read_text_scenario_file(text_path)
+    if layout == "triu":
+        # Keep every row that carries demand in this file
+        origins = np.nonzero(scenarios.any(axis=(0, 1, 3)))[0]
+        scenarios = ODTensor.from_dense(scenarios, start_port=int(origins[0]) if origins.size else 0)
+    return write_scenario_file(binary_path, scenarios, header["cargo_types"], distribution, seed, dtype)
@@ -0,0 +1,430 @@
+"""
+Scenario reduction for the stochastic stowage model.
+
+Replaces the Julia step `kmeans(hcat(scenario_vectors...), n)` + `build_clustered_instances`, which
+materialises a dense (28 P^2) x N matrix for every cluster count. Here mini-batch k-means
+(Sculley, 2010) runs on the compact OD vectors of a scenario set, which may be an in-memory
+tensor, a memory-mapped .scn file or a CounterScenarioSet generated on access, and only
+touches bounded blocks of it at a time. Nested cluster counts are warm-started from the
+previous solution, and the final assignment for all cluster counts is done in one pass over
+the data.
+
+As an alternative that keeps actual generated scenarios, `forward_selection` and
+`backward_reduction` implement the fast forward selection / backward reduction of Heitsch &
+Roemisch (2003). The probability of every dropped scenario is moved to its nearest kept one,
+and the resulting Kantorovich (transport) distance is reported for every set size, so the
+smallest set meeting a quality target can be picked with `n_for_tolerance`.
+
+The result is written as a text scenario file of rounded centers (or selected scenarios)
+followed by one line with the cluster counts, which `read_clustered_instance` in
+cluster_instance_reader.jl loads into the ClusteredInstances used by `build_stochastic_model_2`.
+With --ship, scenarios that overbook the vessel as a whole (capacity_screen.screen) are
+dropped first.
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+from od_tensor import ODTensor
+from scenario_io import open_od_tensor, write_text_header, write_text_matrices
+from scenario_set import CounterScenarioSet
+
+
+def _as_od_tensor(scenarios):
+    """
+    Accept a path to a .scn file, an ODTensor, a CounterScenarioSet or a dense (N, K, P, P) array.
+    Returns (ODTensor or CounterScenarioSet, cargo_types or None).
+    """
+    if isinstance(scenarios, (str, os.PathLike)):
+        header, od = open_od_tensor(scenarios)
+        return od, header["cargo_types"]
+    if isinstance(scenarios, ODTensor):
+        return scenarios, None
+    if isinstance(scenarios, CounterScenarioSet):
+        return scenarios, scenarios.cargo_types
+    return ODTensor.from_dense(np.asarray(scenarios)), None
+
+
+def _iter_blocks(X, block_size):
+    for start in range(0, X.shape[0], block_size):
+        yield start, np.asarray(X[start:start + block_size], dtype=np.float32)
+
+
+def _sq_distances(B, centers, center_sq):
+    """
+    Squared euclidean distances between the rows of B and the centers, shape (len(B), k).
+    """
+    d = (B * B).sum(axis=1)[:, None] - 2.0 * (B @ centers.T) + center_sq[None, :]
+    return np.maximum(d, 0.0)
+
+
+def _one_hot(labels, k):
+    M = np.zeros((len(labels), k), dtype=np.float32)
+    M[np.arange(len(labels)), labels] = 1.0
+    return M
+
+
+def _sample_rows(X, n, rng):
+    """
+    Read n distinct random rows of X (sorted indices keep memmap access sequential).
+    """
+    idx = np.sort(rng.choice(X.shape[0], size=min(n, X.shape[0]), replace=False))
+    return np.asarray(X[idx], dtype=np.float32)
+
+
+def _kmeans_plus_plus(S, k, rng, centers=None):
+    """
+    k-means++ seeding on the sample S. Existing centers are kept and extended to k centers.
+    """
+    chosen = [] if centers is None else list(centers)
+    if not chosen:
+        chosen.append(S[rng.integers(S.shape[0])])
+    C = np.array(chosen)
+    closest = _sq_distances(S, C, (C * C).sum(axis=1)).min(axis=1)
+    while len(chosen) < k:
+        total = closest.sum()
+        j = rng.integers(S.shape[0]) if total <= 0 else rng.choice(S.shape[0], p=closest / total)
+        chosen.append(S[j])
+        closest = np.minimum(closest, ((S - S[j]) ** 2).sum(axis=1))
+    return np.array(chosen, dtype=np.float32)
+
+
+def _minibatch_fit(X, centers, batch_size, max_iter, max_no_improvement, rng):
+    """
+    Mini-batch k-means updates of centers (in place) with per-center learning rates 1/count.
+
+    Stops after max_no_improvement steps without improvement of the smoothed mini-batch inertia,
+    as in scikit-learn's MiniBatchKMeans.
+    """
+    counts = np.zeros(centers.shape[0], dtype=np.float32)
+    alpha = min(1.0, 2.0 * batch_size / (X.shape[0] + 1))
+    ewa_inertia = None
+    best = np.inf
+    no_improvement = 0
+    for _ in range(int(max_iter)):
+        B = _sample_rows(X, batch_size, rng)
+        d = _sq_distances(B, centers, (centers * centers).sum(axis=1))
+        labels = d.argmin(axis=1)
+        batch_inertia = float(d[np.arange(len(B)), labels].mean())
+        n_j = np.bincount(labels, minlength=centers.shape[0]).astype(np.float32)
+        sums = _one_hot(labels, centers.shape[0]).T @ B
+        hit = n_j > 0
+        counts[hit] += n_j[hit]
+        centers[hit] += (sums[hit] - n_j[hit, None] * centers[hit]) / counts[hit, None]
+
+        ewa_inertia = batch_inertia if ewa_inertia is None else (1 - alpha) * ewa_inertia + alpha * batch_inertia
+        if ewa_inertia < best:
+            best = ewa_inertia
+            no_improvement = 0
+        else:
+            no_improvement += 1
+            if no_improvement >= max_no_improvement:
+                break
+    return centers
+
+
+def _assign(X, levels, block_size):
+    """
+    One pass over X assigning every row to the nearest center of every level.
+    Returns per level (labels, counts, exact cluster means, inertia).
+    """
+    n_levels = len(levels)
+    labels = [np.empty(X.shape[0], dtype=np.int64) for _ in range(n_levels)]
+    sums = [np.zeros(c.shape, dtype=np.float64) for c in levels]
+    counts = [np.zeros(c.shape[0], dtype=np.int64) for c in levels]
+    inertia = np.zeros(n_levels)
+    center_sq = [(c * c).sum(axis=1) for c in levels]
+    for start, B in _iter_blocks(X, block_size):
+        for i, centers in enumerate(levels):
+            d = _sq_distances(B, centers, center_sq[i])
+            lab = d.argmin(axis=1)
+            labels[i][start:start + len(B)] = lab
+            inertia[i] += d[np.arange(len(B)), lab].sum()
+            counts[i] += np.bincount(lab, minlength=centers.shape[0])
+            sums[i] += _one_hot(lab, centers.shape[0]).T @ B
+    means = []
+    for i, centers in enumerate(levels):
+        m = centers.astype(np.float64)
+        hit = counts[i] > 0
+        m[hit] = sums[i][hit] / counts[i][hit, None]
+        means.append(m)
+    return labels, counts, means, inertia
+
+
+def minibatch_kmeans(scenarios, n_clusters, batch_size=1024, max_iter=300, max_no_improvement=10, block_size=4096,
+                     init_size=None, seed=None):
+    """
+    Cluster a scenario set with mini-batch k-means for one or several (nested) cluster counts.
+
+    Parameters
+    ----------
+    scenarios : str, ODTensor, CounterScenarioSet or numpy.ndarray
+        Path to a .scn file, a compact ODTensor (N, K, n_pairs), a random-access scenario set
+        or a dense (N, K, P, P) array.
+    n_clusters : int or list of int
+        Cluster count(s). Larger counts are warm-started from the next smaller one.
+    batch_size : int, optional
+        Scenarios per mini-batch. Defaults to 1024.
+    max_iter : int, optional
+        Maximum number of mini-batch steps per cluster count. Defaults to 300.
+    max_no_improvement : int, optional
+        Stop after this many steps without improvement of the smoothed batch inertia. Defaults to 10.
+    block_size : int, optional
+        Scenarios per block in the final assignment pass; bounds memory. Defaults to 4096.
+    init_size : int, optional
+        Sample size for k-means++ seeding. Defaults to max(10 * max(n_clusters), batch_size).
+    seed : int, optional
+        Random seed.
+
+    Returns
+    -------
+    results : dict
+        Mapping n -> dict with keys "centers" (n, K, P, P) float array of exact cluster means,
+        "counts" (n,) int array summing to N, "labels" (N,) and "inertia". A single int for
+        n_clusters returns that entry directly.
+    """
+    od, _ = _as_od_tensor(scenarios)
+    X = od.vectors()
+    single = np.isscalar(n_clusters)
+    ks = sorted({int(k) for k in np.atleast_1d(n_clusters)})
+    if ks[0] < 1 or ks[-1] > X.shape[0]:
+        raise ValueError(f"cluster counts must be in [1, {X.shape[0]}], got {ks}")
+    rng = np.random.default_rng(seed)
+
+    # The seeding sample is drawn once and shared by all cluster counts
+    S = _sample_rows(X, max(10 * ks[-1], batch_size) if init_size is None else init_size, rng)
+    levels = []
+    centers = None
+    for k in ks:
+        centers = _kmeans_plus_plus(S, k, rng, centers)
+        centers = _minibatch_fit(X, centers, batch_size, max_iter, max_no_improvement, rng)
+        levels.append(centers.copy())
+
+    labels, counts, means, inertia = _assign(X, levels, block_size)
+    results = {}
+    for i, k in enumerate(ks):
+        results[k] = {"centers": ODTensor(means[i].reshape((k,) + od.shape[1:]), od.P, od.start_port).to_dense(np.float64),
+                      "counts": counts[i],
+                      "labels": labels[i],
+                      "inertia": float(inertia[i])}
+    return results[ks[0]] if single else results
+
+
+# ---------- Forward selection / backward reduction ----------
+def _candidate_distances(X, candidates, block_size):
+    """
+    Euclidean distances from every row of X to the candidate rows, shape (N, C) in float32.
+    Computed block by block, so only the result is held in memory.
+    """
+    Xc = np.asarray(X[candidates], dtype=np.float32)
+    c_sq = (Xc * Xc).sum(axis=1)
+    D = np.empty((X.shape[0], len(candidates)), dtype=np.float32)
+    for start, B in _iter_blocks(X, block_size):
+        D[start:start + len(B)] = np.sqrt(_sq_distances(B, Xc, c_sq))
+    return D
+
+
+def _reduction_setup(scenarios, n_candidates, probabilities, block_size, seed):
+    od, _ = _as_od_tensor(scenarios)
+    X = od.vectors()
+    N = X.shape[0]
+    p = np.full(N, 1.0 / N) if probabilities is None else np.asarray(probabilities, dtype=float) / np.sum(probabilities)
+    if n_candidates is None or n_candidates >= N:
+        candidates = np.arange(N)
+    else:
+        candidates = np.sort(np.random.default_rng(seed).choice(N, size=int(n_candidates), replace=False))
+    return od, p, candidates, _candidate_distances(X, candidates, block_size)
+
+
+def _redistribute(D, kept, candidates, p, distances):
+    """
+    Move the probability of every scenario to its nearest kept candidate.
+    """
+    labels = D[:, kept].argmin(axis=1)
+    counts = np.bincount(labels, minlength=len(kept))
+    return {"indices": candidates[kept],
+            "probabilities": np.bincount(labels, weights=p, minlength=len(kept)),
+            "counts": counts,
+            "labels": labels,
+            "distances": np.asarray(distances)}
+
+
+def forward_selection(scenarios, n_keep, n_candidates=512, probabilities=None, block_size=4096, seed=None):
+    """
+    Fast forward selection: greedily add the candidate scenario that most reduces the transport
+    distance between the full and the reduced scenario distribution.
+
+    Parameters
+    ----------
+    scenarios : str, ODTensor, CounterScenarioSet or numpy.ndarray
+        Path to a .scn file, a compact ODTensor (N, K, n_pairs), a random-access scenario set
+        or a dense (N, K, P, P) array.
+    n_keep : int
+        Number of scenarios to select.
+    n_candidates : int, optional
+        Number of randomly drawn scenarios that may be selected. Every scenario still counts in
+        the distance. Memory is N * n_candidates * 4 bytes and each step costs O(N * n_candidates).
+        None uses all scenarios as candidates. Defaults to 512.
+    probabilities : array-like, optional
+        Scenario probabilities. Defaults to uniform.
+    block_size : int, optional
+        Scenarios per block when computing distances. Defaults to 4096.
+    seed : int, optional
+        Random seed for the candidate draw.
+
+    Returns
+    -------
+    result : dict
+        "indices" of the selected scenarios, their redistributed "probabilities" and "counts"
+        (number of original scenarios mapped to each), "labels" (N,) and "distances", where
+        distances[k - 1] is the reduction distance with the first k selected scenarios.
+    """
+    od, p, candidates, D = _reduction_setup(scenarios, n_candidates, probabilities, block_size, seed)
+    n_keep = int(n_keep)
+    if not 1 <= n_keep <= len(candidates):
+        raise ValueError(f"n_keep must be in [1, {len(candidates)}], got {n_keep}")
+
+    closest = np.full(D.shape[0], np.inf, dtype=np.float32)
+    available = np.ones(len(candidates), dtype=bool)
+    kept, distances = [], []
+    for _ in range(n_keep):
+        cost = np.zeros(len(candidates))
+        for start in range(0, D.shape[0], block_size):
+            rows = slice(start, start + block_size)
+            cost += p[rows] @ np.minimum(D[rows], closest[rows, None])
+        cost[~available] = np.inf
+        j = int(cost.argmin())
+        kept.append(j)
+        distances.append(cost[j])
+        available[j] = False
+        closest = np.minimum(closest, D[:, j])
+    return _redistribute(D, kept, candidates, p, distances)
+
+
+def backward_reduction(scenarios, n_keep, n_candidates=512, probabilities=None, block_size=4096, seed=None):
+    """
+    Backward reduction: start from all candidate scenarios and repeatedly drop the one whose
+    removal increases the transport distance the least.
+
+    Parameters and result are as for `forward_selection`, except that distances[k - 1] is the
+    reduction distance with k kept scenarios for k from n_keep up to the number of candidates
+    (entries for smaller k are NaN).
+    """
+    od, p, candidates, D = _reduction_setup(scenarios, n_candidates, probabilities, block_size, seed)
+    C = len(candidates)
+    n_keep = int(n_keep)
+    if not 1 <= n_keep <= C:
+        raise ValueError(f"n_keep must be in [1, {C}], got {n_keep}")
+
+    kept = np.ones(C, dtype=bool)
+    rows = np.arange(D.shape[0])
+
+    def nearest_two(r):
+        sub = np.where(kept[None, :], D[r], np.inf)
+        order = np.argsort(sub, axis=1)[:, :2] if kept.sum() > 1 else np.argsort(sub, axis=1)[:, :1]
+        first = order[:, 0]
+        second = order[:, 1] if order.shape[1] > 1 else first
+        return first, sub[np.arange(len(r)), first], sub[np.arange(len(r)), second]
+
+    first, d1, d2 = np.empty(D.shape[0], dtype=np.int64), np.empty(D.shape[0]), np.empty(D.shape[0])
+    for start in range(0, D.shape[0], block_size):
+        r = rows[start:start + block_size]
+        first[r], d1[r], d2[r] = nearest_two(r)
+
+    distances = np.full(C, np.nan)
+    distances[C - 1] = p @ d1
+    for size in range(C - 1, n_keep - 1, -1):
+        # Removing j moves the mass of the scenarios closest to j to their second nearest
+        increase = np.bincount(first, weights=p * (d2 - d1), minlength=C)
+        increase[~kept] = np.inf
+        j = int(increase.argmin())
+        kept[j] = False
+        # Rows that had j as nearest or second nearest need their two nearest recomputed
+        affected = rows[(first == j) | (D[:, j] <= d2)]
+        first[affected], d1[affected], d2[affected] = nearest_two(affected)
+        distances[size - 1] = p @ d1
+    return _redistribute(D, np.nonzero(kept)[0], candidates, p, distances)
+
+
+def n_for_tolerance(distances, tolerance, relative=True):
+    """
+    Smallest number of scenarios whose reduction distance is at most tolerance.
+
+    With relative=True the tolerance is relative to the distance of the best single scenario
+    (distances[0]), as in Heitsch & Roemisch. Returns None if no set size meets the target.
+    """
+    distances = np.asarray(distances, dtype=float)
+    target = tolerance * distances[0] if relative else tolerance
+    ok = np.nonzero(distances <= target)[0]
+    return int(ok[0]) + 1 if ok.size else None
+
+
+def write_clustered_instance(path, centers, counts, cargo_types):
+    """
+    Write reduced scenarios as a text scenario file followed by a line of cluster counts.
+
+    Centers are rounded to integers as in `build_clustered_instances`. The file can be read with
+    `read_scenario_instance` (which ignores the counts line) or `read_clustered_instance`.
+
+    Parameters
+    ----------
+    path : str
+        Output file.
+    centers : numpy.ndarray
+        Array of shape (n, K, P, P).
+    counts : array-like of int
+        Number of original scenarios represented by each center.
+    cargo_types : list of tuple
+        Cargo type table.
+    """
+    centers = np.rint(np.asarray(centers)).astype(np.int64)
+    with open(path, "w") as f:
+        write_text_header(f, centers.shape[-1], centers.shape[0], cargo_types)
+        write_text_matrices(f, centers)
+        f.write(" ".join(str(int(c)) for c in counts) + "\n")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reduce a binary scenario file to weighted clustered instances.")
+    parser.add_argument("scenarios", help=".scn file written by data_generation.test_stochastic")
+    parser.add_argument("--method", choices=["kmeans", "forward", "backward"], default="kmeans")
+    parser.add_argument("--clusters", type=int, nargs="+", default=[10, 20, 30, 40, 50])
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--max-iter", type=int, default=300)
+    parser.add_argument("--candidates", type=int, default=512, help="candidate pool for forward/backward")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--ship", default=None, help="S, M, L or a ship file: drop scenarios above --max-load before reducing")
+    parser.add_argument("--port-one", default=None, help=".scn loading list of port one for the --ship screen")
+    parser.add_argument("--max-load", type=float, default=1.0, help="largest load factor kept by the --ship screen")
+    args = parser.parse_args()
+
+    header, od = open_od_tensor(args.scenarios)
+    if args.ship is not None:
+        # The counts of the reduced instance then only cover the kept scenarios
+        from capacity_screen import resolve_ship, screen
+        from ship_reader import load_ship_instance
+        result = screen(od, load_ship_instance(resolve_ship(args.ship)), header["cargo_types"], args.port_one, args.max_load)
+        print(f"Dropped {int(result['overbooked'].sum())} of {len(od)} scenarios with a load factor above {args.max_load}")
+        if len(result["kept"]) == 0:
+            raise ValueError(f"no scenario has a load factor of at most {args.max_load}, raise --max-load")
+        od = od[result["kept"]]
+    stem = os.path.splitext(args.scenarios)[0]
+    if args.method == "kmeans":
+        results = minibatch_kmeans(od, args.clusters, batch_size=args.batch_size, max_iter=args.max_iter, seed=args.seed)
+        for k, res in results.items():
+            path = write_clustered_instance(f"{stem}_kmeans_{k}.txt", res["centers"], res["counts"], header["cargo_types"])
+            print(f"Clustered instance with {k} scenarios exported to {path}")
+        return
+
+    reduce = forward_selection if args.method == "forward" else backward_reduction
+    for k in args.clusters:
+        res = reduce(od, k, n_candidates=args.candidates, seed=args.seed)
+        path = write_clustered_instance(f"{stem}_{args.method}_{k}.txt", od[res["indices"]].to_dense(), res["counts"], header["cargo_types"])
+        print(f"Reduced instance with {k} scenarios (distance {res['distances'][k - 1]:.4g}) exported to {path}")
+
+
+if __name__ == "__main__":
+    main()
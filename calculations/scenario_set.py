@@ -0,0 +1,119 @@
+"""
+Scenario sets that are never stored: scenario i is a pure function of (seed, i).
+
+DemandGenerator._generate_at draws every scenario from its own counter-based Philox stream, so
+any scenario or slice of a set can be produced on demand, in any order and in any process,
+without generating the scenarios before it. CounterScenarioSet wraps that as a read-only,
+array-like view of N scenarios with the interface of an ODTensor (len, shape, slicing,
+vectors()), so it can be passed wherever a .scn file or ODTensor is accepted, e.g. to
+scenario_reduction.minibatch_kmeans, which then samples and assigns scenarios lazily.
+
+    from data_generation import random_access_scenarios
+    loading_list, scenarios = random_access_scenarios(8, "S", None, False, 12908330, 70000, "lognormal")
+    scenarios.scenario(41234)          # dense (K, P, P)
+    scenarios[1000:2000]               # ODTensor of 1000 scenarios
+"""
+
+import numpy as np
+
+from od_tensor import ODTensor, od_pairs
+
+
+class CounterScenarioSet:
+    """
+    Lazy set of n_scenarios scenarios of a DemandGenerator, generated on access.
+
+    Parameters
+    ----------
+    generator : DemandGenerator
+        Scenario-stage generator (include_current_port=False), with its sampling mode.
+    expected_val, std_val : dict
+        Moments of the scenarios, mapping cargo_type -> P x P array.
+    n_scenarios : int
+        Number of scenarios in the set.
+    seed : int, optional
+        Seed of the set; defaults to the generator's seed.
+    """
+
+    def __init__(self, generator, expected_val: dict, std_val: dict, n_scenarios: int, seed: int = None):
+        if generator.sampling in ("lhs", "qmc"):
+            raise ValueError(f"{generator.sampling} designs couple their scenarios, random access needs sampling 'mc' or 'antithetic'")
+        self.generator = generator
+        self.n_scenarios = int(n_scenarios)
+        self.seed = generator.seed if seed is None else seed
+        self.P = generator.P
+        self.start_port = generator.start_port
+        self.cargo_types = list(expected_val.keys())
+        self.T_exp = generator._stack_od(expected_val)
+        self.T_std = generator._stack_od(std_val, cargo_types=self.cargo_types)
+        self.key = generator._scenario_key(self.seed)
+        self.n_pairs = len(od_pairs(self.P, self.start_port)[0])
+
+    def _indices(self, index):
+        if isinstance(index, slice):
+            return np.arange(*index.indices(self.n_scenarios))
+        indices = np.asarray(index, dtype=np.int64)
+        if indices.ndim > 1:
+            raise IndexError("CounterScenarioSet takes an int, a slice or a 1-d array of indices")
+        indices = np.where(indices < 0, indices + self.n_scenarios, indices)
+        if np.any((indices < 0) | (indices >= self.n_scenarios)):
+            raise IndexError(f"scenario index out of range for {self.n_scenarios} scenarios")
+        return indices
+
+    def scenario(self, index: int):
+        """
+        Dense demand (K, P, P) of scenario index.
+        """
+        return self.generator._sample_at(self.T_exp, self.T_std, self._indices([index]), self.key)[0]
+
+    def dense(self, index):
+        """
+        Dense demand (n, K, P, P) of the scenarios at index (slice or array of int).
+        """
+        return self.generator._sample_at(self.T_exp, self.T_std, self._indices(index), self.key)
+
+    def chunks(self, chunk_size: int = 1000, start: int = 0):
+        """
+        Consecutive dense chunks of at most chunk_size scenarios from scenario start on, as
+        DemandGenerator._generate_chunks.
+        """
+        for begin in range(int(start), self.n_scenarios, chunk_size):
+            yield self.dense(slice(begin, begin + chunk_size))
+
+    def vectors(self):
+        """
+        Lazy (N, K * n_pairs) feature vectors for clustering, generated on indexing.
+        """
+        return _VectorView(self)
+
+    @property
+    def shape(self):
+        return (self.n_scenarios, len(self.cargo_types), self.n_pairs)
+
+    def __len__(self):
+        return self.n_scenarios
+
+    def __getitem__(self, index):
+        if np.ndim(index) == 0 and not isinstance(index, slice):
+            return ODTensor.from_dense(self.scenario(index), start_port=self.start_port)
+        return ODTensor.from_dense(self.dense(index), start_port=self.start_port)
+
+    def __repr__(self):
+        return (f"CounterScenarioSet(n_scenarios={self.n_scenarios}, P={self.P}, seed={self.seed}, "
+                f"distribution={self.generator.distribution}, sampling={self.generator.sampling})")
+
+
+class _VectorView:
+    """
+    Row access to the flattened scenarios of a CounterScenarioSet, like ODTensor.vectors().
+    """
+
+    def __init__(self, scenarios):
+        self.scenarios = scenarios
+        self.shape = (scenarios.shape[0], scenarios.shape[1] * scenarios.shape[2])
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        return self.scenarios[index].vectors()
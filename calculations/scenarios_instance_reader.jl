@@ -86,3 +86,95 @@ function read_scenario_instance(filename::String)
     return ScenarioInstance(n_ports, n_scenarios, container_types, scenarios, scenario_vectors, containers)
 end
 
+
+
+# Instance reader for binary scenario .scn files (see scenario_io.py for the layout)
+using Mmap
+
+const BINARY_SCENARIO_DTYPES = Dict("|i1" => Int8, "|u1" => UInt8, "<i2" => Int16, "<u2" => UInt16,
+                                    "<i4" => Int32, "<u4" => UInt32, "<i8" => Int64, "<u8" => UInt64)
+
+function read_binary_scenario_instance(filename::String)
+    file = open(filename)
+    magic = read(file, 8)
+    if magic != Vector{UInt8}("STOWSCN\0")
+        close(file)
+        error("$(filename) is not a binary scenario file")
+    end
+    version = ltoh(read(file, UInt16))
+    dtype = rstrip(String(read(file, 4)), '\0')
+    n_ports = Int(ltoh(read(file, UInt32)))
+    n_scenarios = Int(ltoh(read(file, UInt64)))
+    n_container_types = Int(ltoh(read(file, UInt32)))
+    seed = ltoh(read(file, Int64))
+    distribution = rstrip(String(read(file, 16)), '\0')
+    data_offset = Int(ltoh(read(file, UInt64)))
+    # Version 1 files have no layout fields and are always dense
+    layout = 0
+    start_port = 0
+    if version >= 2
+        layout = Int(read(file, UInt8))
+        start_port = Int(ltoh(read(file, UInt32)))
+    end
+
+    container_types = ContainerType[]
+    for c in 1:n_container_types
+        length = Int(ltoh(read(file, UInt16)))
+        weight = ltoh(read(file, Float64))
+        typ = String(rstrip(String(read(file, 4)), '\0'))
+        height = 2.62
+        is_reefer = false
+        is_HC = false
+        if typ == "HC" || typ == "HR"
+            height = 2.92
+            is_HC = true
+        end
+        if typ == "HR" || typ == "RC"
+            is_reefer = true
+        end
+        push!(container_types, ContainerType(length, weight, typ, height, is_reefer, is_HC))
+    end
+    # The stream record of version 3 files follows the cargo table and is skipped through data_offset
+
+    T = BINARY_SCENARIO_DTYPES[dtype]
+    scenarios = Vector{Vector{Array{Int,2}}}()
+    scenario_vectors = Vector{Vector{Int}}()
+    if layout == 0
+        # The payload is (N, K, P, P) in C order, i.e. (P, P, K, N) in column-major order with
+        # destination as the fastest index, hence the permutedims below
+        payload = Mmap.mmap(file, Array{T,4}, (n_ports, n_ports, n_container_types, n_scenarios), data_offset)
+    else
+        # The payload is (N, K, n_pairs) in C order over the pairs o < d with o > start_port (1-based)
+        pairs = [(o, d) for o in (start_port + 1):n_ports for d in (o + 1):n_ports]
+        payload = Mmap.mmap(file, Array{T,3}, (length(pairs), n_container_types, n_scenarios), data_offset)
+    end
+    for s in 1:n_scenarios
+        if layout == 0
+            matrices = [Array{Int,2}(permutedims(payload[:, :, c, s])) for c in 1:n_container_types]
+        else
+            matrices = [zeros(Int, n_ports, n_ports) for c in 1:n_container_types]
+            for c in 1:n_container_types
+                for (j, (o, d)) in enumerate(pairs)
+                    matrices[c][o, d] = payload[j, c, s]
+                end
+            end
+        end
+        push!(scenarios, matrices)
+        push!(scenario_vectors, vcat([vec(mat) for mat in matrices]...))
+    end
+    close(file)
+
+    containers = Vector{Dict{Tuple{Int,Int}, Vector{Int}}}(undef, n_scenarios)
+    for n in 1:n_scenarios
+        containers[n] = Dict{Tuple{Int,Int}, Vector{Int}}()
+        for o in 1:n_ports
+            for d in 1:n_ports
+                if o < d
+                    containers[n][(o,d)] = [scenarios[n][c][o,d] for c in 1:n_container_types]
+                end
+            end
+        end
+    end
+
+    return ScenarioInstance(n_ports, n_scenarios, container_types, scenarios, scenario_vectors, containers)
+end
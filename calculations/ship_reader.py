@@ -0,0 +1,240 @@
+"""
+Python reader for the ship files in Ships/, mirroring read_ship_instance in Ships/ship_reader.jl.
+
+The file layout is described in Ships/README.md. Field names and index conventions are the
+same as in the Julia ShipInstance struct: location and bay ids are 1-based, and
+locations_under holds 0 or -1 for locations without a below-deck counterpart. The CoG limits
+per port at the end of the file are not read, as in Julia.
+
+On top of the Julia fields every ShipInstance carries 0-based index arrays for vectorized use
+(see ShipInstance.INDEX_FIELDS): the location below and above every location, the locations of
+every bay and the on-deck locations of every bay in CSR form (ptr, index), the adjacent bay
+pairs and the bay adjacency matrix. `load_ship_instance` caches the whole instance as .npz,
+keyed by the SHA-256 of the ship file, so repeated loads skip parsing.
+"""
+
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+CACHE_VERSION = 1
+ENV_CACHE_DIR = "STOWAGE_DEMAND_CACHE"
+# Aggregate capacities in the order used by capacity_screen
+CAPACITY_MEASURES = ("TEU", "FEU", "reefer", "weight")
+
+
+class ShipInstance:
+    """
+    Ship data without port or container information, see ShipInstance in ship_reader.jl.
+
+    Integer fields are int64 arrays and float fields float64 arrays; locations_over_in_bay and
+    bay_bins are lists of arrays. The index fields are computed from them unless all are given.
+
+    Index fields (0-based, -1 where there is none):
+
+        on_deck             (L,) bool, location is on deck (in locations_over)
+        location_below      (L,) below-deck location under an on-deck location
+        location_above      (L,) on-deck location above a below-deck location
+        bay_location_ptr    (n_bays + 1,) CSR offsets into bay_location_index
+        bay_location_index  locations sorted by bay, bay b owns index[ptr[b]:ptr[b + 1]]
+        over_in_bay_ptr     (n_bays + 1,) CSR offsets into over_in_bay_index
+        over_in_bay_index   on-deck locations of every bay, as locations_over_in_bay
+        bin_bays            (n_bins, 2) adjacent bay pairs of bay_bins
+        bay_adjacent        (n_bays, n_bays) bool, symmetric adjacency of the bins
+    """
+
+    FIELDS = (
+        "n_bays", "n_locations", "n_bins",
+        "locations_over", "locations_under", "locations_over_in_bay", "location_bay",
+        "location_TEU_capacity", "location_FEU_capacity", "location_reefer_capacity", "location_weight_capacity",
+        "location_lcg", "location_vcg", "location_tcg",
+        "bay_bins", "bay_lightship_weight", "bay_lcg", "bay_vcg", "bay_tcg",
+        "bay_min_shear", "bay_max_shear", "bay_max_bending",
+    )
+
+    INDEX_FIELDS = (
+        "on_deck", "location_below", "location_above",
+        "bay_location_ptr", "bay_location_index", "over_in_bay_ptr", "over_in_bay_index",
+        "bin_bays", "bay_adjacent",
+    )
+
+    def __init__(self, **fields):
+        missing = [name for name in self.FIELDS if name not in fields]
+        if missing:
+            raise ValueError(f"missing ship fields: {', '.join(missing)}")
+        for name in self.FIELDS:
+            setattr(self, name, fields[name])
+        if all(name in fields for name in self.INDEX_FIELDS):
+            for name in self.INDEX_FIELDS:
+                setattr(self, name, fields[name])
+        else:
+            self._build_indices()
+
+    def _build_indices(self):
+        L, n_bays = self.n_locations, self.n_bays
+        over = np.asarray(self.locations_over, dtype=np.int64) - 1
+        under = np.asarray(self.locations_under, dtype=np.int64)
+
+        self.on_deck = np.zeros(L, dtype=bool)
+        self.on_deck[over] = True
+        # locations_under holds the location below for on-deck locations, -1 or 0 otherwise
+        self.location_below = np.where(self.on_deck & (under > 0), under - 1, -1)
+        self.location_above = np.full(L, -1, dtype=np.int64)
+        stacked = np.nonzero(self.location_below >= 0)[0]
+        self.location_above[self.location_below[stacked]] = stacked
+
+        bay = np.asarray(self.location_bay, dtype=np.int64) - 1
+        self.bay_location_index = np.argsort(bay, kind="stable")
+        self.bay_location_ptr = np.concatenate(([0], np.cumsum(np.bincount(bay, minlength=n_bays))))
+        self.over_in_bay_ptr, self.over_in_bay_index = _csr(self.locations_over_in_bay)
+        self.over_in_bay_index = self.over_in_bay_index - 1
+
+        self.bin_bays = np.array([bins for bins in self.bay_bins], dtype=np.int64).reshape(-1, 2) - 1
+        self.bay_adjacent = np.zeros((n_bays, n_bays), dtype=bool)
+        self.bay_adjacent[self.bin_bays[:, 0], self.bin_bays[:, 1]] = True
+        self.bay_adjacent |= self.bay_adjacent.T
+
+    def bay_locations(self, bay: int):
+        """
+        0-based locations of the 0-based bay.
+        """
+        return self.bay_location_index[self.bay_location_ptr[bay]:self.bay_location_ptr[bay + 1]]
+
+    def capacity(self):
+        """
+        Aggregate capacities of the ship in the order of CAPACITY_MEASURES: TEU slots, FEU slots,
+        reefer plugs and weight (tons), each summed over all locations.
+        """
+        return np.array([self.location_TEU_capacity.sum(), self.location_FEU_capacity.sum(),
+                         self.location_reefer_capacity.sum(), self.location_weight_capacity.sum()], dtype=np.float64)
+
+    def __repr__(self):
+        return f"ShipInstance(n_bays={self.n_bays}, n_locations={self.n_locations}, n_bins={self.n_bins})"
+
+
+def read_ship_instance(path):
+    """
+    Read a ship file.
+
+    Parameters
+    ----------
+    path : str
+        Ship file, e.g. "Ships/Small_ship.txt".
+
+    Returns
+    -------
+    ship : ShipInstance
+    """
+    with open(path, "r") as f:
+        lines = iter(f.read().splitlines())
+
+    def ints():
+        return np.array(next(lines).split(), dtype=np.int64)
+
+    def floats():
+        return np.array(next(lines).split(), dtype=np.float64)
+
+    n_bays, n_locations, n_bins = (int(v) for v in next(lines).split())
+    fields = dict(n_bays=n_bays, n_locations=n_locations, n_bins=n_bins,
+                  locations_over=ints(), locations_under=ints())
+    # each bay line starts with the bay id
+    fields["locations_over_in_bay"] = [ints()[1:] for _ in range(n_bays)]
+    fields["location_bay"] = ints()
+    for name in ("location_TEU_capacity", "location_FEU_capacity", "location_reefer_capacity"):
+        fields[name] = ints()
+    for name in ("location_weight_capacity", "location_lcg", "location_vcg", "location_tcg"):
+        fields[name] = floats()
+    fields["bay_bins"] = [ints() for _ in range(n_bins)]
+    for name in ("bay_lightship_weight", "bay_lcg", "bay_vcg", "bay_tcg", "bay_min_shear", "bay_max_shear", "bay_max_bending"):
+        fields[name] = floats()
+
+    for name in ("locations_under", "location_bay", "location_TEU_capacity", "location_FEU_capacity",
+                 "location_reefer_capacity", "location_weight_capacity"):
+        if len(fields[name]) != n_locations:
+            raise ValueError(f"{path}: {name} has {len(fields[name])} values, expected {n_locations}")
+    return ShipInstance(**fields)
+
+
+def _csr(groups):
+    """
+    (ptr, index) of a list of integer arrays.
+    """
+    ptr = np.concatenate(([0], np.cumsum([len(g) for g in groups]))).astype(np.int64)
+    index = np.concatenate([np.asarray(g, dtype=np.int64) for g in groups]) if groups else np.zeros(0, dtype=np.int64)
+    return ptr, index
+
+
+# ---------- Binary cache ----------
+def save_ship_npz(ship, path):
+    """
+    Write a ShipInstance with its index fields to a .npz file, atomically.
+    """
+    arrays = {name: getattr(ship, name) for name in ShipInstance.FIELDS + ShipInstance.INDEX_FIELDS
+              if name not in ("locations_over_in_bay", "bay_bins")}
+    arrays["bay_bins_ptr"], arrays["bay_bins_index"] = _csr(ship.bay_bins)
+    arrays["cache_version"] = CACHE_VERSION
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path
+
+
+def read_ship_npz(path):
+    """
+    Read a ShipInstance written by save_ship_npz.
+    """
+    with np.load(path) as data:
+        if int(data["cache_version"]) != CACHE_VERSION:
+            raise ValueError(f"{path}: ship cache version {int(data['cache_version'])}, expected {CACHE_VERSION}")
+        fields = {name: data[name] for name in data.files if name not in ("cache_version", "bay_bins_ptr", "bay_bins_index")}
+        for name in ("n_bays", "n_locations", "n_bins"):
+            fields[name] = int(fields[name])
+        ptr = data["over_in_bay_ptr"]
+        fields["locations_over_in_bay"] = [fields["over_in_bay_index"][ptr[b]:ptr[b + 1]] + 1 for b in range(len(ptr) - 1)]
+        ptr, index = data["bay_bins_ptr"], data["bay_bins_index"]
+        fields["bay_bins"] = [index[ptr[b]:ptr[b + 1]] for b in range(len(ptr) - 1)]
+    return ShipInstance(**fields)
+
+
+def load_ship_instance(path, cache_dir=None):
+    """
+    Read a ship file through the binary cache.
+
+    The cache entry is named after the SHA-256 of the ship file, so an edited file is parsed
+    again. Without a cache directory this is read_ship_instance.
+
+    Parameters
+    ----------
+    path : str
+        Ship file, e.g. "Ships/Small_ship.txt".
+    cache_dir : str, optional
+        Cache directory; entries go to its "ships" subdirectory. Defaults to the
+        STOWAGE_DEMAND_CACHE environment variable; no caching if neither is set.
+
+    Returns
+    -------
+    ship : ShipInstance
+    """
+    if cache_dir is None:
+        cache_dir = os.environ.get(ENV_CACHE_DIR)
+    if not cache_dir:
+        return read_ship_instance(path)
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    stem = os.path.splitext(os.path.basename(path))[0]
+    cached = os.path.join(cache_dir, "ships", f"{stem}_{digest[:16]}_v{CACHE_VERSION}.npz")
+    if os.path.exists(cached):
+        return read_ship_npz(cached)
+    ship = read_ship_instance(path)
+    save_ship_npz(ship, cached)
+    return ship
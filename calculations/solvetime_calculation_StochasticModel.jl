@@ -34,6 +34,10 @@ d = "normal"
 seed_scenarios = [60618579, 54337087, 70277723, 57162433, 27836244]
 n_scenarios = [10, 20, 30, 40, 50, 60, 70, 80, 90, 100]        # Number of scenarios
 
+# Scenario file of the largest N so far per (ports, seed). The first n scenarios of a set are the same for
+# every larger N, so each N only appends the missing scenarios to that file instead of regenerating it.
+scenario_files = Dict{Tuple{Int,Int}, String}()
+
 for p in port
     for n in n_scenarios
         filename = "solve_times/solve_times_S_local_$(p)_$(n).csv"
@@ -46,18 +50,20 @@ for p in port
             println("\nNow calculating for $(p) ports, seed $(s):")
             # Call the function with example arguments
             
-            data_file_port_one, data_file_scenarios = data_gen.test_stochastic(p, "S", nothing, false, s, n, d)
+            data_file_port_one, data_file_scenarios = data_gen.test_stochastic(p, "S", nothing, false, s, n, d, "binary";
+                                                                               extend=get(scenario_files, (p, s), nothing))
 
             # Move the created data files to loading_lists folder
             run(`mv $data_file_port_one loading_lists_solve_time/`)
             run(`mv $data_file_scenarios loading_lists_solve_time/`)
             data_file_port_one = "loading_lists_solve_time/" * data_file_port_one
             data_file_scenarios = "loading_lists_solve_time/" * data_file_scenarios
+            scenario_files[(p, s)] = data_file_scenarios
 
-            data_port_one = read_scenario_instance(data_file_port_one)
+            data_port_one = read_binary_scenario_instance(data_file_port_one)
             data_file_port_one = nothing
 
-            data_scenarios = read_scenario_instance(data_file_scenarios)
+            data_scenarios = read_binary_scenario_instance(data_file_scenarios)
             data_file_stochastic = nothing
 
             build_time = @elapsed begin
@@ -0,0 +1,317 @@
+"""
+Greedy stowage heuristic giving a MIP start for build_stochastic_model_2.
+
+Gurobi's first incumbent for the stochastic model is poor (14926 against an optimum of 3240 for
+S, P=8, 20 clusters) and only improves after a root relaxation that takes minutes to hours.
+This heuristic builds a feasible solution of the same model in about a second:
+
+    1. The port-one transports (x, z) are loaded first, shortest haul first, into the capacity
+       left in every scenario, since x is shared by all of them.
+    2. The future transports of all scenarios (s, q) follow, shortest haul first, in one
+       vectorized step per (transport, cargo type) over all scenarios and locations.
+
+A container of transport (o, d) occupies its location at ports o, ..., d - 1 (TR_ON). Every step
+computes how many containers of the cargo type still fit into each location at all of these
+ports, under the TEU (C_20), FEU (C_40) and reefer (C_R) rows of the model with the
+coefficients of mps_writer.cargo_coefficients, and fills the locations in order up to the
+demand with a cumulative sum. Reefer types go first and prefer locations with many plugs, dry
+types prefer locations without plugs; within a transport 20' types go before 40' types, as
+every container left behind costs the same.
+
+Overstowage follows the model as written (see model_size.py): constraint (8) of scenario i reads
+locations_under[i], so scenario i pays overstowage at every port where that one location is
+handled. The heuristic keeps these locations empty (keep_under_free), the first-stage cargo out
+of all of them, which makes delta and y_O zero. The remaining variables are set to their best
+values for the stowage: z and q are the cargo left behind, delta and y_O the overstowage implied.
+
+The start is written as a MIP start file of "name value" lines, listing the nonzero values:
+
+    names="jump"  x_20[tau,o,d,l], s_40[i,tau,o,d,l], z_20[tau,o,d], q_40[i,tau,o,d], delta[i,p,l],
+                  y_O[i,p,l], all 1-based, with the transport written as its ports (o, d) since the
+                  transport index of the JuMP model follows Dict key order. mip_start.jl reads it
+                  into the JuMP model, setting every other start value to zero.
+    names="mps"   C<j> of the MPS file of mps_writer.py, for gurobi_cl InputFile=start.mst model.mps.
+
+    python stowage_heuristic.py port_one.scn clustered_20.txt --ship Ships/Small_ship.txt --output start.mst --validate
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from mps_writer import VARIABLES, assemble_model, cargo_coefficients, read_demand
+from od_tensor import od_pairs
+from ship_reader import read_ship_instance
+
+FACTOR_OVERSTOW = 10
+
+
+# ---------- Heuristic ----------
+def _fill(avail, demand):
+    """
+    Take up to demand (..., ) containers from the locations in order, at most avail (..., L) each.
+    """
+    before = np.cumsum(avail, axis=-1) - avail
+    return np.clip(demand[..., None] - before, 0, avail)
+
+
+def greedy_stowage(port_one, scenarios, ship, cargo_types, counts=None, n_scenarios=None, factor_overstow=FACTOR_OVERSTOW,
+                   first_index=0, keep_under_free=True):
+    """
+    Feasible solution of build_stochastic_model_2 by greedy stowage.
+
+    Parameters
+    ----------
+    port_one, scenarios, ship, cargo_types, counts, n_scenarios, factor_overstow, first_index
+        As in mps_writer.assemble_model. Scenarios (cluster centers) are rounded to integers.
+    keep_under_free : bool
+        Keep location locations_under[i] free in scenario i, so that there is no overstowage.
+
+    Returns
+    -------
+    solution : dict
+        x (T, DEP, L), z (T, DEP), s (N, T, FU, L), q (N, T, FU), delta and y_O (N, P, L) in the
+        index order of assemble_model, and "objective", the model objective of the solution.
+    """
+    port_one = np.rint(np.asarray(port_one).reshape(np.shape(port_one)[-3:])).astype(np.int64)
+    scenarios = np.rint(np.asarray(scenarios)).astype(np.int64)
+    N, T, P = scenarios.shape[0], scenarios.shape[1], scenarios.shape[-1]
+    L = ship.n_locations
+    counts = np.ones(N) if counts is None else np.asarray(counts, dtype=float)
+    n_scenarios = counts.sum() if n_scenarios is None else n_scenarios
+    T_20, teu, reefer_types, reefer_teu = cargo_coefficients(cargo_types)
+    teu = teu.astype(np.int64)
+    plugs = np.zeros(T, dtype=np.int64)
+    plugs[reefer_types] = reefer_teu
+
+    origin, destination = od_pairs(P)
+    dep = origin == 0
+    DEP = int(dep.sum())
+    slot = np.empty(len(origin), dtype=np.int64)
+    slot[dep] = np.arange(DEP)
+    slot[~dep] = np.arange(len(origin) - DEP)
+
+    # Residual capacity per scenario, port and location
+    residual = {name: np.broadcast_to(np.asarray(capacity, dtype=np.int64), (N, P, L)).copy()
+                for name, capacity in (("teu", ship.location_TEU_capacity), ("feu", ship.location_FEU_capacity),
+                                       ("reefer", ship.location_reefer_capacity))}
+    usable = np.ones((N, L), dtype=bool)
+    if keep_under_free:
+        under = np.asarray(ship.locations_under)[first_index:first_index + N] - 1
+        usable[np.flatnonzero(under >= 0), under[under >= 0]] = False
+
+    # Reefers first, then dry 20' before dry 40'; reefers prefer locations with plugs, dry cargo the others
+    type_order = sorted(range(T), key=lambda k: (plugs[k] == 0, teu[k]))
+    C_R = np.asarray(ship.location_reefer_capacity)
+    location_order = {True: np.argsort(-C_R, kind="stable"), False: np.argsort(C_R, kind="stable")}
+
+    def available(k, o, d):
+        # containers of type k that fit into every location at ports o..d-1, shape (N, L)
+        fit = residual["teu"][:, o:d] // teu[k]
+        if teu[k] == 2:
+            fit = np.minimum(fit, residual["feu"][:, o:d])
+        if plugs[k]:
+            fit = np.minimum(fit, residual["reefer"][:, o:d] // plugs[k])
+        return np.where(usable, fit.min(axis=1), 0)
+
+    def occupy(take, k, o, d):
+        # take is (N, L) or (L,) for the first stage
+        take = np.broadcast_to(take, (N, L))[:, None, :]
+        residual["teu"][:, o:d] -= teu[k] * take
+        if teu[k] == 2:
+            residual["feu"][:, o:d] -= take
+        if plugs[k]:
+            residual["reefer"][:, o:d] -= plugs[k] * take
+
+    x = np.zeros((T, DEP, L), dtype=np.int64)
+    s = np.zeros((N, T, len(origin) - DEP, L), dtype=np.int64)
+    for first in (True, False):
+        pairs = np.flatnonzero(dep if first else ~dep)
+        pairs = pairs[np.lexsort((origin[pairs], destination[pairs] - origin[pairs]))]
+        for t in pairs:
+            o, d = int(origin[t]), int(destination[t])
+            for k in type_order:
+                order = location_order[bool(plugs[k])]
+                if first:
+                    demand = port_one[k, o, d]
+                    if demand == 0:
+                        continue
+                    take = np.empty(L, dtype=np.int64)
+                    take[order] = _fill(available(k, o, d).min(axis=0)[order], np.asarray(demand))
+                    x[k, slot[t]] = take
+                else:
+                    demand = scenarios[:, k, o, d]
+                    if not demand.any():
+                        continue
+                    take = np.empty((N, L), dtype=np.int64)
+                    take[:, order] = _fill(available(k, o, d)[:, order], demand)
+                    s[:, k, slot[t]] = take
+                occupy(take, k, o, d)
+
+    z = port_one[:, origin[dep], destination[dep]] - x.sum(axis=-1)
+    q = scenarios[:, :, origin[~dep], destination[~dep]] - s.sum(axis=-1)
+    delta, y_O = overstowage(x, s, ship, P, first_index)
+    weight = counts / n_scenarios
+    objective = z.sum() + (weight * (q.sum(axis=(1, 2)) + factor_overstow * y_O.sum(axis=(1, 2)))).sum()
+    return dict(x=x, z=z, s=s, q=q, delta=delta, y_O=y_O, objective=float(objective))
+
+
+def overstowage(x, s, ship, P, first_index=0):
+    """
+    delta and y_O (N, P, L) implied by a stowage in constraints (8) and (9): delta[i, p, l] is 1 for
+    the on-deck locations l when location locations_under[i] is handled at port p in scenario i,
+    and y_O is then the cargo on l in transit at p.
+    """
+    N, L = s.shape[0], s.shape[-1]
+    origin, destination = od_pairs(P)
+    dep = origin == 0
+    port = np.arange(P)[:, None]
+    handled = ((origin == port) | (destination == port)).astype(np.int64)        # (P, pairs)
+    overstowing = ((origin < port) & (port < destination)).astype(np.int64)
+    # cargo per (pair, location) in every scenario, first stage and scenario transports together
+    cargo = np.zeros((N, len(origin), L), dtype=np.int64)
+    cargo[:, dep] = x.sum(axis=0)[None]
+    cargo[:, ~dep] = s.sum(axis=1)
+    over = np.asarray(ship.locations_over) - 1
+    under = np.asarray(ship.locations_under)[first_index:first_index + N] - 1
+
+    delta = np.zeros((N, P, L), dtype=np.int64)
+    y_O = np.zeros((N, P, L), dtype=np.int64)
+    for i in np.flatnonzero(under >= 0):
+        active = handled @ cargo[i, :, under[i]] > 0                              # (P,)
+        delta[i][np.ix_(active, over)] = 1
+        y_O[i][np.ix_(active, over)] = (overstowing @ cargo[i][:, over])[active]
+    return delta, y_O
+
+
+# ---------- MIP start ----------
+def solution_vector(solution, layout):
+    """
+    The solution as one value per column of assemble_model's layout.
+    """
+    vector = np.zeros(sum(int(np.prod(shape)) for _, shape in layout.values()))
+    for name in VARIABLES:
+        start, shape = layout[name]
+        vector[start:start + int(np.prod(shape))] = np.asarray(solution[name]).reshape(-1)
+    return vector
+
+
+def check_solution(model, vector):
+    """
+    Largest constraint violation and objective of a column vector in an assembled model.
+    """
+    from scipy.sparse import coo_matrix
+
+    A = coo_matrix((model["values"], (model["rows"], model["cols"])), shape=(model["n_rows"], model["n_cols"])).tocsr()
+    lhs = A @ vector
+    violation = np.where(model["sense"] == "E", np.abs(lhs - model["rhs"]), np.maximum(lhs - model["rhs"], 0.0))
+    return float(max(violation.max(initial=0.0), np.maximum(-vector, 0.0).max(initial=0.0))), float(model["objective"] @ vector)
+
+
+def jump_entries(solution, cargo_types, P):
+    """
+    (name, value) of the nonzero values, named as the JuMP variables with transports as port pairs.
+    """
+    T_20 = cargo_coefficients(cargo_types)[0]
+    origin, destination = od_pairs(P)
+    dep = origin == 0
+    ports = {True: np.stack([origin[dep], destination[dep]], axis=1) + 1,
+             False: np.stack([origin[~dep], destination[~dep]], axis=1) + 1}
+
+    entries = []
+    for name, per_scenario, first in (("x", False, True), ("z", False, True), ("s", True, False), ("q", True, False)):
+        values = np.asarray(solution[name])
+        for index in np.argwhere(values):
+            value = values[tuple(index)]
+            index = [int(v) for v in index]
+            scenario = [index.pop(0) + 1] if per_scenario else []
+            k, t, rest = index[0], index[1], [v + 1 for v in index[2:]]
+            size, tau = ("20", k + 1) if k < T_20 else ("40", k - T_20 + 1)
+            key = scenario + [tau] + [int(v) for v in ports[first][t]] + rest
+            entries.append((f"{name}_{size}[{','.join(map(str, key))}]", value))
+    for name in ("delta", "y_O"):
+        values = np.asarray(solution[name])
+        for index in np.argwhere(values):
+            entries.append((f"{name}[{','.join(str(int(v) + 1) for v in index)}]", values[tuple(index)]))
+    return entries
+
+
+def mps_entries(solution, layout):
+    """
+    (name, value) of the nonzero values, named C<j> as in write_mps.
+    """
+    vector = solution_vector(solution, layout)
+    return [(f"C{j}", vector[j]) for j in np.flatnonzero(vector)]
+
+
+def write_mst(path, entries, objective=None):
+    """
+    Write (name, value) pairs as a MIP start file.
+    """
+    with open(path, "w") as f:
+        f.write("# MIP start" + ("" if objective is None else f", objective {objective:.6f}") + "\n")
+        f.write("".join(f"{name} {int(value) if float(value).is_integer() else float(value)}\n" for name, value in entries))
+    return path
+
+
+def greedy_mip_start(path, port_one, scenarios, ship, cargo_types, counts=None, n_scenarios=None, names="jump",
+                     factor_overstow=FACTOR_OVERSTOW):
+    """
+    Run greedy_stowage and write its MIP start to path. ship may be a ShipInstance or a ship file.
+    Returns the objective of the start, as used by mip_start.jl.
+    """
+    if isinstance(ship, (str, os.PathLike)):
+        ship = read_ship_instance(ship)
+    solution = greedy_stowage(port_one, scenarios, ship, cargo_types, counts, n_scenarios, factor_overstow)
+    if names == "jump":
+        entries = jump_entries(solution, cargo_types, np.shape(scenarios)[-1])
+    elif names == "mps":
+        model = assemble_model(port_one, np.rint(scenarios), ship, cargo_types, counts, n_scenarios, factor_overstow)
+        entries = mps_entries(solution, model["layout"])
+    else:
+        raise ValueError("names must be 'jump' or 'mps'")
+    write_mst(path, entries, solution["objective"])
+    return solution["objective"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Greedy MIP start for build_stochastic_model_2.")
+    parser.add_argument("port_one", help="port one loading list (.scn or text)")
+    parser.add_argument("scenarios", help="scenarios or clustered instance (.scn or text, with cluster counts)")
+    parser.add_argument("--ship", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "Ships", "Small_ship.txt"))
+    parser.add_argument("--n-scenarios", type=int, default=None, help="sampled scenarios behind the clusters (default: sum of counts)")
+    parser.add_argument("--names", choices=["jump", "mps"], default="jump", help="variable names of the JuMP model or of mps_writer.py")
+    parser.add_argument("--output", default=None, help="MIP start file (default: scenario file name with .mst)")
+    parser.add_argument("--validate", action="store_true", help="check the start against the assembled model")
+    args = parser.parse_args()
+
+    ship = read_ship_instance(args.ship)
+    _, port_one, _ = read_demand(args.port_one)
+    header, scenarios, counts = read_demand(args.scenarios)
+    start = time.perf_counter()
+    solution = greedy_stowage(port_one, scenarios, ship, header["cargo_types"], counts, args.n_scenarios)
+    elapsed = time.perf_counter() - start
+
+    model = None
+    if args.names == "mps" or args.validate:
+        model = assemble_model(port_one, np.rint(scenarios), ship, header["cargo_types"], counts, args.n_scenarios)
+    if args.names == "jump":
+        entries = jump_entries(solution, header["cargo_types"], header["P"])
+    else:
+        entries = mps_entries(solution, model["layout"])
+    output = args.output or os.path.splitext(args.scenarios)[0] + ".mst"
+    write_mst(output, entries, solution["objective"])
+    print(f"Greedy start with objective {solution['objective']:.4f} ({solution['z'].sum()} port-one containers left, "
+          f"{int(solution['y_O'].sum())} overstowed) found in {elapsed:.2f} s, exported to {output}")
+
+    if args.validate:
+        violation, objective = check_solution(model, solution_vector(solution, model["layout"]))
+        print(f"Largest constraint violation {violation:.3g}, model objective {objective:.4f}")
+        if violation > 1e-6 or not np.isclose(objective, solution["objective"]):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+"""
+Resumable orchestrator for the comparison sweep over (P, distribution, seed, n_clusters).
+
+comparison_uniform.jl, comparison_normal.jl and comparison_lognormal.jl run the sweep as nested
+loops in one Julia process with Threads=1, so a machine with many cores solves one model at a
+time and a crash loses the position in the grid. This script expands the grid from a JSON
+config into independent jobs and runs them side by side:
+
+    deterministic   one per (P, N, distribution, seed): the one-cluster model, whose first-stage
+                    solution is stored for the comparison jobs
+    comparison      one per n_clusters: the expected stochastic model (first stage fixed to the
+                    deterministic solution) and the stochastic model, run after the deterministic
+                    job of the same instance
+
+Every job is one call of a command template, by default comparison_job.jl. Its cost is
+estimated from the solve times of earlier runs of the same model, P, n_clusters and distribution
+in the results index (results_step_2/results_index.py), else from the runtime fit of
+model_size.py, and its memory from model_size.estimate_memory. Jobs are started longest
+critical path first on `slots` = cores / threads_per_job slots, as long as the memory estimates
+of the running jobs stay below memory_limit_gb; jobs that cannot fit at all are rejected up front.
+
+Every finished job is appended to a JSON-lines checkpoint. Restarting with the same config
+skips the jobs recorded as done and reruns failed and interrupted ones.
+
+Config (all keys but the grid are optional):
+
+    {
+      "size": "S",
+      "N": {"uniform": 15000, "normal": 40000, "lognormal": 70000},   (or one int for all)
+      "ports": [8, 10, 15],
+      "distributions": ["uniform", "normal", "lognormal"],
+      "seeds": [12908330, 77804901, 96998883, 76515133],
+      "n_clusters": [10, 20, 30, 40, 50],
+      "command": ["julia", "comparison_job.jl", "{job}", "{size}", "{P}", "{N}", "{n_clusters}",
+                  "{distribution}", "{seed}", "{threads}"],
+      "threads_per_job": 1,
+      "cores": 32,
+      "memory_limit_gb": 180,
+      "time_limit": null,
+      "cache_dir": "demand_cache",
+      "env": {},
+      "checkpoint": "sweep_checkpoint.jsonl",
+      "log_dir": "sweep_logs"
+    }
+
+The command placeholders are {id}, {job}, {size}, {P}, {N}, {n_clusters} ("-" for
+deterministic jobs), {distribution}, {seed} and {threads}; any executable can stand in for
+Julia, e.g. a stub script when testing the orchestrator.
+
+    python sweep.py sweep_comparison.json --dry-run
+    python sweep.py sweep_comparison.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from model_size import RESULTS_DIR, _results_modules, estimate_memory, fit_runtime, predict_model_size, predict_runtime, ship_file
+from ship_reader import read_ship_instance
+
+DEFAULT_COMMAND = ["julia", "comparison_job.jl", "{job}", "{size}", "{P}", "{N}", "{n_clusters}", "{distribution}", "{seed}", "{threads}"]
+DEFAULT_CHECKPOINT = "sweep_checkpoint.jsonl"
+DEFAULT_LOG_DIR = "sweep_logs"
+# models solved by each job, in the naming of the log files
+JOB_MODELS = {"deterministic": ("deterministic",), "comparison": ("expected_stochastic", "stochastic")}
+
+
+# ---------- Grid ----------
+def _scenarios(config, distribution):
+    N = config.get("N", 15000)
+    return int(N[distribution]) if isinstance(N, dict) else int(N)
+
+
+def job_id(job):
+    n = "" if job["n_clusters"] is None else f"_{job['n_clusters']}"
+    return f"{job['job']}_{job['size']}_{job['P']}_{job['N']}{n}_{job['distribution']}_{job['seed']}"
+
+
+def expand(config):
+    """
+    Jobs of the sweep described by a config, deterministic jobs first. Each job is a dict with
+    "id", "job", "size", "P", "N", "n_clusters", "distribution", "seed" and "deps" (ids of the
+    jobs that must finish before it).
+    """
+    size = config.get("size", "S")
+    jobs = []
+    for P in config["ports"]:
+        for distribution in config["distributions"]:
+            N = _scenarios(config, distribution)
+            for seed in config["seeds"]:
+                deterministic = dict(job="deterministic", size=size, P=int(P), N=N, n_clusters=None,
+                                     distribution=distribution, seed=int(seed), deps=[])
+                deterministic["id"] = job_id(deterministic)
+                jobs.append(deterministic)
+                for n in config["n_clusters"]:
+                    job = dict(deterministic, job="comparison", n_clusters=int(n), deps=[deterministic["id"]])
+                    job["id"] = job_id(job)
+                    jobs.append(job)
+    return jobs
+
+
+# ---------- Estimates ----------
+def past_runtimes(summary):
+    """
+    Median runtime of earlier solves per (model, size, P, n_clusters, distribution) and per
+    (model, size, P, n_clusters), from ResultsIndex.query() columns.
+    """
+    runtime = np.where(np.isnan(summary["runtime"]), summary["last_time"], summary["runtime"])
+    samples = {}
+    for i in range(len(runtime)):
+        if np.isnan(runtime[i]) or summary["model"][i] is None:
+            continue
+        n = None if np.isnan(summary["n_clusters"][i]) else int(summary["n_clusters"][i])
+        key = (summary["model"][i], summary["size"][i], int(summary["P"][i]), n)
+        samples.setdefault(key + (summary["distribution"][i],), []).append(runtime[i])
+        samples.setdefault(key, []).append(runtime[i])
+    return {key: float(np.median(values)) for key, values in samples.items()}
+
+
+def estimate_jobs(jobs, cargo_types, summary=None, quantile=0.5):
+    """
+    Add "cost" (seconds) and "memory" (bytes) estimates to every job.
+
+    The cost of a job is the sum over its models of the median past runtime of the same model,
+    size, P, n_clusters and distribution, falling back to any distribution, then to the
+    model_size runtime fit and to 1 second without any logs.
+    """
+    past = {} if summary is None else past_runtimes(summary)
+    fits = {}
+    ships = {}
+    for job in jobs:
+        if job["size"] not in ships:
+            ships[job["size"]] = read_ship_instance(ship_file(job["size"]))
+        cost, memory = 0.0, 0
+        for model in JOB_MODELS[job["job"]]:
+            n = None if model == "deterministic" else job["n_clusters"]
+            size = predict_model_size(job["P"], 1 if n is None else n, ships[job["size"]], cargo_types, model)
+            # the models of a job are solved one after the other
+            memory = max(memory, estimate_memory(size, job["P"], job["N"], len(cargo_types)))
+            key = (model, job["size"], job["P"], n)
+            if key + (job["distribution"],) in past:
+                cost += past[key + (job["distribution"],)]
+            elif key in past:
+                cost += past[key]
+            else:
+                if model not in fits and summary is not None:
+                    try:
+                        fits[model] = fit_runtime(summary, model)
+                    except ValueError:
+                        fits[model] = None
+                fit = fits.get(model)
+                cost += 1.0 if fit is None else predict_runtime(fit, size["nonzeros"], quantile)
+        job["cost"] = cost
+        job["memory"] = memory
+    return jobs
+
+
+def priorities(jobs):
+    """
+    Length of the longest chain of estimated costs starting at each job (its own cost plus that of
+    its most expensive dependent chain). Starting jobs in decreasing order is LPT scheduling that
+    also starts deterministic jobs early when many comparison jobs wait for them.
+    """
+    dependents = {}
+    for job in jobs:
+        for dep in job["deps"]:
+            dependents.setdefault(dep, []).append(job)
+    by_id = {job["id"]: job for job in jobs}
+    level = {}
+
+    def visit(job_id):
+        if job_id not in level:
+            job = by_id[job_id]
+            level[job_id] = job["cost"] + max((visit(d["id"]) for d in dependents.get(job_id, [])), default=0.0)
+        return level[job_id]
+
+    for job in jobs:
+        visit(job["id"])
+    return level
+
+
+def plan(jobs, slots, memory_limit=None):
+    """
+    Simulated schedule of the jobs under the rules of `run`, with every job taking its estimated
+    cost. Returns (start times by id, makespan).
+    """
+    level = priorities(jobs)
+    pending = sorted(jobs, key=lambda job: -level[job["id"]])
+    finish = {}
+    start = {}
+    running = []   # (end, id, memory)
+    clock = 0.0
+    while pending:
+        memory = sum(m for _, _, m in running)
+        started = False
+        for job in pending:
+            if not all(d in finish and finish[d] <= clock for d in job["deps"]):
+                continue
+            if len(running) >= slots:
+                break
+            if memory_limit is not None and running and memory + job["memory"] > memory_limit:
+                continue
+            start[job["id"]] = clock
+            finish[job["id"]] = clock + job["cost"]
+            running.append((finish[job["id"]], job["id"], job["memory"]))
+            memory += job["memory"]
+            pending.remove(job)
+            started = True
+            break
+        if started:
+            continue
+        if not running:
+            break
+        running.sort()
+        clock = running[0][0]
+        running = [r for r in running if r[0] > clock]
+    return start, max(finish.values(), default=0.0)
+
+
+# ---------- Checkpoint ----------
+def read_checkpoint(path):
+    """
+    Last recorded status of every job in a checkpoint file.
+    """
+    status = {}
+    if not os.path.exists(path):
+        return status
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # a line cut off by a crash
+                continue
+            status[record["job"]] = record
+    return status
+
+
+def append_checkpoint(path, record):
+    with open(path, "a") as f:
+        f.write(json.dumps(record, sort_keys=True) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+# ---------- Execution ----------
+def format_command(template, job, threads):
+    fields = dict(job, id=job["id"], threads=threads, n_clusters="-" if job["n_clusters"] is None else job["n_clusters"])
+    return [part.format(**fields) for part in template]
+
+
+def run(jobs, command=DEFAULT_COMMAND, slots=1, threads=1, memory_limit=None, checkpoint=DEFAULT_CHECKPOINT,
+        log_dir=DEFAULT_LOG_DIR, env=None, cwd=None, poll=1.0):
+    """
+    Run the jobs not yet recorded as done in the checkpoint.
+
+    At most `slots` jobs run at once, started in decreasing order of `priorities` once their
+    dependencies are done and while the memory estimates of the running jobs stay below
+    memory_limit. The output of every job goes to log_dir/<id>.out. Jobs whose dependency
+    failed are not started.
+
+    Returns
+    -------
+    status : dict
+        Job id -> "done", "failed" or "blocked" for the jobs of this run.
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    recorded = read_checkpoint(checkpoint)
+    done = {job_id for job_id, record in recorded.items() if record["status"] == "done"}
+    level = priorities(jobs)
+    pending = sorted((job for job in jobs if job["id"] not in done), key=lambda job: -level[job["id"]])
+    environment = dict(os.environ, **(env or {}))
+    status = {}
+    running = {}   # id -> (process, job, start, output file)
+
+    try:
+        while pending or running:
+            for job_id, (process, job, start, output) in list(running.items()):
+                returncode = process.poll()
+                if returncode is None:
+                    continue
+                output.close()
+                del running[job_id]
+                status[job_id] = "done" if returncode == 0 else "failed"
+                if returncode == 0:
+                    done.add(job_id)
+                append_checkpoint(checkpoint, dict(job=job_id, status=status[job_id], returncode=returncode,
+                                                   started=start, finished=time.time(), wall=time.time() - start,
+                                                   estimate=job.get("cost")))
+                print(f"{status[job_id]:<6} {job_id} ({time.time() - start:.0f}s)", flush=True)
+
+            # jobs whose dependency failed or was blocked can never start in this run
+            for job in list(pending):
+                if any(status.get(dep) in ("failed", "blocked") for dep in job["deps"]):
+                    status[job["id"]] = "blocked"
+                    pending.remove(job)
+                    print(f"blocked {job['id']}", flush=True)
+
+            memory = sum(job.get("memory", 0) for _, job, _, _ in running.values())
+            for job in list(pending):
+                if len(running) >= slots:
+                    break
+                if not all(dep in done for dep in job["deps"]):
+                    continue
+                if memory_limit is not None and running and memory + job.get("memory", 0) > memory_limit:
+                    continue
+                output = open(os.path.join(log_dir, job["id"] + ".out"), "w")
+                process = subprocess.Popen(format_command(command, job, threads), stdout=output, stderr=subprocess.STDOUT,
+                                           env=environment, cwd=cwd)
+                running[job["id"]] = (process, job, time.time(), output)
+                memory += job.get("memory", 0)
+                pending.remove(job)
+                print(f"start  {job['id']} (estimate {job.get('cost', 0):.0f}s)", flush=True)
+
+            if running:
+                time.sleep(poll)
+            elif pending:
+                # nothing running and nothing startable: the rest waits on jobs outside this run
+                for job in pending:
+                    status[job["id"]] = "blocked"
+                break
+    except KeyboardInterrupt:
+        # interrupted jobs are not checkpointed and rerun on resume
+        for process, _, _, output in running.values():
+            process.terminate()
+        for process, _, _, output in running.values():
+            process.wait()
+            output.close()
+        raise
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the comparison sweep from a JSON config, resuming from its checkpoint.")
+    parser.add_argument("config", help="JSON sweep config")
+    parser.add_argument("--dry-run", action="store_true", help="print the jobs, estimates and simulated makespan only")
+    parser.add_argument("--index", default=os.path.join(RESULTS_DIR, "results_index.sqlite"), help="SQLite results index")
+    parser.add_argument("--root", default=RESULTS_DIR, help="directory containing the gurobi_*_logs directories")
+    parser.add_argument("--no-estimates", action="store_true", help="do not read past solve times from the logs")
+    parser.add_argument("--poll", type=float, default=1.0, help="seconds between checks of the running jobs")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+    from data_generation import cargo_types
+
+    summary = None
+    if not args.no_estimates:
+        results_index = _results_modules()
+        with results_index.ResultsIndex(args.index, args.root) as index:
+            index.refresh()
+            summary = index.query()
+
+    threads = int(config.get("threads_per_job", 1))
+    slots = max(1, int(config.get("cores", os.cpu_count() or 1)) // threads)
+    memory_limit = config.get("memory_limit_gb")
+    memory_limit = None if memory_limit is None else memory_limit * 1024**3
+    time_limit = config.get("time_limit")
+
+    jobs = estimate_jobs(expand(config), cargo_types, summary)
+    rejected = [job for job in jobs
+                if (memory_limit is not None and job["memory"] > memory_limit)
+                or (time_limit is not None and job["cost"] > time_limit)]
+    rejected_ids = {job["id"] for job in rejected}
+    # dependents of rejected jobs cannot run either
+    for job in jobs:
+        if any(dep in rejected_ids for dep in job["deps"]) and job["id"] not in rejected_ids:
+            rejected.append(job)
+            rejected_ids.add(job["id"])
+    jobs = [job for job in jobs if job["id"] not in rejected_ids]
+    for job in rejected:
+        print(f"reject {job['id']}: estimated {job['cost']:.0f}s, {job['memory'] / 1024**3:.1f}GB")
+
+    checkpoint = config.get("checkpoint", DEFAULT_CHECKPOINT)
+    done = {job_id for job_id, record in read_checkpoint(checkpoint).items() if record["status"] == "done"}
+    todo = [job for job in jobs if job["id"] not in done]
+    _, makespan = plan(todo, slots, memory_limit)
+    print(f"{len(jobs)} jobs, {len(jobs) - len(todo)} done, {len(todo)} to run on {slots} slots; "
+          f"estimated {sum(job['cost'] for job in todo) / 3600:.1f} CPU hours, makespan {makespan / 3600:.1f} hours")
+    if args.dry_run:
+        level = priorities(todo)
+        for job in sorted(todo, key=lambda job: -level[job["id"]]):
+            print(f"{job['id']:<55} {job['cost']:>10.0f}s {job['memory'] / 1024**3:>7.1f}GB  {' '.join(format_command(config.get('command', DEFAULT_COMMAND), job, threads))}")
+        return
+
+    env = dict(config.get("env", {}))
+    if config.get("cache_dir"):
+        env.setdefault("STOWAGE_DEMAND_CACHE", os.path.abspath(config["cache_dir"]))
+    status = run(todo, config.get("command", DEFAULT_COMMAND), slots, threads, memory_limit, checkpoint,
+                 config.get("log_dir", DEFAULT_LOG_DIR), env, config.get("cwd"), args.poll)
+    failed = [job_id for job_id, s in status.items() if s != "done"]
+    print(f"{len(status) - len(failed)} jobs done, {len(failed)} failed or blocked")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
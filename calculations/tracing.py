@@ -0,0 +1,259 @@
+"""
+Opt-in tracing of the demand generation pipeline as JSON lines.
+
+Tracing is off unless the STOWAGE_TRACE environment variable names a trace file (or `enable`
+is called). The pipeline is then recorded as named spans, one JSON object per line, appended
+when a span ends:
+
+    name        span name, e.g. "loading_list", "moments", "generator.chunk", "write_chunk"
+    parent      name of the enclosing span, or null
+    depth       nesting depth, 0 for top-level spans
+    pid         process id (pool workers append to the same file)
+    start       start time as Unix time
+    wall, cpu   wall-clock and process CPU time in seconds
+    peak_bytes  peak memory allocated during the span above its start, or null unless memory
+                tracing is on (STOWAGE_TRACE_MEMORY=1 or enable(memory=True))
+
+plus the fields of every enclosing `context` (test_stochastic sets P, N, distribution, seed,
+size and sampling, the keys of the solve result files) and the span's own counts, such as
+scenarios, cargo_types or bytes. CPU time is that of the recording process; the chunks
+sampled by pool workers are recorded by the workers themselves.
+
+Memory tracing uses tracemalloc, which also sees NumPy buffers, but slows allocation-heavy
+code down a lot (the text export by more than an order of magnitude), so it has its own
+switch. With tracing off, `span` and `context` return one shared no-op object and cost a
+single global lookup.
+
+    STOWAGE_TRACE=trace.jsonl julia comparison_job.jl deterministic S 8 15000 - uniform 12908330
+    python tracing.py trace.jsonl --by P N distribution
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+ENV_TRACE = "STOWAGE_TRACE"
+ENV_TRACE_MEMORY = "STOWAGE_TRACE_MEMORY"
+
+_TRACER = None
+
+
+class _Null:
+    """
+    Span and context stand-in while tracing is off.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add(self, **fields):
+        pass
+
+
+_NULL = _Null()
+
+
+class _Tracer:
+    def __init__(self, path, memory):
+        self.path = os.path.abspath(path)
+        self.memory = memory
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def frames(self):
+        if not hasattr(self.local, "frames"):
+            self.local.frames = []
+        return self.local.frames
+
+    def fields(self):
+        fields = {}
+        for frame in self.frames():
+            fields.update(frame.context)
+        return fields
+
+    def write(self, record):
+        line = json.dumps(record, default=_json_default) + "\n"
+        with self.lock, open(self.path, "a") as f:
+            f.write(line)
+
+
+def _json_default(value):
+    # NumPy scalars and other non-JSON values
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+class _Context:
+    """
+    Fields added to every span recorded inside it.
+    """
+
+    def __init__(self, tracer, fields):
+        self.tracer = tracer
+        self.context = fields
+
+    def __enter__(self):
+        self.tracer.frames().append(self)
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.frames().remove(self)
+        return False
+
+    def add(self, **fields):
+        self.context.update(fields)
+
+
+class _Span(_Context):
+    """
+    Timed span, written to the trace when it ends.
+    """
+
+    def __init__(self, tracer, name, fields):
+        super().__init__(tracer, {})
+        self.name = name
+        self.counts = fields
+        self.child_peak = 0
+
+    def __enter__(self):
+        frames = self.tracer.frames()
+        spans = [frame for frame in frames if isinstance(frame, _Span)]
+        self.parent = spans[-1] if spans else None
+        self.depth = len(spans)
+        frames.append(self)
+        if self.tracer.memory:
+            # tracemalloc keeps one peak: hand the peak so far to the parent, then measure from here
+            current, peak = tracemalloc.get_traced_memory()
+            if self.parent is not None:
+                self.parent.child_peak = max(self.parent.child_peak, peak)
+            tracemalloc.reset_peak()
+            self.start_memory = current
+        self.start = time.time()
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.start_wall
+        cpu = time.process_time() - self.start_cpu
+        peak_bytes = None
+        if self.tracer.memory:
+            peak = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+            peak_bytes = max(peak - self.start_memory, 0)
+            if self.parent is not None:
+                self.parent.child_peak = max(self.parent.child_peak, peak)
+        record = self.tracer.fields()
+        record.update(name=self.name, parent=None if self.parent is None else self.parent.name, depth=self.depth,
+                      pid=os.getpid(), start=self.start, wall=wall, cpu=cpu, peak_bytes=peak_bytes)
+        if exc[0] is not None:
+            record["error"] = exc[0].__name__
+        record.update(self.counts)
+        self.tracer.frames().remove(self)
+        self.tracer.write(record)
+        return False
+
+    def add(self, **fields):
+        """
+        Add counts to the span, e.g. span.add(bytes=n).
+        """
+        self.counts.update(fields)
+
+
+def enable(path, memory: bool = False):
+    """
+    Start tracing to the JSON-lines file path (appended to). memory turns on tracemalloc.
+    """
+    global _TRACER
+    _TRACER = _Tracer(path, memory)
+
+
+def disable():
+    """
+    Stop tracing. tracemalloc is stopped if tracing started it.
+    """
+    global _TRACER
+    if _TRACER is not None and _TRACER.memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _TRACER = None
+
+
+def enabled():
+    return _TRACER is not None
+
+
+def span(name: str, **fields):
+    """
+    Context manager recording a span named name with the given counts. The returned object
+    takes more counts with .add(**fields). A no-op while tracing is off.
+    """
+    if _TRACER is None:
+        return _NULL
+    return _Span(_TRACER, name, dict(fields))
+
+
+def context(**fields):
+    """
+    Context manager adding fields to every span recorded inside it. A no-op while tracing is off.
+    """
+    if _TRACER is None:
+        return _NULL
+    return _Context(_TRACER, dict(fields))
+
+
+def read_trace(path):
+    """
+    List of the span records of a trace file.
+    """
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize(records, by=()):
+    """
+    Totals per span name and the values of the fields in by.
+
+    Returns a list of dicts with the by fields, "name", "count", "wall", "cpu" (sums) and
+    "peak_bytes" (maximum, None without memory tracing), in order of first appearance.
+    """
+    groups = defaultdict(list)
+    for record in records:
+        groups[tuple(record.get(field) for field in by) + (record["name"],)].append(record)
+    summary = []
+    for key, group in groups.items():
+        peaks = [r["peak_bytes"] for r in group if r.get("peak_bytes") is not None]
+        row = dict(zip(by, key[:-1]))
+        row.update(name=key[-1], count=len(group), wall=sum(r["wall"] for r in group), cpu=sum(r["cpu"] for r in group),
+                   peak_bytes=max(peaks) if peaks else None)
+        summary.append(row)
+    return summary
+
+
+if os.environ.get(ENV_TRACE):
+    enable(os.environ[ENV_TRACE], memory=os.environ.get(ENV_TRACE_MEMORY, "") not in ("", "0"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a JSON-lines trace of the generation pipeline.")
+    parser.add_argument("trace", help="trace file written with STOWAGE_TRACE")
+    parser.add_argument("--by", nargs="*", default=[], help="context fields to group by, e.g. P N distribution seed")
+    args = parser.parse_args()
+
+    summary = summarize(read_trace(args.trace), args.by)
+    header = "".join(f"{field:>14}" for field in args.by)
+    print(f"{header}{'span':>20} {'count':>7} {'wall [s]':>10} {'cpu [s]':>10} {'peak [MB]':>10}")
+    for row in summary:
+        keys = "".join(f"{str(row[field]):>14}" for field in args.by)
+        peak = "-" if row["peak_bytes"] is None else f"{row['peak_bytes'] / 1024**2:.1f}"
+        print(f"{keys}{row['name']:>20} {row['count']:>7} {row['wall']:>10.3f} {row['cpu']:>10.3f} {peak:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,59 +1,19 @@
 import os
-import re
 import sys
 import csv
+import math
 
-def extract_gap(file_path):
-    """
-    Extract the gap percentage from a Gurobi log file.
-    """
-    try:
-        with open(file_path, 'r') as f:
-            content = f.read()
-        # Search for the line containing "gap" followed by percentage
-        match = re.search(r'gap (\d+\.\d+)%', content)
-        if match:
-            return match.group(1)
-        else:
-            return None
-    except Exception as e:
-        print(f"Error reading {file_path}: {e}")
-        return None
+from gurobi_log_parser import parse_logs
 
-def extract_objective(file_path):
-    """
-    Extract the best objective value from a Gurobi log file.
-    """
-    try:
-        with open(file_path, 'r') as f:
-            content = f.read()
-        # Search for the line containing "Best objective"
-        match = re.search(r'Best objective ([\d.e+-]+)', content)
-        if match:
-            return match.group(1)
-        else:
-            return None
-    except Exception as e:
-        print(f"Error reading {file_path}: {e}")
-        return None
-    
-def extract_solve_time(file_path):
+def extract_row(summary):
     """
-    Extract the solve time in seconds from a Gurobi log file.
+    Gap, best objective and solve time of a parsed log, formatted as Gurobi prints them,
+    or None if the log has no final result.
     """
-    try:
-        with open(file_path, 'r') as f:
-            content = f.read()
-        # Search for the line containing "in X.XX seconds"
-        match = re.search(r'in (\d+\.\d+) seconds', content)
-        if match:
-            return match.group(1)
-        else:
-            return None
-    except Exception as e:
-        print(f"Error reading {file_path}: {e}")
+    if any(math.isnan(summary[name]) for name in ("gap", "best_objective", "runtime")):
         return None
-    
+    return [f"{summary['gap']:.4f}", f"{summary['best_objective']:.12e}", f"{summary['runtime']:.2f}"]
+
 
 def main():
     directory = "./gurobi_stochastic_logs"
@@ -62,6 +22,10 @@ def main():
     distributions = ["normal", "lognormal", "uniform"]
     n_values = [10, 20, 30, 40, 50]
     
+    # Parse every log in the directory once, in parallel over all cores
+    paths = [os.path.join(directory, f) for f in sorted(os.listdir(directory)) if f.startswith("gurobi_solve_log_")]
+    summaries = {os.path.basename(path): summary for path, (summary, _) in zip(paths, parse_logs(paths))}
+
     for p in P_values:
         for d in distributions:
             if d == "normal":
@@ -74,13 +38,10 @@ def main():
                 data = []
                 for s in seeds:  # Husk at ændre dette for andre løsninger!!!
                     filename = f"gurobi_solve_log_stochastic_S_{p}_{N}_{n}_{d}_{s}.txt"
-                    file_path = os.path.join(directory, filename)
-                    if os.path.exists(file_path):
-                        gap = extract_gap(file_path)
-                        objective = extract_objective(file_path)
-                        solve_time = extract_solve_time(file_path)
-                        if gap and objective and solve_time:
-                            data.append([s, gap, objective, solve_time])
+                    if filename in summaries:
+                        row = extract_row(summaries[filename])
+                        if row:
+                            data.append([s] + row)
                         else:
                             print(f"Could not extract data from {filename}")
                     else:
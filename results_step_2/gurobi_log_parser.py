@@ -0,0 +1,326 @@
+"""
+Single-pass parser for the Gurobi solve logs in the gurobi_*_logs directories.
+
+Every log is read once, line by line, and yields
+    - a summary: model size before and after presolve, presolve reductions, root relaxation,
+      the final node/iteration/time counts, the termination status and the final objective,
+      bound and gap, and
+    - a trajectory: one event per incumbent found before presolve, at the end of the root
+      relaxation, per row of the branch-and-bound table and at termination, with the incumbent, best bound, gap and
+      elapsed time at that point.
+
+Logs of runs that were killed before finishing (e.g. during a long root relaxation) get status
+"incomplete" and keep every value that was printed before the log ends.
+
+Run as a script to parse every log into a columnar dataset (summary.csv and trajectory.csv, one
+column per field) in solve_dataset/:
+
+    python gurobi_log_parser.py [--workers 8] [--output solve_dataset]
+"""
+
+import argparse
+import csv
+import glob
+import math
+import os
+import re
+from multiprocessing import Pool
+
+import numpy as np
+
+LOG_DIRECTORIES = ("gurobi_stochastic_logs", "gurobi_expected_stochastic_logs", "gurobi_deterministic_logs")
+
+# gurobi_solve_log_{model}_{size}_{P}_{N}[_{n}]_{distribution}_{seed}.txt, n is absent for deterministic
+LOG_NAME = re.compile(r"gurobi_solve_log_(?P<model>stochastic|expected_stochastic|deterministic)_(?P<size>[A-Za-z]+)_(?P<P>\d+)_(?P<N>\d+)(?:_(?P<n>\d+))?_(?P<distribution>[a-z_]+)_(?P<seed>\d+)\.txt$")
+
+NUMBER = r"([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)"
+VERSION = re.compile(r"^Gurobi Optimizer version (\S+)")
+MODEL_SIZE = re.compile(rf"^Optimize a model with {NUMBER} rows, {NUMBER} columns and {NUMBER} nonzeros")
+OBJECTIVE_COEFFICIENTS = re.compile(rf"^Model has {NUMBER} linear objective coefficients")
+VARIABLE_TYPES = re.compile(rf"^Variable types: {NUMBER} continuous, {NUMBER} integer \({NUMBER} binary\)")
+HEURISTIC = re.compile(rf"^Found heuristic solution: objective {NUMBER}")
+PRESOLVE_PROGRESS = re.compile(rf"^Presolve removed {NUMBER} rows and {NUMBER} columns \(presolve time = {NUMBER}s\)")
+PRESOLVE_REMOVED = re.compile(rf"^Presolve removed {NUMBER} rows and {NUMBER} columns$")
+PRESOLVE_TIME = re.compile(rf"^Presolve time: {NUMBER}s")
+PRESOLVED = re.compile(rf"^Presolved: {NUMBER} rows, {NUMBER} columns, {NUMBER} nonzeros")
+SIMPLEX_ROW = re.compile(rf"^\s*{NUMBER}\s+{NUMBER}\s+{NUMBER}\s+{NUMBER}\s+{NUMBER}s$")
+ELAPSED = re.compile(rf"^Total elapsed time = {NUMBER}s")
+ROOT = re.compile(rf"^Root relaxation: (?:objective {NUMBER}|(\w+)), {NUMBER} iterations, {NUMBER} seconds(?: \({NUMBER} work units\))?")
+TABLE_HEADER = re.compile(r"^\s*Expl Unexpl")
+NODE_ROW = re.compile(rf"^([H*]?)\s*{NUMBER}\s+{NUMBER}\s+.*?(\S+)\s+(\S+)\s+(\S+)\s+(\S+)\s+{NUMBER}s$")
+EXPLORED = re.compile(rf"^Explored {NUMBER} nodes \({NUMBER} simplex iterations\) in {NUMBER} seconds(?: \({NUMBER} work units\))?")
+SOLUTION_COUNT = re.compile(rf"^Solution count {NUMBER}")
+BEST = re.compile(rf"^Best objective (\S+), best bound (\S+), gap (\S+)%")
+STATUS = (
+    ("Optimal solution found", "optimal"),
+    ("Time limit reached", "time_limit"),
+    ("Solve interrupted", "interrupted"),
+    ("Model is infeasible", "infeasible"),
+    ("Model is unbounded", "unbounded"),
+    ("Memory limit reached", "memory_limit"),
+    ("Node limit reached", "node_limit"),
+    ("Solution limit reached", "solution_limit"),
+    ("Work limit reached", "work_limit"),
+)
+
+SUMMARY_FIELDS = (
+    "log", "model", "size", "P", "N", "n_clusters", "distribution", "seed", "gurobi_version",
+    "rows", "columns", "nonzeros", "continuous", "integer", "binary", "objective_coefficients",
+    "presolve_removed_rows", "presolve_removed_columns", "presolve_time",
+    "presolved_rows", "presolved_columns", "presolved_nonzeros", "presolved_binary",
+    "root_status", "root_objective", "root_iterations", "root_time", "root_work",
+    "first_incumbent", "first_incumbent_time",
+    "nodes", "simplex_iterations", "runtime", "work_units", "solution_count",
+    "status", "best_objective", "best_bound", "gap", "last_time",
+)
+TRAJECTORY_FIELDS = ("log", "time", "event", "explored", "unexplored", "incumbent", "bound", "gap")
+STRING_FIELDS = ("log", "model", "size", "distribution", "gurobi_version", "root_status", "status", "event")
+
+
+def _number(text):
+    """
+    Parse a log value, returning NaN for Gurobi's "-" placeholder.
+    """
+    if text in ("-", ""):
+        return math.nan
+    return float(text.rstrip("%"))
+
+
+def parse_log_name(path):
+    """
+    Instance parameters encoded in a log file name. Fields that are not part of the name
+    (n_clusters for deterministic runs, or everything for unknown names) are None.
+    """
+    match = LOG_NAME.search(os.path.basename(path))
+    if match is None:
+        return dict(model=None, size=None, P=None, N=None, n_clusters=None, distribution=None, seed=None)
+    return dict(
+        model=match.group("model"),
+        size=match.group("size"),
+        P=int(match.group("P")),
+        N=int(match.group("N")),
+        n_clusters=int(match.group("n")) if match.group("n") else None,
+        distribution=match.group("distribution"),
+        seed=int(match.group("seed")),
+    )
+
+
+def parse_log(path):
+    """
+    Parse one Gurobi log in a single pass.
+
+    Returns
+    -------
+    summary : dict
+        One value per name in SUMMARY_FIELDS. Missing numbers are NaN, missing strings None.
+    trajectory : dict
+        Columns named as in TRAJECTORY_FIELDS (without "log"), one entry per event. Times are
+        wall-clock seconds since the start of the solve as printed by Gurobi, gaps are in percent.
+    """
+    summary = {name: math.nan for name in SUMMARY_FIELDS}
+    summary.update(log=os.path.basename(path), gurobi_version=None, root_status=None, status="incomplete")
+    summary.update(parse_log_name(path))
+    trajectory = {name: [] for name in TRAJECTORY_FIELDS[1:]}
+
+    def event(time, kind, explored=math.nan, unexplored=math.nan, incumbent=math.nan, bound=math.nan, gap=math.nan):
+        trajectory["time"].append(time)
+        trajectory["event"].append(kind)
+        trajectory["explored"].append(explored)
+        trajectory["unexplored"].append(unexplored)
+        trajectory["incumbent"].append(incumbent)
+        trajectory["bound"].append(bound)
+        trajectory["gap"].append(gap)
+
+    clock = 0.0
+    in_table = False
+    variable_types = 0
+    with open(path, "r", errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if in_table:
+                match = NODE_ROW.match(line)
+                if match:
+                    marker, explored, unexplored, incumbent, bound, gap, _, time = match.groups()
+                    clock = float(time)
+                    event(clock, {"H": "heuristic", "*": "branching"}.get(marker, "node"), float(explored), float(unexplored),
+                          _number(incumbent), _number(bound), _number(gap))
+                    continue
+                if line.startswith(("Cutting planes", "Explored")):
+                    in_table = False
+                else:
+                    continue
+            if TABLE_HEADER.match(line):
+                in_table = True
+            elif (match := SIMPLEX_ROW.match(line)) or (match := ELAPSED.match(line)):
+                clock = float(match.groups()[-1])
+            elif match := PRESOLVE_PROGRESS.match(line):
+                clock = float(match.group(3))
+            elif match := HEURISTIC.match(line):
+                event(clock, "heuristic", incumbent=float(match.group(1)))
+            elif match := VERSION.match(line):
+                summary["gurobi_version"] = match.group(1)
+            elif match := MODEL_SIZE.match(line):
+                summary.update(rows=float(match.group(1)), columns=float(match.group(2)), nonzeros=float(match.group(3)))
+            elif match := OBJECTIVE_COEFFICIENTS.match(line):
+                summary["objective_coefficients"] = float(match.group(1))
+            elif match := VARIABLE_TYPES.match(line):
+                # printed for the original model and again for the presolved one
+                if variable_types == 0:
+                    summary.update(continuous=float(match.group(1)), integer=float(match.group(2)), binary=float(match.group(3)))
+                else:
+                    summary["presolved_binary"] = float(match.group(3))
+                variable_types += 1
+            elif match := PRESOLVE_REMOVED.match(line):
+                summary.update(presolve_removed_rows=float(match.group(1)), presolve_removed_columns=float(match.group(2)))
+            elif match := PRESOLVE_TIME.match(line):
+                summary["presolve_time"] = float(match.group(1))
+                clock = max(clock, summary["presolve_time"])
+            elif match := PRESOLVED.match(line):
+                summary.update(presolved_rows=float(match.group(1)), presolved_columns=float(match.group(2)), presolved_nonzeros=float(match.group(3)))
+            elif match := ROOT.match(line):
+                objective, status, iterations, seconds, work = match.groups()
+                summary.update(root_status=status or "solved", root_objective=_number(objective or "-"),
+                               root_iterations=float(iterations), root_time=float(seconds), root_work=_number(work or "-"))
+                if objective:
+                    event(clock, "root", 0.0, 1.0, bound=summary["root_objective"])
+            elif match := EXPLORED.match(line):
+                summary.update(nodes=float(match.group(1)), simplex_iterations=float(match.group(2)),
+                               runtime=float(match.group(3)), work_units=_number(match.group(4) or "-"))
+                clock = summary["runtime"]
+            elif match := SOLUTION_COUNT.match(line):
+                summary["solution_count"] = float(match.group(1))
+            elif match := BEST.match(line):
+                summary.update(best_objective=_number(match.group(1)), best_bound=_number(match.group(2)), gap=_number(match.group(3)))
+                event(clock, "final", summary["nodes"], 0.0, summary["best_objective"], summary["best_bound"], summary["gap"])
+            else:
+                for prefix, status in STATUS:
+                    if line.startswith(prefix):
+                        summary["status"] = status
+                        break
+
+    summary["last_time"] = clock
+    incumbents = np.asarray(trajectory["incumbent"], dtype=float)
+    found = np.flatnonzero(~np.isnan(incumbents))
+    if found.size:
+        summary["first_incumbent"] = incumbents[found[0]]
+        summary["first_incumbent_time"] = trajectory["time"][found[0]]
+    return summary, trajectory
+
+
+def find_logs(root="."):
+    """
+    All log files in the gurobi_*_logs directories below root, sorted by name.
+    """
+    paths = []
+    for directory in LOG_DIRECTORIES:
+        paths.extend(glob.glob(os.path.join(root, directory, "gurobi_solve_log_*.txt")))
+    return sorted(paths)
+
+
+def parse_logs(paths, n_workers=None):
+    """
+    Parse many logs, in parallel over n_workers processes (all cores if None, serially if 1).
+    Returns a list of (summary, trajectory) tuples in the order of paths.
+    """
+    paths = list(paths)
+    if n_workers == 1 or len(paths) <= 1:
+        return [parse_log(path) for path in paths]
+    with Pool(n_workers) as pool:
+        return pool.map(parse_log, paths, chunksize=max(1, len(paths) // (4 * (n_workers or os.cpu_count() or 1))))
+
+
+def to_columns(results):
+    """
+    Stack parsed logs into two columnar tables, dicts of field name -> numpy array.
+    String fields are object arrays, everything else float64 with NaN for missing values.
+    """
+    summary = {name: [s[name] for s, _ in results] for name in SUMMARY_FIELDS}
+    trajectory = {name: [] for name in TRAJECTORY_FIELDS}
+    for s, t in results:
+        trajectory["log"].extend([s["log"]] * len(t["time"]))
+        for name in TRAJECTORY_FIELDS[1:]:
+            trajectory[name].extend(t[name])
+
+    def column(name, values):
+        if name in STRING_FIELDS:
+            return np.array(values, dtype=object)
+        return np.array([math.nan if v is None else v for v in values], dtype=float)
+
+    return ({name: column(name, values) for name, values in summary.items()},
+            {name: column(name, values) for name, values in trajectory.items()})
+
+
+def _format(value):
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        if math.isnan(value):
+            return ""
+        return str(int(value)) if value.is_integer() and abs(value) < 2**53 else repr(float(value))
+    return str(value)
+
+
+def write_table(path, table):
+    """
+    Write a columnar table to CSV, one column per field. Missing values are empty cells.
+    """
+    names = list(table)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(names)
+        for row in zip(*(table[name] for name in names)):
+            writer.writerow([_format(v) for v in row])
+
+
+def read_table(path):
+    """
+    Read a CSV written by write_table back into a dict of numpy columns.
+    """
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        names = next(reader)
+        rows = list(reader)
+    columns = list(zip(*rows)) if rows else [()] * len(names)
+    table = {}
+    for name, values in zip(names, columns):
+        if name in STRING_FIELDS:
+            table[name] = np.array([v if v else None for v in values], dtype=object)
+        else:
+            table[name] = np.array([float(v) if v else math.nan for v in values], dtype=float)
+    return table
+
+
+def write_dataset(results, directory):
+    """
+    Write parsed logs to directory/summary.csv and directory/trajectory.csv.
+    """
+    os.makedirs(directory, exist_ok=True)
+    summary, trajectory = to_columns(results)
+    write_table(os.path.join(directory, "summary.csv"), summary)
+    write_table(os.path.join(directory, "trajectory.csv"), trajectory)
+    return summary, trajectory
+
+
+def read_dataset(directory):
+    """
+    Read the (summary, trajectory) tables written by write_dataset.
+    """
+    return (read_table(os.path.join(directory, "summary.csv")),
+            read_table(os.path.join(directory, "trajectory.csv")))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse all Gurobi solve logs into a columnar dataset.")
+    parser.add_argument("--root", default=".", help="directory containing the gurobi_*_logs directories")
+    parser.add_argument("--output", default="solve_dataset", help="output directory for summary.csv and trajectory.csv")
+    parser.add_argument("--workers", type=int, default=None, help="number of parser processes (default: all cores)")
+    args = parser.parse_args()
+
+    paths = find_logs(args.root)
+    summary, trajectory = write_dataset(parse_logs(paths, args.workers), args.output)
+    incomplete = int(np.sum(summary["status"] == "incomplete"))
+    print(f"Parsed {len(paths)} logs ({incomplete} incomplete) into {args.output} with {len(trajectory['time'])} trajectory events")
+
+
+if __name__ == "__main__":
+    main()
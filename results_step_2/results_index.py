@@ -0,0 +1,244 @@
+"""
+Incremental index of parsed Gurobi solve logs.
+
+The extract scripts re-scan the log directories for a hard-coded grid and rewrite every CSV
+on each run. This module instead keeps one SQLite database with a row per ingested log (path,
+size, mtime and SHA-256 of its content), the parsed summary of every log and its solve
+trajectory, as produced by gurobi_log_parser. A refresh only stats the files on disk, hashes
+the ones whose size or mtime changed and re-parses those whose content actually changed, so
+updating the index after a few new solves costs a handful of file reads.
+
+Queries filter on any combination of model type, P, N, n_clusters, distribution and seed and
+return columnar results (dicts of numpy arrays), the same layout as gurobi_log_parser.read_dataset.
+
+    python results_index.py                                    # refresh and print a summary
+    python results_index.py --query model=stochastic P=8 distribution=uniform
+"""
+
+import argparse
+import hashlib
+import math
+import os
+import sqlite3
+
+import numpy as np
+
+from gurobi_log_parser import STRING_FIELDS, SUMMARY_FIELDS, TRAJECTORY_FIELDS, find_logs, parse_logs
+
+DEFAULT_INDEX = "results_index.sqlite"
+QUERY_FIELDS = ("model", "size", "P", "N", "n_clusters", "distribution", "seed", "status")
+SCHEMA_VERSION = 1
+
+
+def file_hash(path, block_size=1 << 20):
+    """
+    Hex SHA-256 of a file's content.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _quoted(names):
+    return ", ".join(f'"{name}"' for name in names)
+
+
+def _sql_type(name):
+    return "TEXT" if name in STRING_FIELDS else "REAL"
+
+
+def _sql_value(value):
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class ResultsIndex:
+    """
+    SQLite-backed index of solve logs.
+
+    Parameters
+    ----------
+    path : str, optional
+        Database file, created if missing. Defaults to results_index.sqlite.
+    root : str, optional
+        Directory containing the gurobi_*_logs directories. Paths in the index are relative to it.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX, root: str = "."):
+        self.path = path
+        self.root = root
+        self.db = sqlite3.connect(path)
+        self._create()
+
+    def _create(self):
+        summary_columns = ", ".join(f'"{name}" {_sql_type(name)}' for name in SUMMARY_FIELDS if name != "log")
+        trajectory_columns = ", ".join(f'"{name}" {_sql_type(name)}' for name in TRAJECTORY_FIELDS[1:])
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            raise ValueError(f"{self.path} has index schema version {version}, expected {SCHEMA_VERSION}")
+        with self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha256 TEXT)")
+            self.db.execute(f"CREATE TABLE IF NOT EXISTS summary (path TEXT PRIMARY KEY, log TEXT, {summary_columns})")
+            self.db.execute(f"CREATE TABLE IF NOT EXISTS trajectory (path TEXT, seq INTEGER, {trajectory_columns}, PRIMARY KEY (path, seq))")
+            self.db.execute('CREATE INDEX IF NOT EXISTS summary_instance ON summary (model, P, N, n_clusters, distribution, seed)')
+            self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- Ingestion ----------
+    def refresh(self, n_workers=None):
+        """
+        Bring the index up to date with the logs on disk.
+
+        Files whose size and mtime are unchanged are skipped without reading them. Changed files
+        are hashed and re-parsed only if their content differs from the indexed version. Logs that
+        no longer exist are dropped.
+
+        Returns
+        -------
+        counts : dict
+            Number of "added", "updated", "removed" and "unchanged" logs.
+        """
+        known = {path: (size, mtime, sha) for path, size, mtime, sha in self.db.execute("SELECT path, size, mtime_ns, sha256 FROM files")}
+        on_disk = {os.path.relpath(path, self.root).replace(os.sep, "/"): path for path in find_logs(self.root)}
+
+        counts = dict(added=0, updated=0, removed=0, unchanged=0)
+        touched = {}   # relative path -> (size, mtime, sha) for files whose stat changed
+        to_parse = []
+        for rel, path in on_disk.items():
+            stat = os.stat(path)
+            old = known.get(rel)
+            if old is not None and old[0] == stat.st_size and old[1] == stat.st_mtime_ns:
+                counts["unchanged"] += 1
+                continue
+            sha = file_hash(path)
+            touched[rel] = (stat.st_size, stat.st_mtime_ns, sha)
+            if old is not None and old[2] == sha:
+                counts["unchanged"] += 1
+                continue
+            counts["updated" if old is not None else "added"] += 1
+            to_parse.append(rel)
+
+        removed = [rel for rel in known if rel not in on_disk]
+        counts["removed"] = len(removed)
+
+        results = parse_logs([on_disk[rel] for rel in to_parse], n_workers)
+        with self.db:
+            for rel in removed:
+                self._delete(rel)
+                self.db.execute("DELETE FROM files WHERE path = ?", (rel,))
+            for rel, (summary, trajectory) in zip(to_parse, results):
+                self._delete(rel)
+                self._insert(rel, summary, trajectory)
+            self.db.executemany("INSERT OR REPLACE INTO files (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                                [(rel,) + meta for rel, meta in touched.items()])
+        return counts
+
+    def _delete(self, rel):
+        self.db.execute("DELETE FROM summary WHERE path = ?", (rel,))
+        self.db.execute("DELETE FROM trajectory WHERE path = ?", (rel,))
+
+    def _insert(self, rel, summary, trajectory):
+        names = ["path"] + list(SUMMARY_FIELDS)
+        self.db.execute(f"INSERT INTO summary ({_quoted(names)}) VALUES ({', '.join('?' * len(names))})",
+                        [rel] + [_sql_value(summary[name]) for name in SUMMARY_FIELDS])
+        fields = TRAJECTORY_FIELDS[1:]
+        rows = [[rel, seq] + [_sql_value(trajectory[name][seq]) for name in fields] for seq in range(len(trajectory["time"]))]
+        self.db.executemany(f"INSERT INTO trajectory (path, seq, {', '.join(fields)}) VALUES ({', '.join('?' * (len(fields) + 2))})", rows)
+
+    # ---------- Queries ----------
+    def _where(self, filters):
+        clauses, values = [], []
+        for name, value in filters.items():
+            if name not in QUERY_FIELDS:
+                raise ValueError(f"cannot filter on {name!r}, expected one of {QUERY_FIELDS}")
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple, set)):
+                clauses.append(f'"{name}" IN ({", ".join("?" * len(value))})')
+                values.extend(value)
+            else:
+                clauses.append(f'"{name}" = ?')
+                values.append(value)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), values
+
+    @staticmethod
+    def _columns(names, rows):
+        columns = list(zip(*rows)) if rows else [()] * len(names)
+        table = {}
+        for name, values in zip(names, columns):
+            if name in STRING_FIELDS or name == "path":
+                table[name] = np.array(values, dtype=object)
+            else:
+                table[name] = np.array([math.nan if v is None else v for v in values], dtype=float)
+        return table
+
+    def query(self, fields=SUMMARY_FIELDS, **filters):
+        """
+        Summaries of the indexed logs matching all filters, as a dict of numpy columns sorted by log name.
+
+        Filters are keyword arguments over QUERY_FIELDS, e.g. query(model="stochastic", P=8,
+        n_clusters=[10, 20]); a list matches any of its values.
+        """
+        where, values = self._where(filters)
+        names = ["path"] + [name for name in fields if name != "path"]
+        rows = self.db.execute(f"SELECT {_quoted(names)} FROM summary{where} ORDER BY log", values).fetchall()
+        return self._columns(names, rows)
+
+    def trajectories(self, **filters):
+        """
+        Trajectory events of the logs matching the filters of `query`, as a dict of numpy columns
+        with "path" and "log" columns, ordered by log and event.
+        """
+        where, values = self._where(filters)
+        fields = TRAJECTORY_FIELDS[1:]
+        rows = self.db.execute(
+            f"SELECT t.path, s.log, {', '.join('t.' + name for name in fields)} FROM trajectory t "
+            f"JOIN (SELECT path, log FROM summary{where}) s ON s.path = t.path ORDER BY s.log, t.seq", values).fetchall()
+        return self._columns(["path", "log"] + list(fields), rows)
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM summary").fetchone()[0]
+
+
+def _parse_filter(text):
+    name, _, value = text.partition("=")
+    values = value.split(",")
+    parsed = [v if name in STRING_FIELDS else int(v) for v in values]
+    return name, parsed if len(parsed) > 1 else parsed[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally index the Gurobi solve logs and query the results.")
+    parser.add_argument("--index", default=DEFAULT_INDEX, help="SQLite index file")
+    parser.add_argument("--root", default=".", help="directory containing the gurobi_*_logs directories")
+    parser.add_argument("--workers", type=int, default=None, help="number of parser processes (default: all cores)")
+    parser.add_argument("--query", nargs="*", default=None, metavar="FIELD=VALUE",
+                        help=f"print the matching logs; fields: {', '.join(QUERY_FIELDS)}; comma-separate alternatives")
+    args = parser.parse_args()
+
+    with ResultsIndex(args.index, args.root) as index:
+        counts = index.refresh(args.workers)
+        print(f"Indexed {len(index)} logs: {counts['added']} added, {counts['updated']} updated, "
+              f"{counts['removed']} removed, {counts['unchanged']} unchanged")
+        if args.query is not None:
+            fields = ("log", "status", "best_objective", "gap", "runtime")
+            result = index.query(fields, **dict(_parse_filter(f) for f in args.query))
+            for row in zip(*(result[name] for name in fields)):
+                print(",".join("" if isinstance(v, float) and math.isnan(v) else str(v) for v in row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Solver performance metrics from parsed branch-and-bound trajectories.
+
+Final gap, objective and solve time do not show where a solve spends its time; e.g. the
+8-port uniform runs can spend most of their time in the root relaxation. This module computes,
+per log, from the columnar tables of gurobi_log_parser / results_index:
+
+    primal_integral          integral of the primal gap over time (Berthold, 2013), in seconds
+    primal_dual_integral     integral of the relative incumbent/bound gap over time, in seconds
+    time_to_first_incumbent  seconds until the first feasible solution
+    time_to_gap_10, _5       seconds until the gap first drops to 10% / 5%
+    presolve_share, root_lp_share, root_node_share, tree_share
+                             fractions of the run spent in presolve, solving the root LP,
+                             the rest of the root node (cuts, heuristics) and the search tree
+
+The primal gap at time t is |z(t) - z*| / max(|z(t)|, |z*|) for the incumbent z(t) and the
+best objective z* of the log, and 1 while there is no incumbent. The primal-dual gap is
+|z(t) - b(t)| / |z(t)| for the best bound b(t), capped at 1 and 1 while either is unknown.
+Both integrals run over [0, T] with T the solve time, or the last time printed for logs that
+were cut off. Dividing an integral by T gives the average gap over the run.
+
+All metrics are computed for every log at once with segmented NumPy operations over the
+concatenated trajectories, then averaged per (model, P, n_clusters, distribution):
+
+    python solve_metrics.py [--index results_index.sqlite] [--output solve_metrics]
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+from gurobi_log_parser import write_table
+from results_index import DEFAULT_INDEX, ResultsIndex
+
+GAP_TARGETS = (10.0, 5.0)
+GROUP_FIELDS = ("model", "P", "n_clusters", "distribution")
+METRIC_FIELDS = (
+    "horizon", "primal_integral", "primal_dual_integral", "time_to_first_incumbent",
+    *(f"time_to_gap_{int(target)}" for target in GAP_TARGETS),
+    "presolve_share", "root_lp_share", "root_node_share", "tree_share",
+)
+
+
+def _forward_fill(values, group_start):
+    """
+    Replace NaNs by the last non-NaN value of the same group, leaving leading NaNs of a group.
+    group_start[i] is the index of the first element of i's group.
+    """
+    index = np.where(np.isnan(values), -1, np.arange(len(values)))
+    index = np.maximum.accumulate(index)
+    filled = values[np.maximum(index, 0)]
+    filled[index < group_start] = np.nan
+    return filled
+
+
+def _first_time(mask, times, group_id, n_groups):
+    """
+    Per group, the time of the first event where mask holds, NaN if it never does.
+    """
+    first = np.full(n_groups, np.nan)
+    hit = np.flatnonzero(mask)
+    # events are sorted by group and time, so the first hit of a group is its earliest one
+    groups, position = np.unique(group_id[hit], return_index=True)
+    first[groups] = times[hit[position]]
+    return first
+
+
+def compute_metrics(summary, trajectory):
+    """
+    Per-log solver metrics.
+
+    Parameters
+    ----------
+    summary : dict of numpy arrays
+        Summary columns with at least "log", "best_objective", "runtime", "last_time",
+        "presolve_time" and "root_time".
+    trajectory : dict of numpy arrays
+        Trajectory columns "log", "time", "event", "explored", "incumbent" and "bound".
+
+    Returns
+    -------
+    metrics : dict of numpy arrays
+        "log" and one column per name in METRIC_FIELDS, aligned with summary.
+    """
+    logs = summary["log"]
+    n_logs = len(logs)
+    position = {log: i for i, log in enumerate(logs)}
+    group_id = np.array([position.get(log, -1) for log in trajectory["log"]], dtype=np.int64)
+    keep = group_id >= 0
+    order = np.lexsort((np.arange(keep.sum()), trajectory["time"][keep], group_id[keep]))
+    group_id = group_id[keep][order]
+    times = trajectory["time"][keep][order]
+    explored = trajectory["explored"][keep][order]
+
+    horizon = np.where(np.isnan(summary["runtime"]), summary["last_time"], summary["runtime"])
+    reference = summary["best_objective"].copy()
+
+    counts = np.bincount(group_id, minlength=n_logs)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    group_start = starts[group_id]
+    incumbent = _forward_fill(trajectory["incumbent"][keep][order], group_start)
+    bound = _forward_fill(trajectory["bound"][keep][order], group_start)
+
+    # logs cut off before a final line use their last incumbent as reference
+    last = starts + counts - 1
+    has_events = counts > 0
+    missing = np.isnan(reference) & has_events
+    reference[missing] = incumbent[last[missing]]
+
+    # gap after each event, held until the next event of the same log (or the horizon)
+    z_ref = reference[group_id]
+    scale = np.maximum(np.abs(incumbent), np.abs(z_ref))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        primal_gap = np.where(scale > 0, np.abs(incumbent - z_ref) / scale, 0.0)
+        dual_gap = np.minimum(np.abs(incumbent - bound) / np.abs(incumbent), 1.0)
+    primal_gap = np.where(np.isnan(incumbent), 1.0, primal_gap)
+    dual_gap = np.where(np.isnan(dual_gap), 1.0, dual_gap)
+
+    next_time = np.append(times[1:], np.nan)
+    is_last = np.zeros(len(times), dtype=bool)
+    is_last[last[has_events]] = True
+    next_time[is_last] = horizon[group_id[is_last]]
+    duration = np.clip(next_time - times, 0.0, None)
+    duration = np.nan_to_num(duration)
+
+    # before the first event there is neither an incumbent nor a bound
+    first = np.full(n_logs, np.nan)
+    first[has_events] = times[starts[has_events]]
+    lead = np.nan_to_num(np.where(has_events, first, horizon).clip(0.0))
+    primal_integral = lead + np.bincount(group_id, weights=primal_gap * duration, minlength=n_logs)
+    primal_dual_integral = lead + np.bincount(group_id, weights=dual_gap * duration, minlength=n_logs)
+
+    metrics = {"log": logs, "horizon": horizon,
+               "primal_integral": np.where(np.isnan(horizon), np.nan, primal_integral),
+               "primal_dual_integral": np.where(np.isnan(horizon), np.nan, primal_dual_integral),
+               "time_to_first_incumbent": _first_time(~np.isnan(incumbent), times, group_id, n_logs)}
+    for target in GAP_TARGETS:
+        metrics[f"time_to_gap_{int(target)}"] = _first_time(dual_gap * 100.0 <= target, times, group_id, n_logs)
+
+    # root node ends with the last event before the first branching; "Explored 1 nodes" is the root alone
+    final = trajectory["event"][keep][order] == "final"
+    root_events = (explored == 0) & ~final
+    root_end = np.full(n_logs, np.nan)
+    np.fmax.at(root_end, group_id[root_events], times[root_events])
+    branched = np.zeros(n_logs, dtype=bool)
+    branched[group_id[((explored > 0) & ~final) | (final & (explored > 1))]] = True
+    root_end = np.where(branched, root_end, horizon)
+
+    presolve = np.nan_to_num(summary["presolve_time"])
+    root_lp = np.nan_to_num(summary["root_time"])
+    root_end = np.fmax(np.nan_to_num(root_end), presolve + root_lp)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        metrics["presolve_share"] = np.minimum(presolve, horizon) / horizon
+        metrics["root_lp_share"] = np.minimum(root_lp, horizon - presolve).clip(0.0) / horizon
+        metrics["root_node_share"] = (np.minimum(root_end, horizon) - presolve - root_lp).clip(0.0) / horizon
+        metrics["tree_share"] = (horizon - np.minimum(root_end, horizon)) / horizon
+    return metrics
+
+
+def aggregate(summary, metrics, by=GROUP_FIELDS):
+    """
+    Mean of every metric per group of the summary fields in `by`, ignoring NaNs.
+
+    Returns a dict of numpy columns with the group fields, "logs" (number of logs in the group)
+    and one column per metric.
+    """
+    keys = list(zip(*(summary[name] for name in by)))
+    # NaN keys (e.g. n_clusters of deterministic runs) are made comparable for grouping
+    keys = [tuple("" if isinstance(v, float) and np.isnan(v) else v for v in key) for key in keys]
+    unique = sorted(set(keys), key=lambda key: tuple((1, 0, v) if isinstance(v, str) else (0, v, "") for v in key))
+    group_index = {key: i for i, key in enumerate(unique)}
+    group_id = np.array([group_index[key] for key in keys], dtype=np.int64)
+    n_groups = len(unique)
+
+    table = {name: np.array([key[j] if key[j] != "" else np.nan for key in unique], dtype=summary[name].dtype)
+             for j, name in enumerate(by)}
+    table["logs"] = np.bincount(group_id, minlength=n_groups).astype(float)
+    for name in METRIC_FIELDS:
+        values = metrics[name]
+        valid = ~np.isnan(values)
+        total = np.bincount(group_id[valid], weights=values[valid], minlength=n_groups)
+        count = np.bincount(group_id[valid], minlength=n_groups)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            table[name] = total / count
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Primal-dual integrals, time-to-target and phase shares of the solve logs.")
+    parser.add_argument("--index", default=DEFAULT_INDEX, help="SQLite results index (refreshed before use)")
+    parser.add_argument("--root", default=".", help="directory containing the gurobi_*_logs directories")
+    parser.add_argument("--output", default="solve_metrics", help="output directory for per_log.csv and per_group.csv")
+    args = parser.parse_args()
+
+    with ResultsIndex(args.index, args.root) as index:
+        index.refresh()
+        summary = index.query()
+        trajectory = index.trajectories()
+
+    metrics = compute_metrics(summary, trajectory)
+    groups = aggregate(summary, metrics)
+    os.makedirs(args.output, exist_ok=True)
+    write_table(os.path.join(args.output, "per_log.csv"), metrics)
+    write_table(os.path.join(args.output, "per_group.csv"), groups)
+
+    shares = ("presolve_share", "root_lp_share", "root_node_share", "tree_share")
+    print(f"{'model':<20} {'P':>3} {'n':>3} {'distribution':<10} {'logs':>4} {'PDI/T':>6} " + " ".join(f"{name[:-6]:>9}" for name in shares))
+    for i in range(len(groups["logs"])):
+        n = "-" if np.isnan(groups["n_clusters"][i]) else int(groups["n_clusters"][i])
+        average_gap = groups["primal_dual_integral"][i] / groups["horizon"][i]
+        print(f"{groups['model'][i]:<20} {int(groups['P'][i]):>3} {n:>3} {groups['distribution'][i]:<10} {int(groups['logs'][i]):>4} "
+              f"{average_gap:>6.3f} " + " ".join(f"{groups[name][i]:>9.2f}" for name in shares))
+
+
+if __name__ == "__main__":
+    main()